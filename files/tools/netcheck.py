@@ -11,11 +11,153 @@ __copyright__  = 'Copyright 2023, Intel Corporation'
 __github__     = 'https://www.github.com/brent-elliott/netcheck/'
 
 import argparse
+import base64
+import configparser
+import contextlib
+import ctypes
+import hashlib
+import http.server
+import io
 import json
+import math
+import operator
 import os
 import re
+import select
+import shlex
+import socket
+import socketserver
+import ssl
+import struct
 import subprocess
+import sys
 import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# rtnetlink message types, flags and attribute identifiers (linux/netlink.h, linux/rtnetlink.h, linux/if_link.h)
+NLMSG_ERROR         = 2
+NLMSG_DONE          = 3
+NLM_F_REQUEST       = 0x1
+NLM_F_DUMP          = 0x300
+RTM_NEWLINK         = 16
+RTM_DELLINK         = 17
+RTM_GETLINK         = 18
+RTM_NEWADDR         = 20
+RTM_DELADDR         = 21
+RTM_GETADDR         = 22
+RTM_NEWROUTE        = 24
+RTM_DELROUTE        = 25
+RTM_GETROUTE        = 26
+RT_TABLE_MAIN       = 254
+RTMGRP_LINK         = 0x1
+RTMGRP_IPV4_IFADDR  = 0x10
+RTMGRP_IPV4_ROUTE   = 0x40
+RTMGRP_IPV6_IFADDR  = 0x100
+RTMGRP_IPV6_ROUTE   = 0x400
+
+IFLA_ADDRESS        = 1
+IFLA_BROADCAST      = 2
+IFLA_IFNAME         = 3
+IFLA_MTU            = 4
+IFLA_LINK           = 5
+IFLA_QDISC          = 6
+IFLA_MASTER         = 10
+IFLA_TXQLEN         = 13
+IFLA_OPERSTATE      = 16
+IFLA_LINKINFO       = 18
+IFLA_GROUP          = 27
+IFLA_PROMISCUITY    = 30
+IFLA_NUM_TX_QUEUES  = 31
+IFLA_NUM_RX_QUEUES  = 32
+IFLA_LINK_NETNSID   = 37
+IFLA_GSO_MAX_SEGS   = 40
+IFLA_GSO_MAX_SIZE   = 41
+IFLA_MIN_MTU        = 50
+IFLA_MAX_MTU        = 51
+IFLA_PROP_LIST      = 52
+IFLA_ALT_IFNAME     = 53
+IFLA_PARENT_DEV_NAME = 56
+IFLA_PARENT_DEV_BUS_NAME = 57
+IFLA_GRO_MAX_SIZE   = 58
+IFLA_TSO_MAX_SIZE   = 59
+IFLA_TSO_MAX_SEGS   = 60
+IFLA_ALLMULTI       = 61
+IFLA_INFO_KIND      = 1
+IFLA_INFO_DATA      = 2
+IFLA_INFO_SLAVE_KIND = 4
+IFLA_VLAN_ID        = 1
+IFLA_VLAN_PROTOCOL  = 5
+IFLA_TUN_TYPE       = 3
+IFLA_TUN_PI         = 4
+IFLA_TUN_VNET_HDR   = 5
+IFLA_TUN_PERSIST    = 6
+IFLA_TUN_MULTI_QUEUE = 7
+
+IFA_ADDRESS         = 1
+IFA_LOCAL           = 2
+IFA_LABEL           = 3
+IFA_BROADCAST       = 4
+IFA_CACHEINFO       = 6
+
+RTA_DST             = 1
+RTA_OIF             = 4
+RTA_GATEWAY         = 5
+RTA_PRIORITY        = 6
+RTA_PREFSRC         = 7
+RTA_TABLE           = 15
+RTA_PREF            = 20
+
+# Generic netlink controller and the ethtool family (linux/genetlink.h, linux/ethtool_netlink.h)
+NETLINK_GENERIC     = 16
+GENL_ID_CTRL        = 0x10
+CTRL_CMD_GETFAMILY  = 3
+CTRL_ATTR_FAMILY_ID = 1
+CTRL_ATTR_FAMILY_NAME = 2
+ETHTOOL_MSG_LINKINFO_GET = 2
+ETHTOOL_A_HEADER_DEV_NAME = 2
+ETHTOOL_A_LINKINFO_HEADER = 1
+ETHTOOL_A_LINKINFO_PORT = 2
+NLA_F_NESTED        = 0x8000
+
+# Namespace and mount flags used by workers collecting inside other network namespaces (linux/sched.h, linux/mount.h)
+CLONE_NEWNS         = 0x00020000
+CLONE_NEWNET        = 0x40000000
+MS_REC              = 0x4000
+MS_SLAVE            = 0x80000
+MNT_DETACH          = 2
+
+# Downlink throughput target used when none is configured (note that some URLs may be blocked on some networks)
+#   Azure CDN (Akamai)  - https://aka.azureedge.net/probe/test10mb.jpg
+#   CacheFly CDN        - https://cloudharmony1.cachefly.net/probe/test10mb.jpg
+#   Amazon CloudFront   - https://cloudharmony.com/probe/test10mb.jpg
+#   Limelight CDN       - https://labtest-gartner.lldns.net/web-probe/test10mb.jpg
+#   Cloudflare          - https://cloudflarecdn.cloudharmony.net/probe/test10mb.jpg
+#   Azure CDN (Verizon) - https://ch.azureedge.net/probe/test10mb.jpg
+#   Fastly CDN          - https://cloudharmony.global.ssl.fastly.net/probe/test10mb.jpg
+#   Google Cloud CDN    - https://cdn-google.cloudharmony.net/probe/test10mb.jpg
+THROUGHPUT_URL      = 'https://aka.azureedge.net/probe/test10mb.jpg'
+
+# Bandwidth test wire format: hello (magic, version, reverse, streams, duration, test token) and upload result
+#   (bytes, seconds) returned by the server, durations and streams requested by clients are capped and idle connections
+#   dropped
+BANDWIDTH_MAGIC         = b'NCBW'
+BANDWIDTH_HELLO         = struct.Struct('!4sBBHdQ')
+BANDWIDTH_RESULT        = struct.Struct('!Qd')
+BANDWIDTH_MAX_DURATION  = 300
+BANDWIDTH_MAX_STREAMS   = 128
+BANDWIDTH_IDLE_TIMEOUT  = 60
+
+# DNS response codes counted by the resolver probes (RFC 1035, RFC 2136)
+DNS_RCODES          = {0: 'noerror', 1: 'formerr', 2: 'servfail', 3: 'nxdomain', 4: 'notimp', 5: 'refused'}
+
+# Suffix of table cells holding outliers (shown in red in the fancy table of the tables marking them)
+OUTLIER_MARK        = ' !'
 
 
 #----------------------------------------------------------------------------------------------------------------------
@@ -23,710 +165,4229 @@ import tempfile
 #----------------------------------------------------------------------------------------------------------------------
 def main():
 
+    initialize()
+
+    # Perform requested operations once, or repeatedly as the network changes (captures are saved even on errors)
+    try:
+        if args.serve is not None:
+            serve()
+        elif args.bw_server:
+            bandwidth_server()
+        elif args.bw_client:
+            bandwidth_client()
+        elif args.mesh:
+            mesh()
+        elif args.mesh_matrix:
+            mesh_matrix()
+        elif args.fleet:
+            fleet()
+        elif args.route_lookup or args.route_lookup_file:
+            route_lookup()
+        elif args.all_netns:
+            all_netns()
+        elif args.facts:
+            facts()
+        elif args.brief:
+            if args.test:
+                run_connectivity_tests()
+            # The summary is shared with netcheck_brief.py (installed beside netcheck), which shells run directly
+            sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+            import netcheck_brief
+            (text, problems) = netcheck_brief.brief_summary(list(dict.fromkeys([netcheck_brief.SYSTEM_CACHE_DIR, args.cache_dir])))
+            if args.ndjson:
+                emit_record('brief', {'summary': text, 'problems': problems})
+            elif args.json:
+                print(json.dumps({'summary': text, 'problems': problems}))
+            elif text:
+                print(text)
+            exit(1 if problems else 0)
+        elif args.watch is not None:
+            watch()
+        elif args.pager and not args.json and sys.stdout.isatty():
+            page(report)
+        else:
+            report()
+    finally:
+        if args.record:
+            save_fixture(args.record)
+
+#----------------------------------------------------------------------------------------------------------------------
+# initialize         - Set up the shared state of a run and process command-line arguments (argv, or sys.argv)
+#----------------------------------------------------------------------------------------------------------------------
+def initialize(argv=None):
+
     # Define several globals to simplify code organization
     global errors
+    global errors_lock
     global args
+    global pci_devices
+    global pci_lock
+    global netlink_snapshot
+    global genl_families
+    global static_facts
+    global watch_cache
+    global watch_changed
+    global run_id
+    global output_lock
+    global record_stream
+    global timings
+    global timings_lock
+    global timings_origin
+    global fixture_commands
+    global fixture_lock
 
-    # Track errors and warnings experienced throughout execution
+    # Track errors and warnings experienced throughout execution (lock guards access from worker threads)
     errors = {}
-    
+    errors_lock = threading.Lock()
+
+    # PCI device index is built on first use (a single lspci per run) and shared by all interface workers
+    pci_devices = None
+    pci_lock = threading.Lock()
+
+    # Netlink dumps are taken once per run and shared by every table (--ip-backend netlink)
+    netlink_snapshot = None
+
+    # Generic netlink family IDs by name, resolved on first use
+    genl_families = {}
+
+    # Static per-NIC facts (driver, firmware, bus, PCI description) keyed by interface name, loaded from disk below
+    static_facts = {}
+
+    # Watch mode keeps the last collected state of each interface (ifindex) and the interfaces changed since
+    watch_cache = None
+    watch_changed = set()
+
+    # Streamed records (--ndjson) carry the ID of the run (each watch refresh is a run) and are written whole by any thread
+    run_id = None
+    output_lock = threading.Lock()
+
+    # Wall time events for stages and external commands (--timings), None when not recording
+    timings = None
+    timings_lock = threading.Lock()
+    timings_origin = time.perf_counter()
+
+    # External command captures keyed by command line (--record writes them, --replay reads them)
+    fixture_commands = {}
+    fixture_lock = threading.Lock()
+
+    # Process command-line arguments
+    args = process_args(argv)
+
+    # Read the persistent hardware facts cache (ignored entirely with --no-cache, discarded with --refresh-cache, unused by --brief)
+    if not args.no_cache and not args.refresh_cache and not args.brief:
+        static_facts = load_static_facts()
+
+    # Load captured command output to replay in place of the real commands
+    if args.replay:
+        fixture_commands = load_fixture(args.replay)
+
+    # Streamed records own stdout, warnings and other messages are moved to stderr so every stdout line parses
+    record_stream = sys.stdout
+    if args.ndjson:
+        sys.stdout = sys.stderr
+
+#----------------------------------------------------------------------------------------------------------------------
+# page - Run a reporting function with stdout streamed through a pager
+#----------------------------------------------------------------------------------------------------------------------
+def page(function):
+
+    pager = subprocess.Popen(shlex.split(os.environ.get('PAGER') or 'less -R -S'), stdin=subprocess.PIPE)
+    stdout = sys.stdout
+    sys.stdout = io.TextIOWrapper(pager.stdin, encoding=stdout.encoding, errors='replace')
+
+    try:
+        function()
+    except BrokenPipeError:
+        pass    # pager was closed before all output was written
+    finally:
+        try:
+            sys.stdout.close()
+        except BrokenPipeError:
+            pass
+        sys.stdout = stdout
+        pager.wait()
+
+#----------------------------------------------------------------------------------------------------------------------
+# report - Collect and display (or export) the requested tables and tests
+#----------------------------------------------------------------------------------------------------------------------
+def report():
+    global run_id
+    global timings
+    global timings_origin
+
     # Initialize JSON response
     response = json.loads('{}')
 
-    # Process command-line arguments
-    args = process_args()
+    # Timing events are collected per run (each watch refresh starts over)
+    if args.timings:
+        timings = []
+        timings_origin = time.perf_counter()
+
+    # Streamed records are bracketed by run records so partial runs can be told apart from complete ones
+    if args.ndjson:
+        run_id = uuid.uuid4().hex
+        started = time.time()
+        emit_record('run', {'event': 'start', 'host': socket.gethostname(), 'time': started})
 
-    # Perform requested operations
     if args.interfaces or args.pcie or args.vlans:    
-        (response['interfaces'], response['openvswitch']) = process_ip_addr()
+        with timed('process_ip_addr'):
+            (response['interfaces'], response['openvswitch']) = process_ip_addr()
     if args.routes:
-        response['routes'] = process_ip_route()
+        with timed('process_ip_route'):
+            response['routes'] = process_ip_route()
     if args.dns:
-        response['dns'] = process_resolvectl()
+        with timed('process_resolvectl'):
+            response['dns'] = process_resolvectl()
     if args.test:
-        test_connectivity()
-    if args.json:
+        with timed('test_connectivity'):
+            response['tests'] = test_connectivity()
+    if args.timings:
+        response['timings'] = process_timings()
+        if args.ndjson:
+            emit_record('timings', response['timings'])
+    if args.ndjson:
+        finished = time.time()
+        emit_record('run', {'event': 'end', 'host': socket.gethostname(), 'time': finished, 'elapsed': finished - started})
+    elif args.json:
         print(json.dumps(response))
 
 #----------------------------------------------------------------------------------------------------------------------
-# process_args - Process all arguments, set defaults, handle basic arg based behaviors
+# timed              - Context manager recording the wall time of a stage or external command (--timings)
 #----------------------------------------------------------------------------------------------------------------------
-def process_args():
-    # Parse command-line parameters
-    parser = argparse.ArgumentParser(
-                description='Review relevant information about network interfaces and perform connectivity tests',
-                epilog='For more details, see ' + __github__,
-                allow_abbrev=True)
+@contextlib.contextmanager
+def timed(name, detail='', category='stage'):
+    if timings is None:
+        yield
+        return
 
-    oper_group = parser.add_argument_group('Operational Parameters')
-    filt_group = parser.add_argument_group('Formatting and Filtering')
-    disp_group = parser.add_argument_group('Display Tables')
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, detail, category, start)
 
-    oper_group.add_argument('-t', '--test',        action='store_true', help='Perform connectivity tests')
-    oper_group.add_argument('-j', '--json',        action='store_true', help='Export all information in json format')
-    oper_group.add_argument('-o', '--ovs',         action='store_true', help='Perform Open vSwitch parsing (SUDO required)')
-    oper_group.add_argument('-v', '--version',     action='store_true', help='Display version information')
-    
-    filt_group.add_argument('-u', '--up',          action='store_true', help='Only report interfaces that are UP')
-    filt_group.add_argument('-s', '--summary',     action='store_true', help='Print shorter summary of interfaces and VLANs')
-    filt_group.add_argument('-b', '--barebones',   action='store_true', help='Barebones table formatting (narrow, easy import)')
+#----------------------------------------------------------------------------------------------------------------------
+# record_timing      - Store one timing event started at start (perf_counter) and ending now
+#----------------------------------------------------------------------------------------------------------------------
+def record_timing(name, detail, category, start):
+    if timings is None:
+        return
 
-    disp_group.add_argument('-a', '--all',         action='store_true', help='Display all tables')
-    disp_group.add_argument('-c', '--clear',       action='store_true', help='Clear the console before displaying tables')
-    disp_group.add_argument('-I', '--interfaces',  action='store_true', help='Display interfaces table')
-    disp_group.add_argument('-V', '--vlans',       action='store_true', help='Display vlans table')
-    disp_group.add_argument('-D', '--dns',         action='store_true', help='Display dns table')
-    disp_group.add_argument('-R', '--routes',      action='store_true', help='Display routes table')
-    disp_group.add_argument('-P', '--pcie',        action='store_true', help='Display PCIe table')
+    end = time.perf_counter()
+    with timings_lock:
+        timings.append({'name': name, 'detail': detail, 'category': category, 'start': start - timings_origin,
+                        'duration': end - start, 'thread': threading.get_ident()})
 
-    args = parser.parse_args()
-    
-    # Clear screen 
-    if args.clear:
-        os.system('clear')
+#----------------------------------------------------------------------------------------------------------------------
+# run_command        - subprocess.run with captured output, timed (--timings), captured (--record) or replayed (--replay)
+#----------------------------------------------------------------------------------------------------------------------
+def run_command(command, timeout=None):
 
-    # Show version information and exit
-    if args.version:
-        print(os.path.basename(__file__) + ' version ' + __version__)
-        exit(0)
+    # Commands run through sudo are reported by the program sudo executes
+    name = ' '.join(command[:2]) if command[0] == 'sudo' else command[0]
 
-    # If no tables or tests are selected, default to interfaces and vlans
-    if not ( args.interfaces or args.vlans or args.dns or args.routes or args.pcie or args.test):
-        args.interfaces = True
-        args.vlans = True
+    with timed(name, ' '.join(command), 'command'):
+        if args.replay:
+            return replay_command(command)
+        if not args.record:
+            return subprocess.run(command, capture_output=True, timeout=timeout)
 
-    # Handle --all flag by setting all tables to true (test must be explictly executed)
-    if args.all:
-        args.interfaces = True
-        args.vlans = True
-        args.dns = True
-        args.routes = True
-        args.pcie = True
-    
-    return args
+        # Missing commands and timeouts are captured too so a replay fails the same way
+        try:
+            result = subprocess.run(command, capture_output=True, timeout=timeout)
+        except FileNotFoundError:
+            with fixture_lock:
+                fixture_commands[fixture_key(command)] = {'missing': True}
+            raise
+        except subprocess.TimeoutExpired:
+            with fixture_lock:
+                fixture_commands[fixture_key(command)] = {'timeout': True}
+            raise
+
+        entry = store_fixture_command(args.record, command, result)
+        with fixture_lock:
+            fixture_commands[fixture_key(command)] = entry
+        return result
 
 #----------------------------------------------------------------------------------------------------------------------
-# process_ip_addr - Perform ip addr show and process results
+# fixture_key        - Command line used to look up a capture (temporary download targets differ on every run)
 #----------------------------------------------------------------------------------------------------------------------
-def process_ip_addr():
+def fixture_key(command):
+    temporary = tempfile.gettempdir() + os.sep
+    return ' '.join('{tmpfile}' if argument.startswith(temporary) else argument for argument in command)
 
-    itable = []     # interfaces
-    vtable = []     # vlans
-    ptable = []     # pcie devices
+#----------------------------------------------------------------------------------------------------------------------
+# store_fixture_command - Write the raw stdout and stderr of a command into a fixture directory, returning its index entry
+#----------------------------------------------------------------------------------------------------------------------
+def store_fixture_command(directory, command, result):
+    key = fixture_key(command)
 
-    interfaces = json.loads('{}')
-    openvswitch = json.loads('{}')
+    # Readable file names, made unique by a short hash of the full command line
+    base = re.sub(r'[^\w.-]+', '_', key).strip('_')[:80] + '-' + hashlib.sha1(key.encode()).hexdigest()[:8]
+    with open(os.path.join(directory, base + '.out'), 'wb') as f:
+        f.write(result.stdout)
+    with open(os.path.join(directory, base + '.err'), 'wb') as f:
+        f.write(result.stderr)
 
-    # Specify which fields are stored in which columns for itable
-    col_interface    =  1
-    col_macaddress   =  2
-    col_state        =  3
-    col_ipaddress    =  4
-    col_driver       =  5
-
-    if args.summary:
-        col_bus      =  6
-        col_dprrf    =  7
-        col_port     =  8
-    else:
-        col_fw       =  6
-        col_bus      =  7
-        col_speed    =  8
-        col_port     =  9
-        col_altnames = 10
+    return {'stdout': base + '.out', 'stderr': base + '.err', 'returncode': result.returncode}
 
-    # Get output of ip addr show command and create a JSON structure on which to hang additional useful information 
+#----------------------------------------------------------------------------------------------------------------------
+# replay_command     - Return the captured result of a command (commands without a capture appear to be missing)
+#----------------------------------------------------------------------------------------------------------------------
+def replay_command(command):
+    entry = fixture_commands.get(fixture_key(command))
+
+    if entry is None or entry.get('missing'):
+        raise FileNotFoundError(f"No capture of '{' '.join(command)}' in fixture {args.replay}")
+    if entry.get('timeout'):
+        raise subprocess.TimeoutExpired(command, 0)
+
+    with open(os.path.join(args.replay, entry['stdout']), 'rb') as f:
+        stdout = f.read()
+    with open(os.path.join(args.replay, entry['stderr']), 'rb') as f:
+        stderr = f.read()
+
+    return subprocess.CompletedProcess(command, entry['returncode'], stdout, stderr)
+
+#----------------------------------------------------------------------------------------------------------------------
+# load_fixture       - Read the command index of a fixture directory
+#----------------------------------------------------------------------------------------------------------------------
+def load_fixture(directory):
     try:
-        result = subprocess.run(['ip', '-detail', '-json', 'address', 'show'], capture_output=True)
-        result.check_returncode()
-        interfaces = json.loads(result.stdout.decode())
+        with open(os.path.join(directory, 'commands.json')) as f:
+            fixture = json.load(f)
+        if fixture.get('version') != 1:
+            raise ValueError(f"unsupported fixture version {fixture.get('version')}")
+        return fixture['commands']
 
-    except subprocess.CalledProcessError as e:
-        print(f"\nERROR: 'ip' command returned non-zero exit status {e.returncode}.")
-        print(f"       {e}")
-        exit(120)
-    except FileNotFoundError:
-        print("\nERROR: Dependency 'ip' not found. Please install 'ip' or troubleshoot access and retry.")
-        exit(120)
     except Exception as e:
-        print("\nERROR: Dependency 'ip' is failing. Please troubleshoot the command 'ip address show' and retry.")
+        print(f"\nERROR: Fixture '{directory}' cannot be replayed. Please record it again with '--record {directory}'.")
         print(f"       {e}")
         exit(120)
 
-    # Additional JSON entry to store human readable output
-    human = json.loads('{}')
+#----------------------------------------------------------------------------------------------------------------------
+# save_fixture       - Write the command index of a fixture directory (the captures themselves are written as they run)
+#----------------------------------------------------------------------------------------------------------------------
+def save_fixture(directory):
+    with fixture_lock:
+        text = json.dumps({'version': 1, 'commands': fixture_commands}, indent=2, sort_keys=True)
+    write_atomic(os.path.join(os.path.abspath(directory), 'commands.json'), text)
+
+#----------------------------------------------------------------------------------------------------------------------
+# record_sysfs       - Mirror a sysfs file (or directory when value is None) read during --record into the fixture
+#----------------------------------------------------------------------------------------------------------------------
+def record_sysfs(path, value=None):
+    mirror = os.path.join(args.record, 'sys', os.path.relpath(path, args.sysfs_root))
+    try:
+        if value is None:
+            os.makedirs(mirror, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(mirror), exist_ok=True)
+            with open(mirror, 'w') as f:
+                f.write(value + '\n')
+    except OSError:
+        pass
+
+#----------------------------------------------------------------------------------------------------------------------
+# process_timings    - Summarize timing events per stage and command, print the summary table and write the trace
+#----------------------------------------------------------------------------------------------------------------------
+def process_timings():
+
+    ttable = []     # Timings table
+
+    total = time.perf_counter() - timings_origin
+    with timings_lock:
+        events = list(timings)
+
+    # Aggregate by name (one row per stage, test and command rather than per interface or invocation)
+    summary = {}
+    for event in events:
+        entry = summary.setdefault((event['category'], event['name']), {'name': event['name'], 'category': event['category'],
+                                                                       'calls': 0, 'total': 0.0, 'max': 0.0})
+        entry['calls'] += 1
+        entry['total'] += event['duration']
+        entry['max'] = max(entry['max'], event['duration'])
+
+    category_order = { 'stage': 0, 'test': 1, 'command': 2 }
+    summary = sorted(summary.values(), key=lambda x: (category_order.get(x['category'], 3), -x['total']))
+    for entry in summary:
+        entry['average'] = entry['total'] / entry['calls']
+
+    # Chrome trace event format (chrome://tracing, Perfetto) with complete events in microseconds
+    if args.timings_trace:
+        trace = [{'name': event['name'], 'cat': event['category'], 'ph': 'X', 'ts': round(event['start'] * 1e6, 1),
+                  'dur': round(event['duration'] * 1e6, 1), 'pid': os.getpid(), 'tid': event['thread'],
+                  'args': {'detail': event['detail']} if event['detail'] else {}} for event in events]
+        write_atomic(os.path.abspath(args.timings_trace), json.dumps({'traceEvents': trace, 'displayTimeUnit': 'ms'}))
+
+    if not args.json:
+        ttable.append(['STAGE / COMMAND', 'TYPE', 'CALLS', 'TOTAL', 'AVERAGE', 'MAX'])
+        for entry in summary:
+            ttable.append([ entry['name'], entry['category'], entry['calls'], f"{entry['total'] * 1000:.1f} ms",
+                            f"{entry['average'] * 1000:.1f} ms", f"{entry['max'] * 1000:.1f} ms" ])
+        ttable.append(['total (wall)', '', '', f'{total * 1000:.1f} ms', '', ''])
+
+        print_table(args, 'Timings', ttable)
+
+    # Summary first, raw events after for tools that want to compute overlap themselves
+    return {'total': total, 'summary': summary, 'events': events}
+
+#----------------------------------------------------------------------------------------------------------------------
+# emit_record        - Write a single NDJSON record (type tag, run ID and data) as soon as it is collected
+#----------------------------------------------------------------------------------------------------------------------
+def emit_record(record_type, data):
+
+    # Data is nested rather than merged since collected objects have keys of their own (routes carry a 'type')
+    line = json.dumps({'type': record_type, 'run': run_id, 'data': data})
+    with output_lock:
+        record_stream.write(line + '\n')
+        record_stream.flush()
+
+#----------------------------------------------------------------------------------------------------------------------
+# serve              - Serve OpenMetrics from cached collections refreshed on their own schedules (--serve)
+#----------------------------------------------------------------------------------------------------------------------
+def serve():
+
+    # Notes:
+    # - Interface, route and DNS facts are collected every --collect-interval, connectivity tests every --test-interval
+    # - Each collection renders its metric families once, a scrape only joins the cached text (no commands are run)
+    # - Connectivity metrics are absent until the first test run completes
+    # - The two schedules share no per-run state: only the facts thread uses the netlink dump it refreshes (the tests'
+    #   gateway lookup names interfaces by index), the PCI index is replaced rather than modified
+
+    # Collections never print tables
+    args.json = True
+    args.ndjson = False
+
+    # Rendered metrics and the (duration, completion time, success) of the latest collection of each schedule
+    cache = {'facts': {'metrics': '', 'collection': None}, 'tests': {'metrics': '', 'collection': None}}
+    cache_lock = threading.Lock()
+
+    def schedule(stage, collect, interval):
+        global netlink_snapshot
+
+        while True:
+            start = time.monotonic()
+            try:
+                if stage == 'facts':
+                    netlink_snapshot = None
+                text = collect()
+            except Exception as e:
+                print(f"\nWARNING: Metrics collection '{stage}' failed, the previous values are served until the next run.")
+                print(f'         {e}')
+                text = None
+
+            duration = time.monotonic() - start
+            with cache_lock:
+                if text is not None:
+                    cache[stage]['metrics'] = text
+                cache[stage]['collection'] = (duration, time.time(), text is not None)
+
+            time.sleep(max(0, interval - duration))
+
+    def collect_facts():
+        (interfaces, _) = process_ip_addr()
+        routes = process_ip_route()
+        dns = process_resolvectl()
+        return format_fact_metrics(interfaces, routes, dns)
+
+    def collect_tests():
+        return format_test_metrics(run_connectivity_tests())
+
+    threading.Thread(target=schedule, args=('facts', collect_facts, args.collect_interval), daemon=True).start()
+    threading.Thread(target=schedule, args=('tests', collect_tests, args.test_interval), daemon=True).start()
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404, 'Metrics are served at /metrics')
+                return
+
+            with cache_lock:
+                body = ''.join(cache[stage]['metrics'] for stage in cache) + format_collection_metrics(cache) + '# EOF\n'
+            body = body.encode()
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *arguments):
+            pass
+
+    try:
+        server = http.server.ThreadingHTTPServer((args.serve_address, args.serve), MetricsHandler)
+    except OSError as e:
+        print(f"\nERROR: Cannot listen on {args.serve_address}:{args.serve}. Please choose another --serve port or address.")
+        print(f'       {e}')
+        exit(120)
+
+    print(f'netcheck --serve: metrics at http://{args.serve_address}:{args.serve}/metrics, Ctrl-C to exit', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        server.server_close()
+
+#----------------------------------------------------------------------------------------------------------------------
+# metric_labels      - Format OpenMetrics labels, escaping backslashes, double quotes and newlines in values
+#----------------------------------------------------------------------------------------------------------------------
+def metric_labels(**labels):
+    escaped = [f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for (name, value) in labels.items()]
+    return '{' + ','.join(escaped) + '}'
+
+#----------------------------------------------------------------------------------------------------------------------
+# format_fact_metrics - Render interface, route and DNS facts as OpenMetrics families
+#----------------------------------------------------------------------------------------------------------------------
+def format_fact_metrics(interfaces, routes, dns):
+
+    families = {
+        'netcheck_interface':                   ('info',  'Interface driver, firmware and bus details', []),
+        'netcheck_link_up':                     ('gauge', 'Operational state is UP', []),
+        'netcheck_link_carrier':                ('gauge', 'Carrier (link) detected', []),
+        'netcheck_link_speed_bits_per_second':  ('gauge', 'Negotiated link speed', []),
+        'netcheck_routes':                      ('gauge', 'Routes in the main table', []),
+        'netcheck_default_route':               ('gauge', 'Default route present', []),
+        'netcheck_dns_servers':                 ('gauge', 'Configured DNS servers per resolver link', []),
+    }
 
-    # Parse through each network interface returned by ip addr show and collect additional information along the way
-    ovs_found = False
     for entry in interfaces:
+        if entry['ifname'] == 'lo' or 'driver' not in entry:
+            continue
+        interface = entry['ifname']
 
-        # Omit lo interface (not useful) and if the --up flag is used omit any interfaces that are not in the UP state
-        if (entry['ifname'] != 'lo' and (entry['operstate'] == 'UP' or not args.up)):
-            process_interface(entry, human, itable, vtable, ptable)
-            
-            if entry['driver'] == "ovs": 
-                ovs_found = True
+        families['netcheck_interface'][2].append(metric_labels(interface=interface, driver=entry['driver'],
+                                                               firmware=entry['firmware-version'], bus=entry['bus-info'],
+                                                               device=entry.get('device-name', ''), address=entry['address'],
+                                                               link=entry['link']) + ' 1')
+        families['netcheck_link_up'][2].append(metric_labels(interface=interface) + f" {1 if entry['operstate'] == 'UP' else 0}")
+        if 'link-detected' in entry:
+            families['netcheck_link_carrier'][2].append(metric_labels(interface=interface) +
+                                                        f" {1 if entry['link-detected'] == 'yes' else 0}")
 
-    # Perform OVS post-processing if specified (not default since ovs commands require sudo for basic info access)
-    if ovs_found and args.ovs:
-        try: 
-            result = subprocess.run(['sudo', 'ovs-vsctl', 'show'], capture_output=True)
-            result.check_returncode()
+        match = re.match(r'(\d+)Mb/s', entry['speed'])
+        if match:
+            families['netcheck_link_speed_bits_per_second'][2].append(metric_labels(interface=interface) +
+                                                                      f' {int(match.group(1)) * 1000000}')
 
-        except subprocess.CalledProcessError as e:
-            flag_error = True
-            print(f"\nWARNING: 'ovs-vsctl' command returned non-zero exit status {e.returncode}.")
-            print(f'         {str(e)}')
-            print(f'         Information will be missing from the output.')
-        except FileNotFoundError:
-            flag_error = True
-            print(f"\nWARNING: Dependency 'ovs-vsctl' not found. Please install 'ovs-vsctl' or troubleshoot access and retry.")
-            print(f'         Information will be missing from the output.')
-        except Exception as e:
-            flag_error = True
-            print(f"\nWARNING: Dependency 'ovs-vsctl' is failing.")
-            print(f'         {str(e)}')
-            print(f'         Information will be missing from the output.')
-
-        # Process ovs-vsctl output
-        openvswitch = json.loads('{"bridges": {}}')
-        current_bridge = None
-        current_port = None
-        current_port_values = {}
-        bridge_lookup = {}
-
-        for line in result.stdout.decode().split('\n'):
-            line = line.strip()
-            
-            # Check if the line starts with "Bridge"
-            if line.startswith('Bridge '):
-                current_bridge = line.lstrip('Bridge').strip()
-                openvswitch['bridges'][current_bridge] = json.loads('{"ports": {}}')
-
-            # Check if the line starts with "Port"
-            elif line.startswith('Port '):
-                # If the current port has values, commit then to the dictionary
-                if current_port:
-                    openvswitch['bridges'][current_bridge]['ports'][current_port] = current_port_values
-                    current_port_values = {}
-               
-                current_port = line.lstrip('Port').strip()
-                bridge_lookup[current_port] = current_bridge
-
-            # Check if the line has key-value pair
-            elif ':' in line:
-                key, value = line.split(':')
-                current_port_values[key.strip()] = value.strip()
-
-            # Add the last port to the dictionary
-            if current_port:
-                openvswitch['bridges'][current_bridge]['ports'][current_port] = current_port_values
-
-        # Overwrite information in the itable with ovs updated values
-        for entry in itable:
-            interface = entry[col_interface]
+    families['netcheck_routes'][2].append(f' {len(routes)}')
+    families['netcheck_default_route'][2].append(f" {1 if any(route['dst'] == 'default' for route in routes) else 0}")
+
+    for device in dns:
+        if device:
+            servers = dns[device]['dns-servers'].split()
+            families['netcheck_dns_servers'][2].append(metric_labels(link=device) + f' {len(servers)}')
+
+    return format_metric_families(families)
+
+#----------------------------------------------------------------------------------------------------------------------
+# format_test_metrics - Render connectivity test results (result, round trip time, loss, throughput) as OpenMetrics
+#----------------------------------------------------------------------------------------------------------------------
+def format_test_metrics(results):
+
+    families = {
+        'netcheck_test_success':                        ('gauge', 'Connectivity test passed', []),
+        'netcheck_test_rtt_seconds':                    ('gauge', 'Average round trip time of a ping test', []),
+        'netcheck_test_packet_loss_ratio':              ('gauge', 'Packet loss of a ping test', []),
+        'netcheck_downlink_throughput_bits_per_second': ('gauge', 'Brief downlink throughput', []),
+    }
+
+    for (name, result) in results.items():
+        families['netcheck_test_success'][2].append(metric_labels(test=name) + f" {1 if result['result'] == 'PASS' else 0}")
+
+        # The native ICMP engine reports a latency summary, the ping command only an average ('1.234 ms')
+        latency = result.get('latency', {})
+        match = re.match(r'([\d.]+) ms', str(result.get('rtt', '')))
+        if 'avg' in latency:
+            families['netcheck_test_rtt_seconds'][2].append(metric_labels(test=name) + f" {latency['avg'] / 1000:.6f}")
+        elif match and result['result'] == 'PASS':
+            families['netcheck_test_rtt_seconds'][2].append(metric_labels(test=name) + f' {float(match.group(1)) / 1000:.6f}')
+        if 'loss' in latency:
+            families['netcheck_test_packet_loss_ratio'][2].append(metric_labels(test=name) + f" {latency['loss'] / 100:.4f}")
+
+    if 'bps' in results['downlink-throughput']:
+        families['netcheck_downlink_throughput_bits_per_second'][2].append(f" {results['downlink-throughput']['bps']}")
+
+    return format_metric_families(families)
+
+#----------------------------------------------------------------------------------------------------------------------
+# format_collection_metrics - Render the duration, time and success of the latest collection of each schedule
+#----------------------------------------------------------------------------------------------------------------------
+def format_collection_metrics(cache):
+
+    families = {
+        'netcheck_collection_duration_seconds':  ('gauge', 'Duration of the latest collection', []),
+        'netcheck_collection_timestamp_seconds': ('gauge', 'Completion time of the latest collection', []),
+        'netcheck_collection_success':           ('gauge', 'Latest collection succeeded', []),
+    }
+
+    for stage in cache:
+        if cache[stage]['collection'] is None:
+            continue
+        (duration, completed, success) = cache[stage]['collection']
+
+        families['netcheck_collection_duration_seconds'][2].append(metric_labels(stage=stage) + f' {duration:.6f}')
+        families['netcheck_collection_timestamp_seconds'][2].append(metric_labels(stage=stage) + f' {completed:.3f}')
+        families['netcheck_collection_success'][2].append(metric_labels(stage=stage) + f' {1 if success else 0}')
+
+    return format_metric_families(families)
+
+#----------------------------------------------------------------------------------------------------------------------
+# format_metric_families - Render metric families given as {name: (type, help, [labels and value, ...])}
+#----------------------------------------------------------------------------------------------------------------------
+def format_metric_families(families):
+
+    lines = []
+    for (name, (metric_type, description, samples)) in families.items():
+        if not samples:
+            continue
+
+        # Info metrics carry an _info suffix on their samples only
+        lines.append(f'# TYPE {name} {metric_type}')
+        lines.append(f'# HELP {name} {description}.')
+        sample_name = name + '_info' if metric_type == 'info' else name
+        lines += [sample_name + sample for sample in samples]
+
+    return '\n'.join(lines) + '\n' if lines else ''
+
+#----------------------------------------------------------------------------------------------------------------------
+# bandwidth_server   - Accept bandwidth tests from 'netcheck --bw-client' and report each finished test
+#----------------------------------------------------------------------------------------------------------------------
+def bandwidth_server():
+
+    try:
+        server = open_bandwidth_server()
+    except OSError as e:
+        print(f"\nERROR: Cannot listen on {args.bw_address} port {args.bw_port}. Please choose another --bw-port or --bw-address.")
+        print(f'       {e}')
+        exit(120)
+
+    if not args.json:
+        print(f'netcheck --bw-server: listening on {args.bw_address} port {args.bw_port}' +
+              (f' ({args.bw_interface})' if args.bw_interface else '') + ', Ctrl-C to exit', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        server.server_close()
+
+#----------------------------------------------------------------------------------------------------------------------
+# open_bandwidth_server - Bind the bandwidth test server to --bw-address (and --bw-interface), not yet serving
+#----------------------------------------------------------------------------------------------------------------------
+def open_bandwidth_server():
+
+    # Notes:
+    # - Every stream opens its own connection with a hello naming the test (token), its direction, streams and duration
+    # - Uploads are counted here and the (bytes, seconds) received are returned to the client once it stops sending
+    # - A test is reported once all of its streams have ended, tests with a failed stream are not reported
+    # - Hellos asking for more than BANDWIDTH_MAX_STREAMS streams are dropped, so a client cannot make the server hold
+    #   an unbounded number of connections open for one test
+    # - Streams of a test run side by side and end within BANDWIDTH_IDLE_TIMEOUT of each other, tests waiting longer
+    #   for their other streams (clients opening fewer than they announced) are dropped when the next connection arrives
+
+    class BandwidthHandler(socketserver.BaseRequestHandler):
+
+        def handle(self):
+            self.request.settimeout(BANDWIDTH_IDLE_TIMEOUT)
+            try:
+                hello = recv_exact(self.request, BANDWIDTH_HELLO.size)
+            except OSError:
+                return
+            if len(hello) != BANDWIDTH_HELLO.size:
+                return
+            (magic, version, reverse, streams, duration, token) = BANDWIDTH_HELLO.unpack(hello)
+            if magic != BANDWIDTH_MAGIC or version != 1 or not 1 <= streams <= BANDWIDTH_MAX_STREAMS:
+                return
+
+            try:
+                if reverse:
+                    start = time.monotonic()
+                    sent = bandwidth_send(self.request, start + min(duration, BANDWIDTH_MAX_DURATION))
+                    stream = (sent, time.monotonic() - start)
+                    self.request.shutdown(socket.SHUT_WR)
+                else:
+                    stream = bandwidth_receive(self.request)
+                    self.request.sendall(BANDWIDTH_RESULT.pack(*stream))
+            except OSError:
+                stream = None
+
+            # Tests are kept as (time their last stream ended, streams) until all of their streams have ended
+            with self.server.tests_lock:
+                (_, test) = self.server.tests.get(token, (0, []))
+                test.append(stream)
+                if len(test) < streams:
+                    self.server.tests[token] = (time.monotonic(), test)
+                    return
+                self.server.tests.pop(token, None)
+
+            if None in test:
+                return
+            peer = self.client_address[0].replace('::ffff:', '')
+            result = bandwidth_summary(peer, route_device(peer), 'send' if reverse else 'receive', test)
+            if args.ndjson:
+                emit_record('bandwidth', result)
+            elif args.json:
+                with output_lock:
+                    print(json.dumps(result), flush=True)
+            else:
+                with output_lock:
+                    print(f"{result['peer']} via {result['interface'] or 'unknown'} ({result['direction']}): {result['rate']}"
+                          f"{format_link_utilization(result)}, {len(test)} streams, {result['seconds']} s", flush=True)
+
+    # The IPv6 wildcard address is dual stack, so both address families reach the same port
+    class BandwidthServer(socketserver.ThreadingTCPServer):
+        address_family = socket.AF_INET6 if ':' in args.bw_address else socket.AF_INET
+        allow_reuse_address = True
+        daemon_threads = True
+
+        def __init__(self, address, handler):
+            self.tests = {}     # Test token: (time the last stream ended, streams ended so far)
+            self.tests_lock = threading.Lock()
+            super().__init__(address, handler)
+
+        # Called on each accepted connection, before it is handed to a handler thread
+        def verify_request(self, request, client_address):
+            expired = time.monotonic() - BANDWIDTH_IDLE_TIMEOUT
+            with self.tests_lock:
+                for token in [token for (token, (ended, _)) in self.tests.items() if ended < expired]:
+                    del self.tests[token]
+            return True
+
+        def server_bind(self):
+            if args.bw_address == '::':
+                self.socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+            if args.bw_interface:
+                bind_device(self.socket, args.bw_interface)
+            super().server_bind()
+
+    return BandwidthServer((args.bw_address, args.bw_port), BandwidthHandler)
+
+#----------------------------------------------------------------------------------------------------------------------
+# bandwidth_client   - Measure TCP throughput to a 'netcheck --bw-server' over parallel streams of fixed duration
+#----------------------------------------------------------------------------------------------------------------------
+def bandwidth_client():
+
+    btable = []     # Bandwidth table
+
+    try:
+        (family, _, _, _, address) = socket.getaddrinfo(args.bw_client, args.bw_port, type=socket.SOCK_STREAM)[0]
+    except OSError as e:
+        print(f"\nERROR: Cannot resolve bandwidth server '{args.bw_client}'.")
+        print(f'       {e}')
+        exit(120)
+
+    token = int.from_bytes(os.urandom(8), 'big')
+    hello = BANDWIDTH_HELLO.pack(BANDWIDTH_MAGIC, 1, args.bw_reverse, args.bw_streams, args.bw_duration, token)
+
+    # Streams connect first and start transferring together, so each one runs for the whole duration
+    connected = threading.Barrier(args.bw_streams)
+
+    def stream(_):
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            try:
+                if args.bw_interface:
+                    bind_device(sock, args.bw_interface)
+                sock.settimeout(args.bw_duration + args.test_timeout)
+                sock.connect(address)
+                connected.wait()
+            except (OSError, threading.BrokenBarrierError):
+                connected.abort()
+                raise
+
+            sock.sendall(hello)
+            if args.bw_reverse:
+                return bandwidth_receive(sock)
+
+            start = time.monotonic()
+            bandwidth_send(sock, start + args.bw_duration)
+            sock.shutdown(socket.SHUT_WR)
+            return BANDWIDTH_RESULT.unpack(recv_exact(sock, BANDWIDTH_RESULT.size))
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.bw_streams) as pool:
+            streams = list(pool.map(stream, range(args.bw_streams)))
+    except (OSError, struct.error, threading.BrokenBarrierError) as e:
+        print(f"\nERROR: Bandwidth test to {args.bw_client} port {args.bw_port} failed. Is 'netcheck --bw-server' running there?")
+        print(f'       {e}')
+        exit(120)
+
+    result = bandwidth_summary(args.bw_client, args.bw_interface or route_device(address[0]),
+                               'receive' if args.bw_reverse else 'send', streams)
+
+    if args.ndjson:
+        emit_record('bandwidth', result)
+        return
+    if args.json:
+        print(json.dumps(result))
+        return
+
+    # Aggregate rate is shown next to the negotiated speed of the interface the streams leave through
+    speed = format_bits(result['speed']) if result['speed'] else ''
+    btable.append(['STREAM', 'INTERFACE', 'LINK SPEED', 'BYTES', 'SECONDS', 'RATE'])
+    for (index, entry) in enumerate(result['streams']):
+        btable.append([str(index + 1), result['interface'], speed, str(entry['bytes']), str(entry['seconds']), entry['rate']])
+    btable.append(['TOTAL', result['interface'], speed, str(result['bytes']), str(result['seconds']),
+                   result['rate'] + format_link_utilization(result)])
+
+    print_table(args, f"Bandwidth {'from' if args.bw_reverse else 'to'} {args.bw_client} ({result['direction']})", btable)
+
+#----------------------------------------------------------------------------------------------------------------------
+# bandwidth_send     - Send zeros until the stop time (sendfile from an in-memory file, or a memoryview send loop)
+#----------------------------------------------------------------------------------------------------------------------
+def bandwidth_send(sock, stop):
+
+    block = 1024 * 1024
+    sent = 0
+
+    # The page cache of an anonymous memory file is handed to the socket without copying through user space
+    if hasattr(os, 'memfd_create'):
+        with open(os.memfd_create('netcheck-bw'), 'w+b') as source:
+            source.truncate(block)
+            while time.monotonic() < stop:
+                sent += sock.sendfile(source, 0, block)
+        return sent
+
+    view = memoryview(bytearray(block))
+    while time.monotonic() < stop:
+        sent += sock.send(view)
+    return sent
+
+#----------------------------------------------------------------------------------------------------------------------
+# bandwidth_receive  - Receive into a reused buffer until the peer stops sending, returning (bytes, seconds)
+#----------------------------------------------------------------------------------------------------------------------
+def bandwidth_receive(sock):
+
+    buffer = bytearray(1024 * 1024)
+    received = 0
+
+    # Time runs from the first byte so connection setup is not counted against the stream
+    count = sock.recv_into(buffer)
+    start = time.monotonic()
+    while count:
+        received += count
+        count = sock.recv_into(buffer)
+
+    return (received, time.monotonic() - start)
+
+#----------------------------------------------------------------------------------------------------------------------
+# bandwidth_summary  - Aggregate per-stream (bytes, seconds) into a bandwidth result with the link speed of interface
+#----------------------------------------------------------------------------------------------------------------------
+def bandwidth_summary(peer, interface, direction, streams):
+
+    # Streams run side by side, so the aggregate rate is the total over the longest stream
+    received = sum(stream[0] for stream in streams)
+    seconds = max(stream[1] for stream in streams)
+    bps = 8 * received / seconds if seconds > 0 else 0
+
+    return {
+        'peer':         peer,
+        'interface':    interface,
+        'speed':        link_speed(interface) if interface else None,
+        'direction':    direction,
+        'bytes':        received,
+        'seconds':      round(seconds, 3),
+        'bps':          round(bps),
+        'rate':         format_bits(bps),
+        'streams':      [{'bytes': stream[0], 'seconds': round(stream[1], 3), 'bps': round(8 * stream[0] / stream[1]) if stream[1] > 0 else 0,
+                          'rate': format_bits(8 * stream[0] / stream[1] if stream[1] > 0 else 0)} for stream in streams]
+    }
+
+#----------------------------------------------------------------------------------------------------------------------
+# format_link_utilization - Share of the negotiated link speed used by a bandwidth result (' (94% of link)')
+#----------------------------------------------------------------------------------------------------------------------
+def format_link_utilization(result):
+    if not result['speed']:
+        return ''
+    return f" ({100 * result['bps'] / result['speed']:.0f}% of {format_bits(result['speed'])})"
+
+#----------------------------------------------------------------------------------------------------------------------
+# recv_exact         - Receive size bytes, or fewer if the peer closes the connection first
+#----------------------------------------------------------------------------------------------------------------------
+def recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+#----------------------------------------------------------------------------------------------------------------------
+# bind_device        - Restrict a socket to one interface (SO_BINDTODEVICE)
+#----------------------------------------------------------------------------------------------------------------------
+def bind_device(sock, ifname):
+    sock.setsockopt(socket.SOL_SOCKET, getattr(socket, 'SO_BINDTODEVICE', 25), ifname.encode())
+
+#----------------------------------------------------------------------------------------------------------------------
+# route_device       - Interface the kernel routes an address through, or '' if it cannot be determined
+#----------------------------------------------------------------------------------------------------------------------
+def route_device(address):
+    try:
+        if args.ip_backend == 'netlink':
+            route = netlink_route_get(address)
+        else:
+            route = json.loads(run_command(['ip', '--json', 'route', 'get', address]).stdout.decode())
+        return route[0].get('dev', '')
+    except Exception:
+        return ''
+
+#----------------------------------------------------------------------------------------------------------------------
+# link_speed         - Negotiated speed of an interface in bits per second from sysfs, or None when unknown
+#----------------------------------------------------------------------------------------------------------------------
+def link_speed(ifname):
+    speed = read_sysfs_file(os.path.join(args.sysfs_root, 'class', 'net', ifname, 'speed'))
+    return int(speed) * 1000000 if speed and speed.isdigit() and int(speed) > 0 else None
+
+#----------------------------------------------------------------------------------------------------------------------
+# mesh               - Probe every peer listed in the peers file from this node and report latency per peer
+#----------------------------------------------------------------------------------------------------------------------
+def mesh():
+
+    # Notes:
+    # - Peers are resolved concurrently, then probed --mesh-concurrency at a time from a single ICMP select loop
+    # - Each node's -j output is one row of the cluster matrix assembled with --mesh-matrix
+
+    mtable = []     # Mesh table
+
+    peers = read_peers(args.mesh)
+    node = socket.gethostname()
+
+    def resolve(peer):
+        try:
+            return socket.getaddrinfo(peer[1] or peer[0], None, type=socket.SOCK_DGRAM)[0][4][0]
+        except socket.gaierror as e:
+            return e
+
+    with timed('resolve_peers', args.mesh):
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            addresses = list(pool.map(resolve, peers))
+
+    # Peers sharing an address are probed once
+    targets = list(dict.fromkeys(address for address in addresses if isinstance(address, str)))
+    latency = {}
+    try:
+        for batch in range(0, len(targets), args.mesh_concurrency):
+            with timed('icmp_probe', f'{batch + 1}-{min(batch + args.mesh_concurrency, len(targets))} of {len(targets)}'):
+                latency.update(icmp_probe(targets[batch:batch + args.mesh_concurrency], count=args.mesh_count,
+                                          interval=0.2, timeout=1.0))
+    except OSError as e:
+        print("\nERROR: Cannot open an ICMP socket. --mesh requires root or a net.ipv4.ping_group_range including this user.")
+        print(f'       {e}')
+        exit(120)
+
+    results = {}
+    for ((name, _), address) in zip(peers, addresses):
+        if isinstance(address, str):
+            results[name] = latency[address]
+        else:
+            results[name] = {'address': '', 'sent': 0, 'received': 0, 'loss': 100.0, 'error': str(address)}
+
+    if args.ndjson:
+        for (name, summary) in results.items():
+            emit_record('mesh', dict(summary, node=node, peer=name))
+        return
+    if args.json:
+        print(json.dumps({'node': node, 'peers': results}))
+        return
+
+    # Peers well above the median round trip time of this node (or losing probes) are marked as outliers
+    threshold = outlier_threshold([summary['p50'] for summary in results.values() if 'p50' in summary])
+    columns = ['min', 'p50', 'p90', 'p99', 'max', 'jitter']
+
+    mtable.append(['PEER', 'ADDRESS', 'SENT', 'RECEIVED', 'LOSS', 'MIN', 'P50', 'P90', 'P99', 'MAX', 'JITTER'])
+    for (name, summary) in results.items():
+        row = [name, summary['address'] or summary.get('error', ''), str(summary['sent']), str(summary['received']),
+               f"{summary['loss']}%" + (OUTLIER_MARK if summary['loss'] else '')]
+        row += [str(summary[column]) if column in summary else '' for column in columns]
+        if summary.get('p50', 0) > threshold:
+            row[6] += OUTLIER_MARK
+        mtable.append(row)
+
+    print_table(args, f'Mesh Latency from {node} (ms, {OUTLIER_MARK.strip()} = outlier)', mtable, outliers=True)
+
+#----------------------------------------------------------------------------------------------------------------------
+# mesh_matrix        - Combine the --mesh -j output of every node into a node by peer matrix of median latency
+#----------------------------------------------------------------------------------------------------------------------
+def mesh_matrix():
+
+    xtable = []     # Matrix table
+
+    rows = {}
+    for path in args.mesh_matrix:
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            rows[result['node']] = result['peers']
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"\nERROR: Cannot read mesh results from '{path}'. Please provide the output of 'netcheck --mesh PEERS -j'.")
+            print(f'       {e}')
+            exit(120)
+
+    # Peers in the order first listed, cells beyond the cluster wide median latency (or losing probes) are outliers
+    peers = list(dict.fromkeys(peer for node in rows for peer in rows[node]))
+    threshold = outlier_threshold([summary['p50'] for node in rows for summary in rows[node].values() if 'p50' in summary])
+
+    def outlier(summary):
+        return bool(summary['loss'] or summary.get('p50', 0) > threshold)
+
+    def cell(node, peer):
+        if node == peer:
+            return '-'
+        summary = rows[node].get(peer)
+        if summary is None:
+            return ''
+        text = str(summary['p50']) if 'p50' in summary else 'down'
+        if summary['loss']:
+            text += f" ({summary['loss']}%)"
+        return text + (OUTLIER_MARK if outlier(summary) else '')
+
+    # Records are those of --mesh, one per node and peer, flagged against the cluster wide threshold
+    if args.ndjson:
+        for node in rows:
+            for (peer, summary) in rows[node].items():
+                emit_record('mesh', dict(summary, node=node, peer=peer, outlier=outlier(summary)))
+        return
+    if args.json:
+        print(json.dumps({'threshold': threshold, 'nodes': rows}))
+        return
+
+    xtable.append(['NODE'] + peers)
+    for node in rows:
+        xtable.append([node] + [cell(node, peer) for peer in peers])
+
+    print_table(args, f'Mesh Latency Matrix (p50 ms (loss), {OUTLIER_MARK.strip()} = outlier above {threshold} ms)', xtable, outliers=True)
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_peers         - Parse a peers file: one 'name [address]' per line, blank lines and # comments are ignored
+#----------------------------------------------------------------------------------------------------------------------
+def read_peers(path):
+
+    peers = []
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split('#', 1)[0].split()
+                if fields:
+                    peers.append((fields[0], fields[1] if len(fields) > 1 else ''))
+    except OSError as e:
+        print(f"\nERROR: Cannot read peers file '{path}'.")
+        print(f'       {e}')
+        exit(120)
+
+    return peers
+
+#----------------------------------------------------------------------------------------------------------------------
+# outlier_threshold  - Latency above which a value is an outlier: three times the median, and at least 1 ms above it
+#----------------------------------------------------------------------------------------------------------------------
+def outlier_threshold(values):
+    if not values:
+        return math.inf
+    ordered = sorted(values)
+    median = ordered[len(ordered) // 2]
+    return round(max(3 * median, median + 1), 3)
+
+#----------------------------------------------------------------------------------------------------------------------
+# fleet              - Run netcheck on many hosts concurrently and merge their records into fleet wide tables
+#----------------------------------------------------------------------------------------------------------------------
+def fleet():
+    global run_id
+
+    # Notes:
+    # - Each host runs --fleet-command through --fleet-transport (ssh by default, any command prefix for testing)
+    # - The remote run streams --ndjson records, so a host cut off by its timeout still contributes what it sent
+    # - Firmware is compared per driver, since versions of different drivers are unrelated
+
+    htable = []     # Host table
+    ftable = []     # Firmware table
+    ttable = []     # Failed test table
+
+    hosts = read_hosts(args.fleet)
+
+    def collect(host):
+        command = shlex.split(args.fleet_transport.replace('{host}', host)) + [args.fleet_command]
+        start = time.monotonic()
+        result = {'host': host, 'status': 'OK', 'seconds': 0.0, 'error': '', 'records': []}
+
+        try:
+            completed = run_command(command, timeout=args.fleet_timeout)
+            (stdout, stderr, returncode) = (completed.stdout, completed.stderr, completed.returncode)
+        except subprocess.TimeoutExpired as e:
+            (stdout, stderr, returncode) = (e.stdout or b'', e.stderr or b'', None)
+            result['status'] = 'TIMEOUT'
+        except OSError as e:
+            (stdout, stderr, returncode) = (b'', str(e).encode(), None)
+            result['status'] = 'ERROR'
+
+        for line in stdout.decode(errors='replace').splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and 'type' in record:
+                result['records'].append(record)
+
+        # ssh reports connection failures with exit status 255, a run without its end record was cut short
+        if returncode == 255:
+            result['status'] = 'UNREACHABLE'
+        elif returncode:
+            result['status'] = f'ERROR ({returncode})'
+        elif result['status'] == 'OK' and not any(record['type'] == 'run' and record['data'].get('event') == 'end'
+                                                  for record in result['records']):
+            result['status'] = 'PARTIAL'
+        if result['status'] != 'OK':
+            result['error'] = (stderr.decode(errors='replace').strip().splitlines() or [''])[-1]
+
+        result['seconds'] = round(time.monotonic() - start, 3)
+        return result
+
+    if not args.json: print(f'\r[ COLLECTING 0/{len(hosts)} ] ', end='', flush=True)
+    results = {}
+    with ThreadPoolExecutor(max_workers=args.fleet_jobs) as pool:
+        for (count, result) in enumerate(pool.map(collect, hosts), 1):
+            results[result['host']] = result
+            if not args.json: print(f'\r[ COLLECTING {count}/{len(hosts)} ] ', end='', flush=True)
+    if not args.json: print('\r' + ' ' * (len(str(len(hosts))) * 2 + 16) + '\r', end='')
+
+    # Records of each type by host
+    def records(result, record_type):
+        return [record['data'] for record in result['records'] if record['type'] == record_type]
+
+    # Most common firmware of each driver across the fleet
+    firmware = {}
+    for result in results.values():
+        for entry in records(result, 'interface'):
+            if entry.get('driver') and entry.get('firmware-version'):
+                versions = firmware.setdefault(entry['driver'], {})
+                versions[entry['firmware-version']] = versions.get(entry['firmware-version'], 0) + 1
+    majority = {driver: max(versions.items(), key=operator.itemgetter(1)) for (driver, versions) in firmware.items()}
+
+    differing = []
+    failed = []
+    for result in results.values():
+        for entry in records(result, 'interface'):
+            driver = entry.get('driver')
+            if driver in majority and entry.get('firmware-version') and entry['firmware-version'] != majority[driver][0]:
+                differing.append({'host': result['host'], 'interface': entry['ifname'], 'driver': driver,
+                                  'firmware': entry['firmware-version'], 'majority': majority[driver][0],
+                                  'share': f'{majority[driver][1]}/{sum(firmware[driver].values())}'})
+        for test in records(result, 'test'):
+            if test.get('result') != 'PASS':
+                failed.append({'host': result['host'], **test})
+
+    # Streamed records of every host are re-tagged with the host and carry the ID of this fleet run
+    if args.ndjson:
+        run_id = uuid.uuid4().hex
+        for result in results.values():
+            emit_record('host', {key: result[key] for key in ['host', 'status', 'seconds', 'error']})
+            for record in result['records']:
+                if record['type'] != 'run' and isinstance(record['data'], dict):
+                    emit_record(record['type'], {'host': result['host'], **record['data']})
+        for entry in differing:
+            emit_record('firmware-difference', entry)
+        return
+    if args.json:
+        print(json.dumps({'hosts': results, 'firmware-differences': differing, 'failed-tests': failed}))
+        return
+
+    htable.append(['HOST', 'STATUS', 'SECONDS', 'INTERFACES', 'VLANS', 'FAILED TESTS', 'ERROR'])
+    for result in results.values():
+        htable.append([result['host'], result['status'] if result['status'] == 'OK' else result['status'] + OUTLIER_MARK,
+                       str(result['seconds']), str(len(records(result, 'interface'))), str(len(records(result, 'vlan'))),
+                       str(sum(1 for test in records(result, 'test') if test.get('result') != 'PASS')), result['error']])
+    print_table(args, f'Fleet Hosts ({len(hosts)})', htable, outliers=True)
+
+    if differing:
+        ftable.append(['HOST', 'INTERFACE', 'DRIVER', 'FIRMWARE', 'FLEET MAJORITY', 'SHARE'])
+        for entry in differing:
+            ftable.append([entry['host'], entry['interface'], entry['driver'], entry['firmware'] + OUTLIER_MARK,
+                           entry['majority'], entry['share']])
+        print_table(args, 'Firmware Differing from the Fleet Majority', ftable, outliers=True)
+    else:
+        print('No firmware differences across the fleet.')
+
+    if failed:
+        ttable.append(['HOST', 'TEST', 'RESULT', 'DETAILS'])
+        for test in failed:
+            details = test.get('gateway', '') + ' ' + str(test.get('rtt', '')) if 'rtt' in test else test.get('details', test.get('rate', ''))
+            ttable.append([test['host'], test['test'], test['result'] + OUTLIER_MARK, details.strip()])
+        print_table(args, 'Failed Connectivity Tests', ttable, outliers=True)
+    elif any(records(result, 'test') for result in results.values()):
+        print('No failed connectivity tests across the fleet.')
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_hosts         - Host names from a file (one per line, # comments) or a comma separated list
+#----------------------------------------------------------------------------------------------------------------------
+def read_hosts(hosts):
+
+    if not os.path.isfile(hosts):
+        return [host for host in hosts.split(',') if host]
+
+    return list(dict.fromkeys(name for (name, _) in read_peers(hosts)))
+
+#----------------------------------------------------------------------------------------------------------------------
+# all_netns          - Collect interfaces, VLANs and routes in every network namespace with a bounded pool of workers
+#----------------------------------------------------------------------------------------------------------------------
+def all_netns():
+    global run_id
+
+    # Notes:
+    # - Each namespace is collected by a forked worker that enters it with setns, so no interpreter or ip netns exec
+    #   is started per namespace, and up to --netns-jobs namespaces are collected at the same time
+    # - Workers return a single JSON document over a pipe, pipes are drained as data arrives so no worker blocks
+    # - The PCI device index is built before forking so workers with physical functions or VFs do not each run lspci
+
+    nstable = []    # Namespace table
+
+    namespaces = list_namespaces()
+    if args.interfaces or args.vlans or args.pcie:
+        get_pci_devices()
+
+    pending = list(reversed(namespaces))
+    running = {}    # Pipe read end: (namespace, path, worker pid, data chunks)
+    results = {}
+    poller = select.poll()
+
+    if not args.json: print(f'\r[ COLLECTING 0/{len(namespaces)} ] ', end='', flush=True)
+    while pending or running:
+        while pending and len(running) < args.netns_jobs:
+            (name, path) = pending.pop()
+            (read_fd, write_fd) = os.pipe()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                collect_netns(path, write_fd)
+            os.close(write_fd)
+            running[read_fd] = (name, path, pid, [])
+            poller.register(read_fd, select.POLLIN)
+
+        for (fd, _) in poller.poll():
+            data = os.read(fd, 1 << 16)
+            if data:
+                running[fd][3].append(data)
+                continue
+
+            poller.unregister(fd)
+            os.close(fd)
+            (name, path, pid, chunks) = running.pop(fd)
+            os.waitpid(pid, 0)
+            try:
+                results[name] = json.loads(b''.join(chunks))
+            except ValueError:
+                results[name] = {'interfaces': [], 'records': [], 'routes': [], 'messages': '',
+                                 'error': 'namespace worker exited without a result'}
+            results[name]['path'] = path
+            if not args.json: print(f'\r[ COLLECTING {len(results)}/{len(namespaces)} ] ', end='', flush=True)
+    if not args.json: print('\r' + ' ' * (len(str(len(namespaces))) * 2 + 16) + '\r', end='')
+
+    # Warnings raised by workers are shown once, not once for each namespace
+    for message in dict.fromkeys(results[name]['messages'] for (name, _) in namespaces if results[name]['messages']):
+        print(message, end='')
+
+    # Streamed and exported records are tagged with the namespace they were collected in
+    if args.ndjson:
+        run_id = uuid.uuid4().hex
+        for (name, path) in namespaces:
+            result = results[name]
+            emit_record('netns', {'netns': name, 'path': path, 'error': result['error']})
+            for entry in result['interfaces']:
+                emit_record('vlan' if entry['link'] else 'interface', {'netns': name, **entry})
+            for route in result['routes']:
+                emit_record('route', {'netns': name, **route})
+        return
+    if args.json:
+        print(json.dumps({'namespaces': {name: {key: results[name][key] for key in ['path', 'error', 'interfaces', 'routes']}
+                                         for (name, _) in namespaces}}))
+        return
+
+    nstable.append(['NAMESPACE', 'PATH', 'INTERFACES', 'VLANS', 'ROUTES', 'ERROR'])
+    for (name, path) in namespaces:
+        result = results[name]
+        nstable.append([name, path, str(sum(1 for entry in result['interfaces'] if not entry['link'])),
+                        str(sum(1 for entry in result['interfaces'] if entry['link'])), str(len(result['routes'])),
+                        result['error'] + OUTLIER_MARK if result['error'] else ''])
+    print_table(args, f'Network Namespaces ({len(namespaces)})', nstable, outliers=True)
+
+    # Interface and VLAN records of each namespace are sorted as in the single namespace tables
+    itable = []     # (namespace, record) of interfaces
+    vtable = []     # (namespace, record) of vlans
+    for (name, _) in namespaces:
+        records = [InterfaceRecord(*values) for values in results[name]['records']]
+        records.sort(key=lambda x: (x.driver, x.port, x.ifname))
+        records.sort(key=lambda x: (0 if x.state == 'UP' else 1 if x.state == 'DOWN' else 2, x.state))
+        itable += [(name, record) for record in records if not record.link]
+        vtable += [(name, record) for record in sorted(records, key=lambda x: (x.link, x.vlanid)) if record.link]
+
+    # Tables of (namespace, record) pairs are projected like record tables, with the namespace as first column
+    def project_netns(columns, pairs):
+        view = project_table(columns, [])
+        return TableView(['NAMESPACE'] + view.header, lambda pair: (pair[0],) + view.getter(pair[1]), pairs)
+
+    if args.interfaces:
+        if itable:
+            print_table(args, 'Physical Interfaces', project_netns([('ID', 'ifindex'), ('INTERFACE', 'ifname'),
+                        ('MAC ADDRESS', 'address'), ('STATE', 'state'), ('IP ADDRESSES', 'ip'), ('DRIVER', 'driver'),
+                        ('BUS', 'bus'), ('SPEED', 'speed'), ('PORT', 'port')], itable))
+        else:
+            print('No network interfaces found.')
+    if args.vlans:
+        if vtable:
+            print_table(args, 'VLAN Interfaces', project_netns([('ID', 'ifindex'), ('INTERFACE', 'ifname'), ('LINK', 'link'),
+                        ('VID', 'vlanid'), ('MAC ADDRESS', 'address'), ('STATE', 'state'), ('IP ADDRESSES', 'ip')], vtable))
+        else:
+            print('No VLANs configured.')
+    if args.routes:
+        rtable = [(name, RouteRecord(route)) for (name, _) in namespaces for route in results[name]['routes']]
+        if rtable:
+            print_table(args, 'Route Table', project_netns([('DESTINATION', 'dst'), ('GATEWAY', 'gateway'), ('INTERFACE', 'dev'),
+                        ('PROTOCOL', 'protocol'), ('METRIC', 'metric')], rtable))
+        else:
+            print('No routes found.')
+
+#----------------------------------------------------------------------------------------------------------------------
+# list_namespaces    - Network namespaces as (name, path): this one, those named in /run/netns, then those of processes
+#----------------------------------------------------------------------------------------------------------------------
+def list_namespaces():
+
+    # Namespaces are identified by the device and inode of their nsfs file, the first name found for each is kept
+    namespaces = {}
+
+    def add(name, path):
+        try:
+            status = os.stat(path)
+        except OSError:
+            return      # namespace removed or process exited while listing
+        namespaces.setdefault((status.st_dev, status.st_ino), (name, path))
+
+    add('default', '/proc/self/ns/net')
+
+    try:
+        for name in sorted(os.listdir('/run/netns')):
+            add(name, os.path.join('/run/netns', name))
+    except OSError:
+        pass    # no named namespaces
+
+    for pid in sorted((entry for entry in os.listdir('/proc') if entry.isdigit()), key=int):
+        path = f'/proc/{pid}/ns/net'
+        try:
+            status = os.stat(path)
+            if (status.st_dev, status.st_ino) in namespaces:
+                continue
+            with open(f'/proc/{pid}/comm') as f:
+                command = f.read().strip()
+        except OSError:
+            continue
+        add(f'pid {pid} ({command})', path)
+
+    return list(namespaces.values())
+
+#----------------------------------------------------------------------------------------------------------------------
+# collect_netns      - Worker: enter the network namespace at path, collect it and write the result to write_fd (exits)
+#----------------------------------------------------------------------------------------------------------------------
+def collect_netns(path, write_fd):
+    global netlink_snapshot
+    global static_facts
+
+    # Notes:
+    # - Interfaces and routes are dumped over rtnetlink, the socket is opened after setns so it reports this namespace
+    # - sysfs shows the interfaces of the namespace it was mounted from, so /sys is remounted in a private mount
+    #   namespace as ip netns exec does, falling back to ethtool (which follows the network namespace) if not permitted
+    # - The hardware facts cache is keyed by interface name, which is not unique across namespaces, so it is bypassed
+
+    sys.stdout = io.StringIO()
+    result = {'interfaces': [], 'records': [], 'routes': [], 'messages': '', 'error': ''}
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        with open(path) as f:
+            if libc.setns(f.fileno(), CLONE_NEWNET) != 0:
+                raise OSError(ctypes.get_errno(), f'setns {path}: {os.strerror(ctypes.get_errno())}')
+        if args.backend != 'ethtool' and not remount_sysfs(libc):
+            args.backend = 'ethtool'
+
+        netlink_snapshot = None
+        static_facts = {}
+        args.ip_backend = 'netlink'
+        args.no_cache = True
+        args.json = True
+        args.ndjson = False
+
+        entries = [entry for entry in netlink_interfaces() if entry['ifname'] != 'lo' and (entry['operstate'] == 'UP' or not args.up)]
+        records = collect_interfaces(entries)
+        result['interfaces'] = entries
+        result['records'] = [[getattr(record, name) for name in InterfaceRecord.__slots__] for record in records]
+
+        if args.routes:
+            for route in read_routes():
+                for key in RouteRecord.__slots__:
+                    route.setdefault(key, '')
+                result['routes'].append(route)
+
+    except BaseException as e:
+        result['error'] = str(e) or type(e).__name__
+
+    try:
+        result['messages'] = sys.stdout.getvalue()
+        with os.fdopen(write_fd, 'w') as f:
+            f.write(json.dumps(result))
+    finally:
+        os._exit(0)
+
+#----------------------------------------------------------------------------------------------------------------------
+# remount_sysfs      - Mount a sysfs of the current network namespace over /sys in a new private mount namespace
+#----------------------------------------------------------------------------------------------------------------------
+def remount_sysfs(libc):
+
+    # Mount events must not propagate back to the host, the old /sys is detached since it may still be busy
+    if libc.unshare(CLONE_NEWNS) != 0:
+        return False
+    if libc.mount(b'none', b'/', None, MS_REC | MS_SLAVE, None) != 0:
+        return False
+    libc.umount2(b'/sys', MNT_DETACH)
+
+    return libc.mount(b'sysfs', b'/sys', b'sysfs', 0, None) == 0
+
+#----------------------------------------------------------------------------------------------------------------------
+# facts              - Write a versioned snapshot of interface, VLAN and default gateway facts for the Puppet fact
+#----------------------------------------------------------------------------------------------------------------------
+def facts():
+
+    # Notes:
+    # - The netcheck fact (lib/facter/netcheck.rb) only reads this file and starts netcheck --facts in the background
+    #   when it is stale, so Puppet runs never wait on a collection
+    # - Hardware facts come from the on-disk cache when still valid, so a refresh rarely runs ethtool or lspci
+    # - The snapshot is compact and versioned, readers ignore versions they do not know
+
+    snapshot = {'version': 1, 'updated': time.time(), 'host': socket.gethostname(), 'interfaces': {}, 'vlans': {}, 'gateway': {}}
+
+    # Tables are not printed while collecting, the snapshot itself is shown with -j
+    show = args.json
+    args.json = True
+    (interfaces, _) = process_ip_addr()
+
+    for entry in interfaces:
+        if entry['ifname'] == 'lo':
+            continue
+        speed = re.match(r'(\d+)Mb/s', entry.get('speed', ''))
+        addresses = [f"{address['local']}/{address['prefixlen']}" for address in entry.get('addr_info', [])]
+        if entry.get('link'):
+            snapshot['vlans'][entry['ifname']] = {'link': entry['link'], 'vlanid': entry.get('vlanid', ''),
+                                                  'state': entry['operstate'], 'addresses': addresses}
+        else:
+            snapshot['interfaces'][entry['ifname']] = {'address': entry['address'], 'state': entry['operstate'],
+                                                       'driver': entry.get('driver', ''), 'firmware': entry.get('firmware-version', ''),
+                                                       'bus': entry.get('bus-info', ''), 'device': entry.get('device-name', ''),
+                                                       'speed': int(speed.group(1)) if speed else None, 'addresses': addresses}
+
+    # Default route with the lowest metric (routes without a metric are preferred, as by the kernel)
+    try:
+        defaults = [route for route in read_routes() if route.get('dst') == 'default']
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        print("\nWARNING: Dependency 'ip' is missing or failing. Please troubleshoot the command 'ip route' and retry.")
+        defaults = []
+    if defaults:
+        route = min(defaults, key=lambda route: route.get('metric') or 0)
+        snapshot['gateway'] = {'address': route.get('gateway', ''), 'dev': route.get('dev', ''), 'metric': route.get('metric') or 0}
+
+    path = os.path.join(args.cache_dir, 'facts.json')
+    if not write_atomic(path, json.dumps(snapshot, separators=(',', ':'))):
+        print(f"\nERROR: Unable to write the facts snapshot '{path}'. Please troubleshoot access to the cache directory and retry.")
+        exit(120)
+
+    if args.ndjson:
+        emit_record('facts', snapshot)
+    elif show:
+        print(json.dumps(snapshot))
+
+#----------------------------------------------------------------------------------------------------------------------
+# watch              - Redraw the requested tables whenever links, addresses or routes change (or every interval)
+#----------------------------------------------------------------------------------------------------------------------
+def watch():
+    global netlink_snapshot
+    global watch_cache
+    global watch_changed
+
+    # Subscribe to change notifications before the first collection so no change can be missed
+    events = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+    events.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_ROUTE))
+
+    watch_cache = {}
+    trigger = 'initial collection'
+
+    try:
+        while True:
+            # Interface and route dumps are always refreshed, per-interface probes only for changed interfaces
+            netlink_snapshot = None
+
+            if not args.json:
+                print('\033[H\033[2J', end='')
+                print(f"netcheck --watch: refreshed {time.strftime('%H:%M:%S')} ({trigger}), Ctrl-C to exit")
+
+            report()
+            sys.stdout.flush()
+
+            watch_changed = set()
+            trigger = wait_for_changes(events, watch_changed)
+
+    except KeyboardInterrupt:
+        print()
+
+    finally:
+        events.close()
+
+#----------------------------------------------------------------------------------------------------------------------
+# wait_for_changes   - Wait for netlink change notifications (up to the watch interval), collecting changed ifindexes
+#----------------------------------------------------------------------------------------------------------------------
+def wait_for_changes(events, changed):
+
+    readable, _, _ = select.select([events], [], [], args.watch)
+    if not readable:
+        return 'interval'
+
+    # Changes tend to arrive in bursts (link down also removes routes, ...) so keep draining briefly
+    settle = time.monotonic() + 0.25
+    while readable:
+        for (kind, body) in netlink_messages(events.recv(1 << 18)):
+            if kind in [RTM_NEWLINK, RTM_DELLINK]:
+                ifindex = struct.unpack_from('=xxHi', body)[1]
+                changed.add(ifindex)
+
+                # A deleted interface drops its cached state (a new interface gets a new ifindex)
+                if kind == RTM_DELLINK:
+                    watch_cache.pop(ifindex, None)
+
+            elif kind in [RTM_NEWADDR, RTM_DELADDR]:
+                changed.add(struct.unpack_from('=BBBBI', body)[4])
+
+        readable, _, _ = select.select([events], [], [], max(0, settle - time.monotonic()))
+
+    return f'{len(changed)} interface change(s)' if changed else 'route change'
+
+#----------------------------------------------------------------------------------------------------------------------
+# process_args - Process all arguments, set defaults, handle basic arg based behaviors
+#----------------------------------------------------------------------------------------------------------------------
+def process_args(argv=None):
+    # Parse command-line parameters
+    parser = argparse.ArgumentParser(
+                description='Review relevant information about network interfaces and perform connectivity tests',
+                epilog='For more details, see ' + __github__,
+                allow_abbrev=True)
+
+    oper_group = parser.add_argument_group('Operational Parameters')
+    filt_group = parser.add_argument_group('Formatting and Filtering')
+    disp_group = parser.add_argument_group('Display Tables')
+
+    oper_group.add_argument('-t', '--test',        action='store_true', help='Perform connectivity tests')
+    oper_group.add_argument('-j', '--json',        action='store_true', help='Export all information in json format')
+    oper_group.add_argument('--ndjson',            action='store_true',
+                                                   help='Stream one json record per line (interface, vlan, route, dns, test) as collected')
+    oper_group.add_argument('-o', '--ovs',         action='store_true', help='Perform Open vSwitch parsing (SUDO required)')
+    oper_group.add_argument('--ovsdb-socket',      default='/var/run/openvswitch/db.sock', metavar='PATH',
+                                                   help='OVSDB socket queried directly when accessible (default: /var/run/openvswitch/db.sock)')
+    oper_group.add_argument('-v', '--version',     action='store_true', help='Display version information')
+    oper_group.add_argument('--backend',           choices=['sysfs', 'ethtool', 'auto'], default='auto',
+                                                   help='Interface detail source: sysfs only, ethtool only, or sysfs with ethtool fallback (default: auto)')
+    oper_group.add_argument('--sysfs-root',        default='/sys', metavar='DIR', help='Root of the sysfs tree to read (default: /sys)')
+    oper_group.add_argument('--ip-backend',        choices=['iproute2', 'netlink'], default='iproute2',
+                                                   help='Interface and route source: ip command or native rtnetlink socket (default: iproute2)')
+    oper_group.add_argument('--netlink-record',    metavar='FILE', help='Save the raw netlink dumps taken during this run to FILE')
+    oper_group.add_argument('--netlink-fixture',   metavar='FILE', help='Parse netlink dumps recorded with --netlink-record instead of the kernel')
+    oper_group.add_argument('--test-timeout',      type=float, default=15, metavar='SECONDS',
+                                                   help='Time limit for each connectivity test (default: 15)')
+    oper_group.add_argument('--deadline',          type=float, default=30, metavar='SECONDS',
+                                                   help='Overall time budget for all connectivity tests (default: 30)')
+    oper_group.add_argument('--ping-engine',       choices=['auto', 'native', 'command'], default='auto',
+                                                   help='Latency probes: in-process ICMP sockets, ping command, or native with ping fallback (default: auto)')
+    oper_group.add_argument('--watch',             type=float, nargs='?', const=5, metavar='SECONDS',
+                                                   help='Redraw on link/address/route changes, or every SECONDS (default: 5)')
+    oper_group.add_argument('--no-cache',          action='store_true', help='Do not read or write the hardware facts cache')
+    oper_group.add_argument('--refresh-cache',     action='store_true', help='Re-probe hardware facts and rewrite the cache')
+    oper_group.add_argument('--cache-ttl',         type=float, default=86400, metavar='SECONDS',
+                                                   help='Maximum age of cached hardware facts (default: 86400)')
+    oper_group.add_argument('--cache-dir',         metavar='DIR',
+                                                   help='Cache directory (default: /var/cache/netcheck as root, ~/.cache/netcheck otherwise)')
+    oper_group.add_argument('--timings',           action='store_true', help='Report wall time of every stage and external command')
+    oper_group.add_argument('--timings-trace',     metavar='FILE',
+                                                   help='Write timing events to FILE in Chrome trace format (implies --timings)')
+    oper_group.add_argument('--record',            metavar='DIR',
+                                                   help='Capture the output of every external command and sysfs read into fixture DIR')
+    oper_group.add_argument('--replay',            metavar='DIR', help='Feed a fixture captured with --record back in instead of the host')
+    oper_group.add_argument('--serve',             type=int, metavar='PORT', help='Serve OpenMetrics on http://ADDRESS:PORT/metrics')
+    oper_group.add_argument('--serve-address',     default='127.0.0.1', metavar='ADDRESS',
+                                                   help='Address the metrics server listens on (default: 127.0.0.1)')
+    oper_group.add_argument('--collect-interval',  type=float, default=60, metavar='SECONDS',
+                                                   help='Interval between interface, route and DNS collections with --serve (default: 60)')
+    oper_group.add_argument('--test-interval',     type=float, default=900, metavar='SECONDS',
+                                                   help='Interval between connectivity test runs with --serve (default: 900)')
+    oper_group.add_argument('--bw-server',         action='store_true', help='Accept TCP bandwidth tests from netcheck --bw-client')
+    oper_group.add_argument('--bw-client',         metavar='HOST', help='Measure TCP bandwidth to netcheck --bw-server on HOST')
+    oper_group.add_argument('--bw-port',           type=int, default=5301, metavar='PORT',
+                                                   help='Port of the bandwidth server (default: 5301)')
+    oper_group.add_argument('--bw-address',        default='127.0.0.1', metavar='ADDRESS',
+                                                   help="Address the bandwidth server listens on, '::' for all (default: 127.0.0.1)")
+    oper_group.add_argument('--bw-interface',      metavar='IFNAME', help='Bind bandwidth test sockets to interface IFNAME')
+    oper_group.add_argument('--bw-streams',        type=int, default=4, metavar='N',
+                                                   help='Parallel TCP streams of the bandwidth test (default: 4)')
+    oper_group.add_argument('--bw-duration',       type=float, default=10, metavar='SECONDS',
+                                                   help='Length of the bandwidth test (default: 10)')
+    oper_group.add_argument('--bw-reverse',        action='store_true', help='Measure from the bandwidth server to this node')
+    oper_group.add_argument('--mesh',              metavar='PEERS_FILE',
+                                                   help="Probe latency to every peer in PEERS_FILE ('name [address]' per line)")
+    oper_group.add_argument('--mesh-count',        type=int, default=5, metavar='N', help='Probes sent to each peer (default: 5)')
+    oper_group.add_argument('--mesh-concurrency',  type=int, default=256, metavar='N',
+                                                   help='Peers probed at the same time (default: 256)')
+    oper_group.add_argument('--mesh-matrix',       nargs='+', metavar='FILE',
+                                                   help='Combine the --mesh -j output of several nodes into a latency matrix')
+    oper_group.add_argument('--fleet',             metavar='HOSTS',
+                                                   help='Run netcheck on every host in HOSTS (a file, one per line, or a comma separated list)')
+    oper_group.add_argument('--fleet-transport',   default='ssh -o BatchMode=yes -o ConnectTimeout=10 {host}', metavar='COMMAND',
+                                                   help="Command prefix reaching a host, '{host}' is replaced (default: ssh -o BatchMode=yes ...)")
+    oper_group.add_argument('--fleet-command',     default='netcheck --ndjson -I -V -t', metavar='COMMAND',
+                                                   help="netcheck command run on each host (default: 'netcheck --ndjson -I -V -t')")
+    oper_group.add_argument('--fleet-timeout',     type=float, default=120, metavar='SECONDS',
+                                                   help='Time limit for each host (default: 120)')
+    oper_group.add_argument('--fleet-jobs',        type=int, default=64, metavar='N',
+                                                   help='Number of hosts reached concurrently (default: 64)')
+    oper_group.add_argument('--all-netns',         action='store_true',
+                                                   help='Collect interfaces, VLANs and routes in every network namespace')
+    oper_group.add_argument('--netns-jobs',        type=int, default=32, metavar='N',
+                                                   help='Number of network namespaces collected concurrently (default: 32)')
+    oper_group.add_argument('--route-lookup',      metavar='ADDR[,ADDR...]',
+                                                   help='Show the route, next hop and interface used to reach each address')
+    oper_group.add_argument('--route-lookup-file', metavar='FILE', help='Look up the addresses listed in FILE (one per line)')
+    oper_group.add_argument('--brief',             action='store_true',
+                                                   help='One-line summary of links, gateway and DNS from sysfs, procfs and cached test results '
+                                                        '(with -t, after running the tests)')
+    oper_group.add_argument('--facts',             action='store_true',
+                                                   help='Write interface, VLAN and gateway facts to facts.json in the cache directory')
+    oper_group.add_argument('--dns-test',          action='store_true',
+                                                   help='Query every DNS server and add latency, timeouts and error counts to the DNS table')
+    oper_group.add_argument('--dns-server',        action='append', metavar='ADDR[:PORT]',
+                                                   help='DNS server to use instead of the resolver configuration, repeat for several')
+    oper_group.add_argument('--dns-names',         metavar='NAME[,NAME...]',
+                                                   help='Names queried by --dns-test (default: [dns] names, or www.cloudflare.com)')
+    oper_group.add_argument('--dns-count',         type=int, default=3, metavar='N',
+                                                   help='Queries of each name sent to each server (default: 3)')
+    oper_group.add_argument('--dns-timeout',       type=float, default=2, metavar='SECONDS',
+                                                   help='Time to wait for each DNS reply (default: 2)')
+    oper_group.add_argument('--rates',             type=float, nargs='?', const=1, metavar='SECONDS',
+                                                   help='Sample interface counters SECONDS apart (default: 1) and show traffic, drop and error rates')
+    oper_group.add_argument('--rates-ethtool',     action='store_true',
+                                                   help='Add per-queue (ethtool -S) counter rates of physical interfaces to the JSON with --rates')
+    oper_group.add_argument('--config',            default='/etc/netcheck.conf', metavar='FILE',
+                                                   help='Configuration file providing defaults (default: /etc/netcheck.conf)')
+    oper_group.add_argument('--throughput-url',    action='append', dest='throughput_urls', metavar='URL',
+                                                   help='Download throughput target, repeat for several (default: [throughput] urls, or a public CDN)')
+    oper_group.add_argument('--throughput-streams', type=int, metavar='N',
+                                                   help='Parallel download streams of the throughput test (default: [throughput] streams, or 4)')
+    oper_group.add_argument('--throughput-duration', type=float, metavar='SECONDS',
+                                                   help='Maximum length of each download stream (default: [throughput] duration, or 5)')
+    oper_group.add_argument('--jobs',              type=int, default=8, metavar='N',
+                                                   help='Number of interfaces to probe concurrently (default: 8, 1 = serial)')
+    
+    filt_group.add_argument('-u', '--up',          action='store_true', help='Only report interfaces that are UP')
+    filt_group.add_argument('-s', '--summary',     action='store_true', help='Print shorter summary of interfaces and VLANs')
+    filt_group.add_argument('-b', '--barebones',   action='store_true', help='Barebones table formatting (narrow, easy import)')
+    filt_group.add_argument('--table',             metavar='TABLE', help='Routes of TABLE (name, number or all, default: main)')
+    filt_group.add_argument('--proto',             metavar='PROTOCOL', help='Only routes installed by PROTOCOL (kernel, static, bgp, ...)')
+    filt_group.add_argument('--dev',               metavar='IFNAME', help='Only routes through interface IFNAME')
+    filt_group.add_argument('--max-rows',          type=int, metavar='N', help='Show at most N rows of each table')
+    filt_group.add_argument('--pager',             action='store_true', help='Page table output through $PAGER (default: less -R -S)')
+
+    disp_group.add_argument('-a', '--all',         action='store_true', help='Display all tables')
+    disp_group.add_argument('-c', '--clear',       action='store_true', help='Clear the console before displaying tables')
+    disp_group.add_argument('-I', '--interfaces',  action='store_true', help='Display interfaces table')
+    disp_group.add_argument('-V', '--vlans',       action='store_true', help='Display vlans table')
+    disp_group.add_argument('-D', '--dns',         action='store_true', help='Display dns table')
+    disp_group.add_argument('-R', '--routes',      action='store_true', help='Display routes table')
+    disp_group.add_argument('-P', '--pcie',        action='store_true', help='Display PCIe table')
+
+    args = parser.parse_args(argv)
+    
+    # Clear screen 
+    if args.clear:
+        os.system('clear')
+
+    # Show version information and exit
+    if args.version:
+        print(os.path.basename(__file__) + ' version ' + __version__)
+        exit(0)
+
+    # Root shares a system wide cache, other users keep their own
+    if args.cache_dir is None:
+        args.cache_dir = '/var/cache/netcheck' if os.geteuid() == 0 else os.path.expanduser('~/.cache/netcheck')
+
+    # A trace file is written from the same events as the timings summary
+    if args.timings_trace:
+        args.timings = True
+
+    # Streaming output replaces tables the same way --json does (the exporter serves metrics instead of printing)
+    if args.ndjson:
+        args.json = True
+    if args.ndjson and args.serve is not None:
+        parser.error('argument --ndjson: not allowed with argument --serve')
+
+    # Fixtures hold everything a run reads: the OVSDB socket and native ping engine are replaced by their commands,
+    #   netlink dumps and sysfs files are stored alongside, and the hardware facts cache is bypassed
+    if args.record and args.replay:
+        parser.error('argument --record: not allowed with argument --replay')
+    if args.record or args.replay:
+        args.ovsdb_socket = ''
+        args.no_cache = True
+        if args.ping_engine == 'auto':
+            args.ping_engine = 'command'
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+        if args.ip_backend == 'netlink' and not args.netlink_record:
+            args.netlink_record = os.path.join(args.record, 'netlink.json')
+    if args.replay:
+        args.sysfs_root = os.path.join(args.replay, 'sys')
+        if not args.netlink_fixture and os.path.exists(os.path.join(args.replay, 'netlink.json')):
+            args.netlink_fixture = os.path.join(args.replay, 'netlink.json')
+
+    # A recorded netlink fixture is only meaningful for the netlink backend
+    if args.netlink_fixture:
+        args.ip_backend = 'netlink'
+
+    # Command-line options take precedence over the configuration file (a missing file leaves the built-in defaults)
+    config = configparser.ConfigParser()
+    try:
+        config.read(args.config)
+        if args.throughput_urls is None:
+            args.throughput_urls = config.get('throughput', 'urls', fallback='').split() or [THROUGHPUT_URL]
+        if args.throughput_streams is None:
+            args.throughput_streams = config.getint('throughput', 'streams', fallback=4)
+        if args.throughput_duration is None:
+            args.throughput_duration = config.getfloat('throughput', 'duration', fallback=5)
+        if args.dns_names is None:
+            args.dns_names = config.get('dns', 'names', fallback='')
+    except (configparser.Error, ValueError) as error:
+        parser.error('configuration file ' + args.config + ': ' + str(error).splitlines()[0])
+
+    # DNS probes are shown in the DNS table, explicit servers are only useful when probed
+    args.dns_names = args.dns_names.replace(',', ' ').split() or ['www.cloudflare.com']
+    if args.dns_server:
+        args.dns_test = True
+    if args.dns_test:
+        args.dns = True
+    if args.dns_count < 1:
+        parser.error('argument --dns-count: must be 1 or greater')
+
+    # Throughput streams need a positive count and length
+    if args.throughput_streams < 1:
+        parser.error('argument --throughput-streams: must be 1 or greater')
+    if args.throughput_duration <= 0:
+        parser.error('argument --throughput-duration: must be greater than 0')
+
+    # A node is either the bandwidth server or a client, tests need streams that run for some time
+    if args.bw_server and args.bw_client:
+        parser.error('argument --bw-client: not allowed with argument --bw-server')
+    if args.bw_streams < 1 or args.bw_streams > BANDWIDTH_MAX_STREAMS:
+        parser.error(f'argument --bw-streams: must be between 1 and {BANDWIDTH_MAX_STREAMS}')
+    if args.bw_duration <= 0 or args.bw_duration > BANDWIDTH_MAX_DURATION:
+        parser.error(f'argument --bw-duration: must be greater than 0 and at most {BANDWIDTH_MAX_DURATION}')
+
+    # Mesh probes need a count and a positive number of peers in flight
+    if args.mesh_count < 1:
+        parser.error('argument --mesh-count: must be 1 or greater')
+    if args.mesh_concurrency < 1:
+        parser.error('argument --mesh-concurrency: must be 1 or greater')
+
+    # The netlink backend selects routing tables by number, only the reserved names are known without rt_tables
+    table_map = {'main': RT_TABLE_MAIN, 'local': 255, 'default': 253, 'all': None}
+    if args.table is None or args.table in table_map:
+        args.route_table_id = table_map[args.table or 'main']
+    elif args.table.isdigit():
+        args.route_table_id = int(args.table)
+    elif args.ip_backend == 'netlink':
+        parser.error('argument --table: only main, local, default, all or a table number with --ip-backend netlink')
+    else:
+        args.route_table_id = None
+
+    # Fleet runs need a positive number of hosts in flight
+    if args.fleet_jobs < 1:
+        parser.error('argument --fleet-jobs: must be 1 or greater')
+
+    # Namespaces are collected from the live kernel by a positive number of workers
+    if args.all_netns and (args.record or args.replay or args.netlink_fixture):
+        parser.error('argument --all-netns: not allowed with a recorded or replayed fixture')
+    if args.netns_jobs < 1:
+        parser.error('argument --netns-jobs: must be 1 or greater')
+
+    # Rates need two samples some time apart
+    if args.rates is not None and args.rates <= 0:
+        parser.error('argument --rates: must be greater than 0')
+
+    # Bound the worker pool to at least a single (serial) worker
+    if args.jobs < 1:
+        parser.error('argument --jobs: must be 1 or greater')
+
+    # If no tables or tests are selected, default to interfaces and vlans (and routes of every namespace with --all-netns)
+    if not ( args.interfaces or args.vlans or args.dns or args.routes or args.pcie or args.test):
+        args.interfaces = True
+        args.vlans = True
+        args.routes = args.all_netns
+
+    # Handle --all flag by setting all tables to true (test must be explictly executed)
+    if args.all:
+        args.interfaces = True
+        args.vlans = True
+        args.dns = True
+        args.routes = True
+        args.pcie = True
+    
+    return args
+
+#----------------------------------------------------------------------------------------------------------------------
+# process_ip_addr - Perform ip addr show and process results
+#----------------------------------------------------------------------------------------------------------------------
+def process_ip_addr():
+
+    interfaces = json.loads('{}')
+    openvswitch = json.loads('{}')
+
+    # Get output of ip addr show command and create a JSON structure on which to hang additional useful information 
+    if args.ip_backend == 'netlink':
+        try:
+            interfaces = netlink_interfaces()
+        except Exception as e:
+            print("\nERROR: Netlink interface dump is failing. Please retry with '--ip-backend iproute2'.")
+            print(f"       {e}")
+            exit(120)
+
+    else:
+        try:
+            result = run_command(['ip', '-detail', '-json', 'address', 'show'])
+            result.check_returncode()
+            interfaces = json.loads(result.stdout.decode())
+
+        except subprocess.CalledProcessError as e:
+            print(f"\nERROR: 'ip' command returned non-zero exit status {e.returncode}.")
+            print(f"       {e}")
+            exit(120)
+        except FileNotFoundError:
+            print("\nERROR: Dependency 'ip' not found. Please install 'ip' or troubleshoot access and retry.")
+            exit(120)
+        except Exception as e:
+            print("\nERROR: Dependency 'ip' is failing. Please troubleshoot the command 'ip address show' and retry.")
+            print(f"       {e}")
+            exit(120)
+
+    # Omit lo interface (not useful) and if the --up flag is used omit any interfaces that are not in the UP state
+    selected = [entry for entry in interfaces if entry['ifname'] != 'lo' and (entry['operstate'] == 'UP' or not args.up)]
+
+    # Traffic counters are sampled before and after interface collection so probing overlaps the sampling interval
+    if args.rates is not None:
+        physical = [entry['ifname'] for entry in selected if not entry.get('link')]
+        first = (time.monotonic(), sample_counters(), sample_queue_counters(physical) if args.rates_ethtool else {})
+
+    # Parse through each network interface returned by ip addr show and collect additional information along the way
+    #   interfaces are probed concurrently, but records are merged back in ip addr show order so output matches serial mode
+    records = collect_interfaces(selected)
+    ovs_found = any(record.driver == 'ovs' for record in records)
+
+    # Take the second sample once the interval has passed and add the rates to the interface JSON and records
+    if args.rates is not None:
+        time.sleep(max(0, first[0] + args.rates - time.monotonic()))
+        second = (time.monotonic(), sample_counters(), sample_queue_counters(physical) if args.rates_ethtool else {})
+        rates = compute_rates(first, second)
+
+        for (entry, record) in zip(selected, records):
+            if entry['ifname'] not in rates:
+                continue
+            entry['rates'] = rates[entry['ifname']]
+            if args.ndjson:
+                emit_record('rates', {'ifname': entry['ifname'], **entry['rates']})
+
+            record.rx = format_bits(entry['rates']['rx-bps']) + '\n' + format_count(entry['rates']['rx-pps'], 'pps')
+            record.tx = format_bits(entry['rates']['tx-bps']) + '\n' + format_count(entry['rates']['tx-pps'], 'pps')
+            record.drops = format_count(entry['rates']['rx-drops-ps'] + entry['rates']['tx-drops-ps'])
+            record.errors = format_count(entry['rates']['rx-errors-ps'] + entry['rates']['tx-errors-ps'])
+
+    # Persist newly probed hardware facts for the next run
+    if any(entry['facts-cache'] == 'miss' for entry in selected):
+        save_static_facts()
+
+    # Split records into the physical interface and VLAN views (both reference the same record objects)
+    itable = [record for record in records if not record.link]      # interfaces
+    vtable = [record for record in records if record.link]          # vlans
+    ptable = [record for record in records if record.description]   # pcie devices
+
+    # Perform OVS post-processing if specified (not default since ovs commands require sudo for basic info access)
+    if ovs_found and args.ovs:
+        (openvswitch, bridge_lookup) = read_openvswitch()
+        if args.ndjson:
+            emit_record('openvswitch', openvswitch)
+
+        # Index interfaces by MAC address in a single pass (bridges share their MAC with the uplink port)
+        mac_lookup = {}
+        for record in itable:
+            mac_lookup.setdefault(record.address, []).append(record.ifname)
+
+        # Overwrite information in the interface records with ovs updated values
+        for record in itable:
+            interface = record.ifname
+
+            # Replace bridge physical device name with PORT for Open vSwitch bridge interfaces
+            if record.driver == 'ovs':
+                if interface in openvswitch['bridges']:
+                    uplinks = [lookup for lookup in mac_lookup[record.address] if lookup != interface]
+                    if uplinks:
+                        record.port = f'[{uplinks[-1]}]'
+                    
+            # Replace PORT with bridge name and BUS with TAG for Open vSwitch ports
+            if record.bus == 'tap':
+                if interface in bridge_lookup:
+                    bridge = bridge_lookup[interface]
+                    port = openvswitch['bridges'][bridge]['ports'][interface]
+
+                    record.port = f'[{bridge}]'
+                    record.driver = 'ovs'
+                    if 'tag' in port:
+                        record.bus = '[VID ' + port['tag'] + ']'
+                    else:
+                        record.bus = '[ACCESS]'
+
+    # If not exporting via JSON, prepare and print tables
+    if not args.json:
+        
+        # Sort interface table by State (IP first, then DOWN, others alphabetically after), Driver, and Interface
+        itable.sort(key=lambda x: (x.driver, x.port, x.ifname))
+        itable.sort(key=lambda x: (0 if x.state == 'UP' else 1 if x.state == 'DOWN' else 2, x.state))
+        
+        # Sort VLAN table by Link, then VID
+        vtable.sort(key=lambda x: (x.link, x.vlanid))
+
+        # Sort PCIe table by BUS ID
+        ptable.sort(key=lambda x: x.bus)
+
+        # Column headers and the record attribute shown in each column
+        columns_summary   = [('ID', 'ifindex'), ('INTERFACE', 'ifname'), ('MAC ADDRESS', 'address'), ('STATE', 'state'),
+                             ('IP ADDRESSES', 'ip'), ('DRIVER', 'driver'), ('BUS', 'bus'), ('SPEED', 'speed'), ('PORT', 'port')]
+        columns_barebones = [('ID', 'ifindex'), ('INT', 'ifname'), ('MAC ADDRESS', 'address'), ('STATE', 'state'),
+                             ('IP ADDRESSES', 'ip'), ('DRIVER', 'driver'), ('F/W', 'firmware'), ('BUS', 'bus'),
+                             ('SPEED', 'speed'), ('PORT', 'port'), ('ALTNAMES', 'altnames')]
+        columns_default   = [('ID', 'ifindex'), ('INTERFACE', 'ifname'), ('MAC ADDRESS', 'address'), ('STATE', 'state'),
+                             ('IP ADDRESSES', 'ip'), ('DRIVER', 'driver'), ('FIRMWARE', 'firmware'), ('BUS', 'bus'),
+                             ('SPEED', 'speed'), ('PORT', 'port'), ('ALTNAMES', 'altnames')]
+        columns = columns_summary if args.summary else (columns_barebones if args.barebones else columns_default)
+
+        # Traffic rate columns are added to both the interface and VLAN tables (--rates)
+        columns_rates = [('RX', 'rx'), ('TX', 'tx'), ('DROPS/S', 'drops'), ('ERRORS/S', 'errors')] if args.rates is not None else []
+        columns += columns_rates
+
+        # Show tables requested
+        if args.interfaces:
+            if itable: 
+                print_table(args, 'Physical Interfaces', project_table(columns, itable))
+            else:
+                print('No network interfaces found.')
+        if args.vlans:
+            if vtable:
+                print_table(args, 'VLAN Interfaces', project_table([('ID', 'ifindex'), ('INTERFACE', 'ifname'), ('LINK', 'link'),
+                            ('VID', 'vlanid'), ('MAC ADDRESS', 'address'), ('STATE', 'state'), ('IP ADDRESSES', 'ip')] + columns_rates,
+                            vtable))
+            else:
+                print('No VLANs configured.')
+        if args.pcie:
+            if ptable:
+                print_table(args, 'PCIe Device Details', project_table([('ID', 'ifindex'), ('INTERFACE', 'ifname'), ('BUS', 'bus'),
+                            ('DESCRIPTION', 'description')], ptable))
+            else:
+                print('No PCIe devices corresponding to network interfaces found.')
+
+    return interfaces, openvswitch
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_openvswitch   - Read the Open vSwitch bridge/port/tag model, returning it with a port to bridge index
+#----------------------------------------------------------------------------------------------------------------------
+def read_openvswitch():
+
+    # Notes:
+    # - The OVSDB JSON-RPC socket is used directly when accessible, otherwise 'sudo ovs-vsctl --format=json list'
+    # - Both sources use the OVSDB wire encoding for values (["uuid", ...], ["set", [...]], ["map", [...]])
+
+    openvswitch = json.loads('{"bridges": {}}')
+    bridge_lookup = {}
+
+    columns = {
+        'Bridge':       ['_uuid', 'name', 'ports'],
+        'Port':         ['_uuid', 'name', 'tag', 'trunks', 'interfaces'],
+        'Interface':    ['_uuid', 'name', 'type', 'ofport']
+    }
+
+    try:
+        if os.access(args.ovsdb_socket, os.R_OK | os.W_OK):
+            tables = read_ovsdb_socket(args.ovsdb_socket, columns)
+        else:
+            tables = read_ovs_vsctl(columns)
+
+    except subprocess.CalledProcessError as e:
+        print(f"\nWARNING: 'ovs-vsctl' command returned non-zero exit status {e.returncode}.")
+        print(f'         {str(e)}')
+        print(f'         Information will be missing from the output.')
+        return openvswitch, bridge_lookup
+    except FileNotFoundError:
+        print(f"\nWARNING: Dependency 'ovs-vsctl' not found. Please install 'ovs-vsctl' or troubleshoot access and retry.")
+        print(f'         Information will be missing from the output.')
+        return openvswitch, bridge_lookup
+    except Exception as e:
+        print(f"\nWARNING: Dependency 'ovs-vsctl' is failing.")
+        print(f'         {str(e)}')
+        print(f'         Information will be missing from the output.')
+        return openvswitch, bridge_lookup
+
+    # Index rows by UUID so references resolve in a single pass over each table
+    ports = {row['_uuid']: row for row in tables['Port']}
+    interfaces = {row['_uuid']: row for row in tables['Interface']}
+
+    for bridge in tables['Bridge']:
+        openvswitch['bridges'][bridge['name']] = json.loads('{"ports": {}}')
+
+        for port_uuid in ovsdb_list(bridge['ports']):
+            if port_uuid not in ports:
+                continue
+            port = ports[port_uuid]
+            members = [interfaces[uuid] for uuid in ovsdb_list(port['interfaces']) if uuid in interfaces]
+
+            values = {'interfaces': [member['name'] for member in members]}
+            if ovsdb_list(port['tag']):
+                values['tag'] = str(ovsdb_list(port['tag'])[0])
+            if ovsdb_list(port['trunks']):
+                values['trunks'] = [str(vid) for vid in ovsdb_list(port['trunks'])]
+            if members and members[0]['type']:
+                values['type'] = members[0]['type']
+
+            openvswitch['bridges'][bridge['name']]['ports'][port['name']] = values
+            bridge_lookup[port['name']] = bridge['name']
+
+    return openvswitch, bridge_lookup
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_ovsdb_socket  - Select the requested tables/columns with a single OVSDB JSON-RPC transact (RFC 7047)
+#----------------------------------------------------------------------------------------------------------------------
+def read_ovsdb_socket(path, columns):
+
+    request = {
+        'method': 'transact',
+        'params': ['Open_vSwitch'] + [{'op': 'select', 'table': table, 'where': [], 'columns': columns[table]} for table in columns],
+        'id': 0
+    }
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(path)
+        sock.sendall(json.dumps(request).encode())
+
+        # The reply is a single JSON object, read until it parses completely
+        buffer = b''
+        while True:
+            data = sock.recv(1 << 16)
+            if not data:
+                raise ConnectionError('OVSDB closed the connection before replying')
+            buffer += data
+            try:
+                reply = json.loads(buffer.decode())
+                break
+            except ValueError:
+                continue
+
+    if reply.get('error') or any('error' in result for result in reply['result']):
+        raise RuntimeError(f"OVSDB transact failed: {reply.get('error') or reply['result']}")
+
+    return {table: [{column: ovsdb_value(row[column]) for column in columns[table]} for row in result['rows']]
+            for (table, result) in zip(columns, reply['result'])}
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_ovs_vsctl     - List the requested tables/columns with a single 'ovs-vsctl --format=json' invocation
+#----------------------------------------------------------------------------------------------------------------------
+def read_ovs_vsctl(columns):
+
+    command = ['sudo', 'ovs-vsctl', '--format=json']
+    for table in columns:
+        command += ['--', '--columns=' + ','.join(columns[table]), 'list', table]
+
+    result = run_command(command)
+    result.check_returncode()
+
+    # One JSON document ({"headings": [...], "data": [[...], ...]}) is printed per list command
+    output = result.stdout.decode()
+    decoder = json.JSONDecoder()
+    tables = {}
+    position = 0
+
+    for table in columns:
+        while output[position:position + 1].isspace():
+            position += 1
+        (document, position) = decoder.raw_decode(output, position)
+        tables[table] = [{heading: ovsdb_value(value) for (heading, value) in zip(document['headings'], row)}
+                         for row in document['data']]
+
+    return tables
+
+#----------------------------------------------------------------------------------------------------------------------
+# ovsdb_value        - Decode an OVSDB wire value (uuid references are returned as UUID strings)
+#----------------------------------------------------------------------------------------------------------------------
+def ovsdb_value(value):
+
+    if isinstance(value, list) and len(value) == 2:
+        if value[0] in ['uuid', 'named-uuid']:
+            return value[1]
+        if value[0] == 'set':
+            return [ovsdb_value(item) for item in value[1]]
+        if value[0] == 'map':
+            return {ovsdb_value(key): ovsdb_value(item) for (key, item) in value[1]}
+
+    return value
+
+#----------------------------------------------------------------------------------------------------------------------
+# ovsdb_list         - Treat an OVSDB column value as a list (a set of one is encoded as the bare value)
+#----------------------------------------------------------------------------------------------------------------------
+def ovsdb_list(value):
+    return value if isinstance(value, list) else [value]
+
+#----------------------------------------------------------------------------------------------------------------------
+# sample_counters    - Read the traffic counters of every interface in a single sweep ({ifname: {counter: value}})
+#----------------------------------------------------------------------------------------------------------------------
+def sample_counters():
+
+    # Notes:
+    # - /proc/net/dev holds the counters of all interfaces in one read, so the sweep costs one file regardless of count
+    # - The per-interface sysfs statistics are read instead for other sysfs roots and --record (so fixtures replay)
+
+    names = ['rx_bytes', 'rx_packets', 'rx_errors', 'rx_dropped', 'tx_bytes', 'tx_packets', 'tx_errors', 'tx_dropped']
+    counters = {}
+
+    if args.sysfs_root == '/sys' and not args.record:
+        try:
+            with open('/proc/net/dev') as f:
+                lines = f.read().split('\n')[2:]
+
+            # Receive columns: bytes packets errs drop ..., transmit columns start at the ninth value
+            for line in lines:
+                if ':' in line:
+                    (ifname, values) = line.split(':', 1)
+                    values = values.split()
+                    counters[ifname.strip()] = {name: int(values[column]) for (name, column) in zip(names, [0, 1, 2, 3, 8, 9, 10, 11])}
+            return counters
+
+        except (OSError, ValueError, IndexError):
+            counters = {}
+
+    netdir = os.path.join(args.sysfs_root, 'class', 'net')
+    try:
+        ifnames = os.listdir(netdir)
+    except OSError:
+        return counters
+
+    for ifname in ifnames:
+        values = {}
+        for name in names:
+            value = read_sysfs_file(os.path.join(netdir, ifname, 'statistics', name))
+            if value is not None and value.isdigit():
+                values[name] = int(value)
+        if len(values) == len(names):
+            counters[ifname] = values
+
+    return counters
+
+#----------------------------------------------------------------------------------------------------------------------
+# sample_queue_counters - Read ethtool -S counters (per-queue and driver specific) of the given interfaces concurrently
+#----------------------------------------------------------------------------------------------------------------------
+def sample_queue_counters(ifnames):
+
+    def read(ifname):
+        try:
+            result = run_command(['ethtool', '-S', ifname])
+            result.check_returncode()
+        except FileNotFoundError:
+            warn_once('ethtool', f"\nWARNING: Dependency 'ethtool' not found. Please install 'ethtool' or troubleshoot access and retry.")
+            return ifname, {}
+        except Exception:
+            # Many drivers (and all virtual interfaces) have no statistics to report
+            return ifname, {}
+
+        values = {}
+        for row in result.stdout.decode().split('\n'):
+            pair = row.split(':')
+            if len(pair) == 2 and pair[1].strip().isdigit():
+                values[pair[0].strip()] = int(pair[1].strip())
+        return ifname, values
+
+    if not ifnames:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(args.jobs, len(ifnames))) as pool:
+        return dict(pool.map(read, ifnames))
+
+#----------------------------------------------------------------------------------------------------------------------
+# compute_rates      - Per second rates between two (time, counters, queue counters) samples, keyed by interface
+#----------------------------------------------------------------------------------------------------------------------
+def compute_rates(first, second):
+
+    elapsed = second[0] - first[0]
+    rates = {}
+
+    for ifname in second[1]:
+        if ifname not in first[1]:
+            continue
+
+        # Counters going backwards mean the interface was recreated (or the counters reset) between samples
+        delta = {name: second[1][ifname][name] - first[1][ifname].get(name, 0) for name in second[1][ifname]}
+        if any(value < 0 for value in delta.values()):
+            continue
+
+        rates[ifname] = {
+            'interval':     round(elapsed, 3),
+            'rx-bps':       round(delta['rx_bytes'] * 8 / elapsed, 1),
+            'tx-bps':       round(delta['tx_bytes'] * 8 / elapsed, 1),
+            'rx-pps':       round(delta['rx_packets'] / elapsed, 1),
+            'tx-pps':       round(delta['tx_packets'] / elapsed, 1),
+            'rx-drops-ps':  round(delta['rx_dropped'] / elapsed, 1),
+            'tx-drops-ps':  round(delta['tx_dropped'] / elapsed, 1),
+            'rx-errors-ps': round(delta['rx_errors'] / elapsed, 1),
+            'tx-errors-ps': round(delta['tx_errors'] / elapsed, 1)
+        }
+
+        # Only ethtool counters that moved are reported, most drivers expose hundreds of mostly idle ones
+        if first[2].get(ifname) and second[2].get(ifname):
+            rates[ifname]['ethtool'] = {name: round((value - first[2][ifname][name]) / elapsed, 1)
+                                        for (name, value) in second[2][ifname].items()
+                                        if name in first[2][ifname] and value > first[2][ifname][name]}
+
+    return rates
+
+#----------------------------------------------------------------------------------------------------------------------
+# format_bits        - Human readable bit rate (b/s, kb/s, Mb/s, Gb/s)
+#----------------------------------------------------------------------------------------------------------------------
+def format_bits(bps):
+    for (scale, unit) in [(1e9, 'Gb/s'), (1e6, 'Mb/s'), (1e3, 'kb/s')]:
+        if bps >= scale:
+            return f'{bps / scale:.1f} {unit}'
+    return f'{bps:.0f} b/s'
+
+#----------------------------------------------------------------------------------------------------------------------
+# format_count       - Human readable per second count with an optional unit (1.2k pps)
+#----------------------------------------------------------------------------------------------------------------------
+def format_count(value, unit=''):
+    for (scale, suffix) in [(1e6, 'M'), (1e3, 'k')]:
+        if value >= scale:
+            return f'{value / scale:.1f}{suffix} {unit}'.rstrip()
+    return f'{value:g} {unit}'.rstrip()
+
+#----------------------------------------------------------------------------------------------------------------------
+# collect_interfaces - Run process_interface for each entry in a bounded worker pool, returning records in entry order
+#----------------------------------------------------------------------------------------------------------------------
+def collect_interfaces(entries):
+
+    # Each interface yields its own record so workers never share mutable state
+    def collect(entry):
+
+        # Watch mode: interfaces without change notifications since the last refresh are served from the last snapshot
+        if watch_cache is not None and entry['ifindex'] in watch_cache and entry['ifindex'] not in watch_changed:
+            (cached_entry, cached_record) = watch_cache[entry['ifindex']]
+            if cached_entry['ifname'] == entry['ifname']:
+                entry.update(cached_entry)
+                if args.ndjson:
+                    emit_record('vlan' if entry['link'] else 'interface', entry)
+                return cached_record.copy()
+
+        with timed('process_interface', entry['ifname']):
+            record = process_interface(entry)
+        if args.ndjson:
+            emit_record('vlan' if entry['link'] else 'interface', entry)
+
+        # Records are copied since Open vSwitch post-processing edits them in place
+        if watch_cache is not None:
+            watch_cache[entry['ifindex']] = (dict(entry), record.copy())
+
+        return record
+
+    # Serial path (no threads) when a single job is requested or there is nothing to overlap
+    if args.jobs == 1 or len(entries) <= 1:
+        return [collect(entry) for entry in entries]
+
+    # Executor.map preserves input order regardless of completion order
+    with ThreadPoolExecutor(max_workers=min(args.jobs, len(entries))) as pool:
+        return list(pool.map(collect, entries))
+
+#----------------------------------------------------------------------------------------------------------------------
+# warn_once          - Print a dependency warning only the first time it is raised (not for each interface)
+#----------------------------------------------------------------------------------------------------------------------
+def warn_once(key, error_text):
+    with errors_lock:
+        if not key in errors:
+            errors.update({key: 'error'})
+            print(error_text)
+            print('         Information will be missing from the output.')
+
+#----------------------------------------------------------------------------------------------------------------------
+# process_interface  - Process ip -detail addr show results, execute ethtool commands, and cleanse data into a record
+#----------------------------------------------------------------------------------------------------------------------
+def process_interface(entry):
+    # Create empty default values for any missing required keys from ip addr show command
+    for key in ['ifindex', 'ifname', 'link', 'address', 'operstate', 'ip']: entry.setdefault(key, '')
+
+    # Get driver, firmware, bus and link details for interface from the selected collector backend
+    entry.update(collect_link_details(entry))
+    
+    # Create empty default values for any missing required keys from ethtool commands
+    for key in ['driver', 'firmware-version', 'bus-info', 'speed', 'port', 'altnames']: entry.setdefault(key, '')
+
+    # Human output record, with multiline listings for IPv4 addresses and altnames
+    record = InterfaceRecord(
+        ifindex   = entry['ifindex'],
+        ifname    = entry['ifname'],
+        link      = entry['link'],
+        address   = entry['address'],
+        ip        = '\n'.join(f"{address['local']}/{address['prefixlen']}" for address in entry['addr_info'] if address['family'] == 'inet'),
+        altnames  = '\n'.join(entry['altnames'])
+    )
+
+    # Remove leading PCI domain in bus info for human output if present in entry
+    record.bus = entry['bus-info'][5:] if entry['bus-info'].startswith('0000:') else entry['bus-info']
+
+    # Get lspci description for interface from the per-run PCI device index (unless already known)
+    entry.setdefault('device-name', '')
+    if record.bus.lower() not in ['n/a', 'tap', '']:
+        if not entry['device-name']:
+            bus_id = entry['bus-info'] if entry['bus-info'].count(':') == 2 else '0000:' + entry['bus-info']
+            entry['device-name'] = get_pci_devices(bus_id).get(bus_id, '')
+        record.description = entry['device-name']
+
+    # Remember static facts so they are not fetched again while the interface exists (cache hits keep their age)
+    if entry['facts-cache'] == 'miss':
+        static_facts[entry['ifname']] = {key: entry[key] for key in ['address', 'driver', 'firmware-version', 'bus-info', 'device-name']}
+        static_facts[entry['ifname']]['updated'] = time.time()
+    
+    # Clean up speed entries for human output
+    speed_map = {
+        'unknown!': '',               '1000mb/s': '1 Gb/s',         '2500mb/s': '2.5 Gb/s',
+        '5000mb/s': '5 Gb/s',         '10000mb/s': '10 Gb/s',       '25000mb/s': '25 Gb/s',
+        '40000mb/s': '40 Gb/s',       '50000mb/s': '50 Gb/s',       '100000mb/s': '100 Gb/s',
+        '200000mb/s': '200 Gb/s',     '400000mb/s': '400 Gb/s',     '800000mb/s': '800 Gb/s'
+    }
+    record.speed = speed_map.get(entry['speed'].lower(), entry['speed'])
+    
+    # Clean up port entries for human output
+    port_map = {
+        'none': '',                   'twisted pair': 'BaseT',      'direct attach copper': 'DAC',
+        'other': ''
+    }
+    record.port = port_map.get(entry['port'].lower(), entry['port'])
+    
+    # Clean up missing information for openvswitch
+    if entry['driver'] in ['openvswitch', 'tun']:
+        entry['port'] = "Virtual"
+        record.port = "Virtual"
+        entry['speed'] = ''
+        record.speed = ''
+
+        if entry['operstate'] == 'UNKNOWN':
+            entry['operstate'] = ''
+        
+        if entry['driver'] == 'openvswitch':
+            entry['driver'] = 'ovs'
+
+    record.state = entry['operstate']
+    record.driver = entry['driver']
+
+    # Chop off firmware version beyond the first space for brevity in human output, remove commas
+    record.firmware = entry['firmware-version'].split(' ')[0].replace(',', '')
+    
+    # Obtain VLAN ID (VID) for VLANs (interfaces with a link end up in the VLAN table, all others are physical)
+    if entry['link']:
+        if 'linkinfo' in entry and 'info_data' in entry['linkinfo'] and 'id' in entry['linkinfo']['info_data']:
+            entry['vlanid'] = entry['linkinfo']['info_data']['id']
+        else:
+            entry['vlanid'] = ''
+        record.vlanid = entry['vlanid']
+
+    return record
+
+#----------------------------------------------------------------------------------------------------------------------
+# InterfaceRecord    - Human readable view of one interface (physical or VLAN), filled once by process_interface
+#----------------------------------------------------------------------------------------------------------------------
+class InterfaceRecord:
+
+    # Notes:
+    # - Slots keep each record compact on hosts with thousands of VLANs and VFs (no per-instance dict)
+    # - Tables are projected from records by attribute name, so no column positions need to be tracked
+
+    __slots__ = ('ifindex', 'ifname', 'link', 'vlanid', 'address', 'state', 'ip', 'driver', 'firmware', 'bus', 'speed',
+                 'port', 'altnames', 'description', 'rx', 'tx', 'drops', 'errors')
+
+    def __init__(self, ifindex='', ifname='', link='', vlanid='', address='', state='', ip='', driver='', firmware='',
+                 bus='', speed='', port='', altnames='', description='', rx='', tx='', drops='', errors=''):
+        self.ifindex     = ifindex
+        self.ifname      = ifname
+        self.link        = link
+        self.vlanid      = vlanid
+        self.address     = address
+        self.state       = state
+        self.ip          = ip
+        self.driver      = driver
+        self.firmware    = firmware
+        self.bus         = bus
+        self.speed       = speed
+        self.port        = port
+        self.altnames    = altnames
+        self.description = description
+        self.rx          = rx
+        self.tx          = tx
+        self.drops       = drops
+        self.errors      = errors
+
+    def copy(self):
+        return InterfaceRecord(*[getattr(self, name) for name in self.__slots__])
+
+#----------------------------------------------------------------------------------------------------------------------
+# collect_link_details - Gather ethtool style details (driver, bus-info, speed, ...) using the --backend selection
+#----------------------------------------------------------------------------------------------------------------------
+def collect_link_details(entry):
+
+    # ethtool queries and the fields each one supplies
+    queries = {
+        '-i': ['driver', 'firmware-version', 'bus-info'],
+        '':   ['speed', 'duplex', 'port', 'link-detected']
+    }
+
+    details = read_sysfs(entry) if args.backend != 'ethtool' else {}
+
+    # The port type is not in sysfs, the live kernel reports it over ethtool netlink instead of an 'ethtool IF' fork
+    #   (fixtures and other sysfs roots describe another host, their interfaces are not asked about)
+    if args.backend != 'ethtool' and args.sysfs_root == '/sys' and not (args.record or args.replay):
+        details.update(read_ethtool_linkinfo(entry['ifname']))
+
+    # Static facts already known for this interface are not fetched again (bypass: --no-cache, nothing looked up)
+    facts = {} if args.no_cache else lookup_static_facts(entry, details)
+    details['facts-cache'] = 'bypass' if args.no_cache else 'hit' if facts else 'miss'
+    for key in facts:
+        details.setdefault(key, facts[key])
+
+    # Only fork ethtool for the queries supplying fields that are still missing (all of them in ethtool mode)
+    if args.backend != 'sysfs':
+        missing = [option for option in queries if any(key not in details for key in queries[option])]
+        if missing:
+            for key, value in read_ethtool(entry['ifname'], missing).items():
+                details.setdefault(key, value)
+
+    return details
+
+#----------------------------------------------------------------------------------------------------------------------
+# lookup_static_facts - Return cached static facts for an interface if they are still valid, otherwise {}
+#----------------------------------------------------------------------------------------------------------------------
+def lookup_static_facts(entry, details):
+
+    # Notes:
+    # - Facts are keyed by (ifname, MAC, bus-info, driver), any difference means the NIC behind the name changed
+    # - bus-info and driver are compared when sysfs supplied them (not available with --backend ethtool)
+
+    facts = static_facts.get(entry['ifname'])
+    if not facts or facts.get('address') != entry['address']:
+        return {}
+    if any(key in details and details[key] != facts.get(key) for key in ['bus-info', 'driver']):
+        return {}
+    if time.time() - facts.get('updated', 0) > args.cache_ttl:
+        return {}
+
+    return {key: facts[key] for key in ['driver', 'firmware-version', 'bus-info', 'device-name'] if key in facts}
+
+#----------------------------------------------------------------------------------------------------------------------
+# load_static_facts  - Read the persistent hardware facts cache (an unreadable or corrupt cache is simply empty)
+#----------------------------------------------------------------------------------------------------------------------
+def load_static_facts():
+    try:
+        with open(os.path.join(args.cache_dir, 'hwfacts.json')) as f:
+            cache = json.load(f)
+        return cache['interfaces'] if cache.get('version') == 1 else {}
+    except (OSError, ValueError, KeyError, AttributeError):
+        return {}
+
+#----------------------------------------------------------------------------------------------------------------------
+# save_static_facts  - Atomically write the persistent hardware facts cache (failures only cost a re-probe next run)
+#----------------------------------------------------------------------------------------------------------------------
+def save_static_facts():
+    if args.no_cache:
+        return
+
+    write_atomic(os.path.join(args.cache_dir, 'hwfacts.json'), json.dumps({'version': 1, 'interfaces': static_facts}))
+
+#----------------------------------------------------------------------------------------------------------------------
+# write_atomic       - Write a file via a temporary file and rename so readers never see a partial file
+#----------------------------------------------------------------------------------------------------------------------
+def write_atomic(path, text):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        (handle, temporary_filepath) = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.netcheck-')
+        with os.fdopen(handle, 'w') as f:
+            f.write(text)
+        os.chmod(temporary_filepath, 0o644)
+        os.replace(temporary_filepath, path)
+    except OSError:
+        return False
+
+    return True
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_ethtool       - Execute ethtool with each requested option and parse the key: value output
+#----------------------------------------------------------------------------------------------------------------------
+def read_ethtool(ifname, options):
+
+    details = {}
+
+    for option in options:
+        flag_error = False
+        try:
+            result = run_command(['ethtool'] + ([option] if option else []) + [ifname])
+            result.check_returncode()
+            output = result.stdout.decode()
+
+        except subprocess.CalledProcessError as e:
+            flag_error = True
+            error_text  = f"\nWARNING: 'ethtool' command returned non-zero exit status {e.returncode}.\n"
+            error_text += f'         {str(e)}'
+        except FileNotFoundError:
+            flag_error = True
+            error_text  = f"\nWARNING: Dependency 'ethtool' not found. Please install 'ethtool' or troubleshoot access and retry."
+        except Exception as e:
+            flag_error = True
+            error_text  = f"\nWARNING: Dependency 'ethtool' is failing.\n"
+            error_text += f'         {str(e)}'
+
+        # If an ethtool related error was flagged provide warning only once (not for each interface)
+        if flag_error:
+            warn_once('ethtool', error_text)
+            continue
+
+        # Extract relevant fields from ethtool output interpreted as key: value
+        for row in output.split('\n'):
+            pair = row.split(': ')
+            if len(pair) == 2:
+                key = pair[0].strip().lower().replace(' ', '-')
+                value = pair[1].strip().replace('\t', ',')
+                if key not in ['supported-link-modes', 'advertised-link-modes', 'netlink-error', 'current-message-level']:
+                    details[key] = value
+
+    return details
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_ethtool_linkinfo - Read the port type of an interface over ethtool netlink, as 'ethtool IF' prints it
+#----------------------------------------------------------------------------------------------------------------------
+def read_ethtool_linkinfo(ifname):
+
+    # Notes:
+    # - Returns {} when the kernel has no ethtool netlink family (before 5.6) or the driver reports no link info, the
+    #   caller then falls back to the ethtool command
+    # - The family ID is resolved once per run (it does not change while the kernel runs)
+
+    port_map = {
+        0x00: 'Twisted Pair',   0x01: 'AUI',    0x02: 'BNC',    0x03: 'MII',    0x04: 'FIBRE',
+        0x05: 'Direct Attach Copper',           0xef: 'None',   0xff: 'Other'
+    }
+
+    def attribute(kind, payload):
+        data = struct.pack('=HH', 4 + len(payload), kind) + payload
+        return data + b'\0' * (-len(data) % 4)
+
+    try:
+        if 'ethtool' not in genl_families:
+            request = struct.pack('=BBH', CTRL_CMD_GETFAMILY, 1, 0) + attribute(CTRL_ATTR_FAMILY_NAME, b'ethtool\0')
+            response = netlink_request(GENL_ID_CTRL, request, NLM_F_REQUEST, NETLINK_GENERIC)
+            for (kind, body) in netlink_messages(response):
+                if kind == GENL_ID_CTRL:
+                    genl_families['ethtool'] = struct.unpack('=H', dict(netlink_attributes(body, 4))[CTRL_ATTR_FAMILY_ID][:2])[0]
+
+        header = attribute(ETHTOOL_A_LINKINFO_HEADER | NLA_F_NESTED, attribute(ETHTOOL_A_HEADER_DEV_NAME, ifname.encode() + b'\0'))
+        request = struct.pack('=BBH', ETHTOOL_MSG_LINKINFO_GET, 1, 0) + header
+        response = netlink_request(genl_families['ethtool'], request, NLM_F_REQUEST, NETLINK_GENERIC)
+    except (OSError, KeyError, struct.error):
+        return {}
+
+    for (kind, body) in netlink_messages(response):
+        if kind == genl_families['ethtool']:
+            attributes = dict(netlink_attributes(body, 4))
+            if ETHTOOL_A_LINKINFO_PORT in attributes:
+                port = attributes[ETHTOOL_A_LINKINFO_PORT][0]
+                return {'port': port_map.get(port, f'Unknown! ({port})')}
+
+    return {}
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_sysfs         - Read ethtool style details for an interface from /sys/class/net without forking any commands
+#----------------------------------------------------------------------------------------------------------------------
+def read_sysfs(entry):
+
+    # Notes:
+    # - Only fields sysfs can supply are returned, absent keys signal that a fallback (ethtool) is needed
+    # - Firmware version and port type are not exposed by sysfs for physical devices
+
+    details = {}
+    netdir = os.path.join(args.sysfs_root, 'class', 'net', entry['ifname'])
+    if not os.path.isdir(netdir):
+        return details
+    if args.record:
+        record_sysfs(netdir)
+
+    # Speed is reported in Mb/s, -1 (or EINVAL while the link is down) matches ethtool's 'Unknown!'
+    speed = read_sysfs_file(os.path.join(netdir, 'speed'))
+    details['speed'] = f'{speed}Mb/s' if speed and speed.isdigit() and int(speed) > 0 else 'Unknown!'
+
+    duplex = read_sysfs_file(os.path.join(netdir, 'duplex'))
+    details['duplex'] = duplex.capitalize() if duplex in ['full', 'half'] else 'Unknown!'
+
+    # Carrier cannot be read while the interface is administratively down, which ethtool reports as no link
+    carrier = read_sysfs_file(os.path.join(netdir, 'carrier'))
+    details['link-detected'] = 'yes' if carrier == '1' else 'no'
+
+    devdir = os.path.join(netdir, 'device')
+    if os.path.isdir(devdir):
+        if args.record:
+            record_sysfs(devdir)
+
+        # Physical device - driver and PCI slot from the device uevent (driver symlink as a fallback)
+        uevent = read_sysfs_file(os.path.join(devdir, 'uevent')) or ''
+        uevent = dict(line.split('=', 1) for line in uevent.split('\n') if '=' in line)
+        if 'DRIVER' in uevent:
+            details['driver'] = uevent['DRIVER']
+        elif os.path.islink(os.path.join(devdir, 'driver')):
+            details['driver'] = os.path.basename(os.readlink(os.path.join(devdir, 'driver')))
+        if 'PCI_SLOT_NAME' in uevent:
+            details['bus-info'] = uevent['PCI_SLOT_NAME']
+
+    else:
+        # Virtual device - driver names follow ethtool's reporting for the link kind, no firmware or port exists
+        linkinfo = entry.get('linkinfo', {})
+        kind = linkinfo.get('info_kind', '')
+        kind_map = {
+            'vlan': '802.1Q VLAN Support',  'bond': 'bonding'
+        }
+        details['driver'] = kind_map.get(kind, kind)
+        details['bus-info'] = linkinfo.get('info_data', {}).get('type', '') if kind == 'tun' else ''
+        details['firmware-version'] = ''
+        details['port'] = ''
+
+    return details
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_sysfs_file    - Return the stripped contents of a sysfs attribute, or None if it cannot be read
+#----------------------------------------------------------------------------------------------------------------------
+def read_sysfs_file(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+
+    if args.record:
+        record_sysfs(path, value)
+    return value
+
+#----------------------------------------------------------------------------------------------------------------------
+# get_pci_devices    - Return the PCI device index, running a single 'lspci -D -mm' the first time it is needed
+#----------------------------------------------------------------------------------------------------------------------
+def get_pci_devices(bus_id=None):
+    global pci_devices
+
+    # Notes:
+    # - The index is keyed by the bus IDs it has been asked for: a PCI address neither listed nor asked for before
+    #   (hot-plugged device, VFs created since) rebuilds it once, so long-running --serve collections see new hardware
+    #   without running lspci on every collection
+    # - The index is replaced, never modified, so callers may read the returned dict without holding the lock
+
+    with pci_lock:
+        if pci_devices is None or (bus_id and bus_id not in pci_devices['devices'] and bus_id not in pci_devices['bus-ids']):
+            requested = (pci_devices['bus-ids'] if pci_devices else set()) | ({bus_id} if bus_id else set())
+            pci_devices = {'devices': read_lspci(), 'bus-ids': requested}
+
+        return pci_devices['devices']
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_lspci         - Execute 'lspci -D -mm' and index device descriptions by full bus ID (0000:3b:00.0)
+#----------------------------------------------------------------------------------------------------------------------
+def read_lspci():
+
+    devices = {}
+
+    try:
+        result = run_command(['lspci', '-D', '-mm'])
+        result.check_returncode()
+
+    except subprocess.CalledProcessError as e:
+        warn_once('lspci', f"\nWARNING: 'lspci' command returned non-zero exit status {e.returncode}.\n         {str(e)}")
+        return devices
+    except FileNotFoundError:
+        warn_once('lspci', f"\nWARNING: Dependency 'lspci' not found. Please install 'lspci' or troubleshoot access and retry.")
+        return devices
+    except Exception as e:
+        warn_once('lspci', f"\nWARNING: Dependency 'lspci' is failing.\n         {str(e)}")
+        return devices
+
+    # Machine readable format: slot "class" "vendor" "device" [-rREV] [-pPROGIF] "subsys vendor" "subsys device"
+    #   descriptions are rebuilt as 'vendor device (rev REV)' to match the default lspci output
+    for line in result.stdout.decode().split('\n'):
+        try:
+            fields = shlex.split(line)
+        except ValueError:
+            continue
+
+        names = [field for field in fields[1:] if not field.startswith('-')]
+        if len(names) < 3:
+            continue
+
+        revision = [field[2:] for field in fields[1:] if field.startswith('-r')]
+        devices[fields[0]] = f'{names[1]} {names[2]}' + (f' (rev {revision[0]})' if revision else '')
+
+    return devices
+
+#----------------------------------------------------------------------------------------------------------------------
+# get_netlink_snapshot - Dump links, addresses and routes over rtnetlink once per run (or load a recorded fixture)
+#----------------------------------------------------------------------------------------------------------------------
+def get_netlink_snapshot():
+    global netlink_snapshot
+
+    if netlink_snapshot is not None:
+        return netlink_snapshot
+
+    # Recorded fixture: raw dump responses stored as base64 so parsing can be verified without privileges
+    if args.netlink_fixture:
+        with open(args.netlink_fixture) as f:
+            netlink_snapshot = {kind: base64.b64decode(data) for (kind, data) in json.load(f).items()}
+        return netlink_snapshot
+
+    # Single dump of each object type feeds every table (ifinfomsg / ifaddrmsg / rtmsg request headers)
+    netlink_snapshot = {
+        'link':  netlink_request(RTM_GETLINK,  struct.pack('=BxHiII', socket.AF_UNSPEC, 0, 0, 0, 0)),
+        'addr':  netlink_request(RTM_GETADDR,  struct.pack('=BBBBI', socket.AF_UNSPEC, 0, 0, 0, 0)),
+        'route': netlink_request(RTM_GETROUTE, struct.pack('=BBBBBBBBI', socket.AF_UNSPEC, 0, 0, 0, 0, 0, 0, 0, 0)),
+    }
+
+    if args.netlink_record:
+        with open(args.netlink_record, 'w') as f:
+            json.dump({kind: base64.b64encode(data).decode() for (kind, data) in netlink_snapshot.items()}, f, indent=2)
+
+    return netlink_snapshot
+
+#----------------------------------------------------------------------------------------------------------------------
+# netlink_request    - Send a single rtnetlink request and return the raw response (all parts of a multipart dump)
+#----------------------------------------------------------------------------------------------------------------------
+def netlink_request(msg_type, payload, flags=NLM_F_REQUEST | NLM_F_DUMP, protocol=socket.NETLINK_ROUTE):
+
+    chunks = []
+
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, protocol) as sock:
+        sock.bind((0, 0))
+        sock.sendall(struct.pack('=IHHII', 16 + len(payload), msg_type, flags, 1, 0) + payload)
+
+        done = False
+        while not done:
+            data = sock.recv(1 << 18)
+            chunks.append(data)
+
+            # A dump ends with NLMSG_DONE, a plain request ends with its single reply (or an error)
+            done = not flags & NLM_F_DUMP
+            for (kind, body) in netlink_messages(data):
+                if kind == NLMSG_ERROR:
+                    error = struct.unpack_from('=i', body)[0]
+                    if error:
+                        raise OSError(-error, os.strerror(-error))
+                    done = True
+                elif kind == NLMSG_DONE:
+                    done = True
+
+    return b''.join(chunks)
+
+#----------------------------------------------------------------------------------------------------------------------
+# netlink_messages   - Yield (type, body) for each netlink message in a raw response
+#----------------------------------------------------------------------------------------------------------------------
+def netlink_messages(data):
+    offset = 0
+    while offset + 16 <= len(data):
+        (length, kind) = struct.unpack_from('=IH', data, offset)
+        if length < 16:
+            break
+        yield kind, data[offset + 16:offset + length]
+        offset += (length + 3) & ~3
+
+#----------------------------------------------------------------------------------------------------------------------
+# netlink_attributes - Parse a run of rtattr structures into a list of (type, payload) pairs
+#----------------------------------------------------------------------------------------------------------------------
+def netlink_attributes(data, offset=0):
+    attributes = []
+    while offset + 4 <= len(data):
+        (length, kind) = struct.unpack_from('=HH', data, offset)
+        if length < 4:
+            break
+        attributes.append((kind & 0x3fff, data[offset + 4:offset + length]))   # strip NLA_F_NESTED/NET_BYTEORDER
+        offset += (length + 3) & ~3
+    return attributes
+
+#----------------------------------------------------------------------------------------------------------------------
+# netlink_interfaces - Build 'ip -detail -json address show' style entries from the netlink snapshot
+#----------------------------------------------------------------------------------------------------------------------
+def netlink_interfaces():
+
+    snapshot = get_netlink_snapshot()
+
+    operstate_map = {
+        0: 'UNKNOWN',   1: 'NOTPRESENT',    2: 'DOWN',      3: 'LOWERLAYERDOWN',
+        4: 'TESTING',   5: 'DORMANT',       6: 'UP'
+    }
+    link_type_map = {
+        1: 'ether',     32: 'infiniband',   768: 'ipip',    772: 'loopback',    776: 'sit',     778: 'gre',
+        65534: 'none'
+    }
+    # Flag names in the order ip prints them
+    flag_map = [
+        (0x8, 'LOOPBACK'),      (0x2, 'BROADCAST'),     (0x10, 'POINTOPOINT'),  (0x1000, 'MULTICAST'),
+        (0x80, 'NOARP'),        (0x200, 'ALLMULTI'),    (0x100, 'PROMISC'),     (0x20, 'NOTRAILERS'),
+        (0x4, 'DEBUG'),         (0x8000, 'DYNAMIC'),    (0x4000, 'AUTOMEDIA'),  (0x2000, 'PORTSEL'),
+        (0x400, 'MASTER'),      (0x800, 'SLAVE'),       (0x1, 'UP'),            (0x10000, 'LOWER_UP'),
+        (0x20000, 'DORMANT'),   (0x40000, 'ECHO')
+    ]
+
+    interfaces = []
+    names = {}
+
+    for (kind, body) in netlink_messages(snapshot['link']):
+        if kind != RTM_NEWLINK:
+            continue
+
+        (link_type, ifindex, ifflags) = struct.unpack_from('=xxHiI', body)
+        all_attrs = netlink_attributes(body, 16)
+        attrs = dict(all_attrs)
+
+        entry = {'ifindex': ifindex, 'ifname': netlink_string(attrs.get(IFLA_IFNAME, b''))}
+
+        flags = [name for (bit, name) in flag_map if ifflags & bit]
+        if ifflags & 0x1 and not ifflags & 0x40:
+            flags.insert(0, 'NO-CARRIER')
+        entry['flags'] = flags
+
+        if IFLA_MTU in attrs:
+            entry['mtu'] = struct.unpack('=I', attrs[IFLA_MTU])[0]
+        if IFLA_QDISC in attrs:
+            entry['qdisc'] = netlink_string(attrs[IFLA_QDISC])
+        if IFLA_MASTER in attrs:
+            entry['master'] = struct.unpack('=I', attrs[IFLA_MASTER])[0]
+        entry['operstate'] = operstate_map.get(attrs.get(IFLA_OPERSTATE, b'\0')[0], 'UNKNOWN')
+        if IFLA_GROUP in attrs:
+            group = struct.unpack('=I', attrs[IFLA_GROUP])[0]
+            entry['group'] = 'default' if group == 0 else group
+        if IFLA_TXQLEN in attrs:
+            entry['txqlen'] = struct.unpack('=I', attrs[IFLA_TXQLEN])[0]
+        entry['link_type'] = link_type_map.get(link_type, str(link_type))
+        if IFLA_ADDRESS in attrs:
+            entry['address'] = ':'.join(f'{b:02x}' for b in attrs[IFLA_ADDRESS])
+        if IFLA_BROADCAST in attrs:
+            entry['broadcast'] = ':'.join(f'{b:02x}' for b in attrs[IFLA_BROADCAST])
+
+        # Parent link (VLANs, macvlans, ...) - resolved to a name below unless it lives in another namespace
+        if IFLA_LINK in attrs and struct.unpack('=I', attrs[IFLA_LINK])[0]:
+            if IFLA_LINK_NETNSID in attrs:
+                entry['link_index'] = struct.unpack('=I', attrs[IFLA_LINK])[0]
+                entry['link_netnsid'] = struct.unpack('=i', attrs[IFLA_LINK_NETNSID])[0]
+            else:
+                entry['link'] = struct.unpack('=I', attrs[IFLA_LINK])[0]
+
+        # -detail counters and offload limits, in the order ip prints them (older kernels omit the newer ones)
+        for (attr, name) in [(IFLA_PROMISCUITY, 'promiscuity'), (IFLA_ALLMULTI, 'allmulti'), (IFLA_MIN_MTU, 'min_mtu'),
+                             (IFLA_MAX_MTU, 'max_mtu')]:
+            if attr in attrs:
+                entry[name] = struct.unpack('=I', attrs[attr])[0]
+
+        if IFLA_LINKINFO in attrs:
+            entry['linkinfo'] = netlink_linkinfo(attrs[IFLA_LINKINFO])
+
+        for (attr, name) in [(IFLA_NUM_TX_QUEUES, 'num_tx_queues'), (IFLA_NUM_RX_QUEUES, 'num_rx_queues'),
+                             (IFLA_GSO_MAX_SIZE, 'gso_max_size'), (IFLA_GSO_MAX_SEGS, 'gso_max_segs'),
+                             (IFLA_TSO_MAX_SIZE, 'tso_max_size'), (IFLA_TSO_MAX_SEGS, 'tso_max_segs'),
+                             (IFLA_GRO_MAX_SIZE, 'gro_max_size')]:
+            if attr in attrs:
+                entry[name] = struct.unpack('=I', attrs[attr])[0]
+        if IFLA_PARENT_DEV_BUS_NAME in attrs:
+            entry['parentbus'] = netlink_string(attrs[IFLA_PARENT_DEV_BUS_NAME])
+        if IFLA_PARENT_DEV_NAME in attrs:
+            entry['parentdev'] = netlink_string(attrs[IFLA_PARENT_DEV_NAME])
+
+        for (attr, value) in all_attrs:
+            if attr == IFLA_PROP_LIST:
+                altnames = [netlink_string(name) for (prop, name) in netlink_attributes(value) if prop == IFLA_ALT_IFNAME]
+                if altnames:
+                    entry['altnames'] = altnames
+
+        entry['addr_info'] = []
+        names[ifindex] = entry['ifname']
+        interfaces.append(entry)
+
+    # Resolve interface indexes to names as ip does
+    for entry in interfaces:
+        if 'link' in entry:
+            entry['link'] = names.get(entry['link'], f"if{entry['link']}")
+        if 'master' in entry:
+            entry['master'] = names.get(entry['master'], entry['master'])
+
+    # Attach addresses to their interfaces
+    lookup = {entry['ifindex']: entry for entry in interfaces}
+    for address in netlink_addresses(snapshot['addr']):
+        if address['ifindex'] in lookup:
+            lookup[address.pop('ifindex')]['addr_info'].append(address)
+
+    return interfaces
+
+#----------------------------------------------------------------------------------------------------------------------
+# netlink_linkinfo   - Decode IFLA_LINKINFO (kind plus the VLAN and tun/tap details the tables rely on, no bridge/bond data)
+#----------------------------------------------------------------------------------------------------------------------
+def netlink_linkinfo(data):
+
+    info = dict(netlink_attributes(data))
+    linkinfo = {}
+
+    if IFLA_INFO_KIND in info:
+        linkinfo['info_kind'] = netlink_string(info[IFLA_INFO_KIND])
+    if IFLA_INFO_SLAVE_KIND in info:
+        linkinfo['info_slave_kind'] = netlink_string(info[IFLA_INFO_SLAVE_KIND])
+
+    if IFLA_INFO_DATA in info:
+        data = dict(netlink_attributes(info[IFLA_INFO_DATA]))
+
+        if linkinfo.get('info_kind') == 'vlan':
+            protocol_map = { 0x8100: '802.1Q', 0x88a8: '802.1ad' }
+            linkinfo['info_data'] = {}
+            if IFLA_VLAN_PROTOCOL in data:
+                protocol = struct.unpack('!H', data[IFLA_VLAN_PROTOCOL])[0]
+                linkinfo['info_data']['protocol'] = protocol_map.get(protocol, hex(protocol))
+            if IFLA_VLAN_ID in data:
+                linkinfo['info_data']['id'] = struct.unpack('=H', data[IFLA_VLAN_ID])[0]
+
+        elif linkinfo.get('info_kind') == 'tun':
+            type_map = { 1: 'tun', 2: 'tap' }
+            linkinfo['info_data'] = {}
+            if IFLA_TUN_TYPE in data:
+                linkinfo['info_data']['type'] = type_map.get(data[IFLA_TUN_TYPE][0], 'unknown')
+            for (attr, name) in [(IFLA_TUN_PI, 'pi'), (IFLA_TUN_VNET_HDR, 'vnet_hdr'), (IFLA_TUN_MULTI_QUEUE, 'multi_queue'),
+                                 (IFLA_TUN_PERSIST, 'persist')]:
+                if attr in data:
+                    linkinfo['info_data'][name] = bool(data[attr][0])
+
+    return linkinfo
+
+#----------------------------------------------------------------------------------------------------------------------
+# netlink_addresses  - Decode RTM_NEWADDR messages into 'ip -json' addr_info dicts (tagged with their ifindex)
+#----------------------------------------------------------------------------------------------------------------------
+def netlink_addresses(data):
+
+    family_map = { socket.AF_INET: 'inet', socket.AF_INET6: 'inet6' }
+    scope_map = { 0: 'global', 200: 'site', 253: 'link', 254: 'host', 255: 'nowhere' }
+
+    addresses = []
+
+    for (kind, body) in netlink_messages(data):
+        if kind != RTM_NEWADDR:
+            continue
+
+        (family, prefixlen, ifa_flags, scope, ifindex) = struct.unpack_from('=BBBBI', body)
+        if family not in family_map:
+            continue
+        attrs = dict(netlink_attributes(body, 8))
+
+        address = {'ifindex': ifindex, 'family': family_map[family]}
+
+        # IPv4 reports the local address in IFA_LOCAL (IFA_ADDRESS is the peer on point-to-point links)
+        local = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+        if local is None:
+            continue
+        address['local'] = socket.inet_ntop(family, local)
+        if IFA_ADDRESS in attrs and IFA_LOCAL in attrs and attrs[IFA_ADDRESS] != attrs[IFA_LOCAL]:
+            address['address'] = socket.inet_ntop(family, attrs[IFA_ADDRESS])
+        address['prefixlen'] = prefixlen
+        if IFA_BROADCAST in attrs:
+            address['broadcast'] = socket.inet_ntop(family, attrs[IFA_BROADCAST])
+        address['scope'] = scope_map.get(scope, str(scope))
+        if IFA_LABEL in attrs:
+            address['label'] = netlink_string(attrs[IFA_LABEL])
+        if IFA_CACHEINFO in attrs:
+            (preferred, valid) = struct.unpack_from('=II', attrs[IFA_CACHEINFO])
+            address['valid_life_time'] = valid
+            address['preferred_life_time'] = preferred
+
+        addresses.append(address)
+
+    return addresses
+
+#----------------------------------------------------------------------------------------------------------------------
+# netlink_routes     - Yield 'ip -detail -json route' style entries of a table (None for all) from the netlink snapshot
+#----------------------------------------------------------------------------------------------------------------------
+def netlink_routes(table=RT_TABLE_MAIN):
+
+    names = {entry['ifindex']: entry['ifname'] for entry in netlink_interfaces()}
+
+    for (kind, body) in netlink_messages(get_netlink_snapshot()['route']):
+        if kind != RTM_NEWROUTE:
+            continue
+        # Like ip, IPv6 routes are only listed with the routes of all tables
+        if table is not None and body[0] != socket.AF_INET:
+            continue
+
+        route = netlink_route(body, names)
+        # Like ip, only routes outside the main table are labelled with their table
+        if table is None or route['table'] == table:
+            number = route.pop('table')
+            if number != RT_TABLE_MAIN:
+                route['table'] = {253: 'default', 255: 'local'}.get(number, str(number))
+            yield route
+
+#----------------------------------------------------------------------------------------------------------------------
+# netlink_route      - Decode a single RTM_NEWROUTE message body
+#----------------------------------------------------------------------------------------------------------------------
+def netlink_route(body, names):
+
+    type_map = {
+        1: 'unicast',   2: 'local',         3: 'broadcast', 4: 'anycast',   5: 'multicast', 6: 'blackhole',
+        7: 'unreachable',   8: 'prohibit',  9: 'throw',     10: 'nat'
+    }
+    protocol_map = {
+        0: 'unspec',    1: 'redirect',      2: 'kernel',    3: 'boot',      4: 'static',    8: 'gated',
+        9: 'ra',        10: 'mrt',          11: 'zebra',    12: 'bird',     13: 'dnrouted', 14: 'xorp',
+        15: 'ntk',      16: 'dhcp',         17: 'mrouted',  18: 'keepalived',   42: 'babel',    186: 'bgp',
+        187: 'isis',    188: 'ospf',        189: 'rip',     192: 'eigrp'
+    }
+    scope_map = { 0: 'global', 200: 'site', 253: 'link', 254: 'host', 255: 'nowhere' }
+
+    (family, dst_len, src_len, tos, table, protocol, scope, rtm_type, rtm_flags) = struct.unpack_from('=BBBBBBBBI', body)
+    attrs = dict(netlink_attributes(body, 12))
+
+    route = {'type': type_map.get(rtm_type, str(rtm_type))}
+
+    # Host routes are printed without a prefix length, the zero-length prefix is 'default'
+    if dst_len == 0:
+        route['dst'] = 'default'
+    else:
+        dst = socket.inet_ntop(family, attrs[RTA_DST]) if RTA_DST in attrs else '0.0.0.0'
+        route['dst'] = dst if dst_len == (32 if family == socket.AF_INET else 128) else f'{dst}/{dst_len}'
+
+    if RTA_GATEWAY in attrs:
+        route['gateway'] = socket.inet_ntop(family, attrs[RTA_GATEWAY])
+    if RTA_OIF in attrs:
+        oif = struct.unpack('=I', attrs[RTA_OIF])[0]
+        route['dev'] = names.get(oif, str(oif))
+    route['protocol'] = protocol_map.get(protocol, str(protocol))
+    route['scope'] = scope_map.get(scope, str(scope))
+    if RTA_PREFSRC in attrs:
+        route['prefsrc'] = socket.inet_ntop(family, attrs[RTA_PREFSRC])
+    if RTA_PRIORITY in attrs:
+        route['metric'] = struct.unpack('=I', attrs[RTA_PRIORITY])[0]
+    route['flags'] = [name for (bit, name) in [(0x4, 'onlink'), (0x10, 'linkdown')] if rtm_flags & bit]
+    if RTA_PREF in attrs:
+        route['pref'] = {0: 'medium', 1: 'high', 3: 'low'}.get(attrs[RTA_PREF][0], str(attrs[RTA_PREF][0]))
+    route['table'] = struct.unpack('=I', attrs[RTA_TABLE])[0] if RTA_TABLE in attrs else table
+
+    return route
+
+#----------------------------------------------------------------------------------------------------------------------
+# netlink_route_get  - Equivalent of 'ip --json route get ADDR' (asks the kernel to resolve a single destination)
+#----------------------------------------------------------------------------------------------------------------------
+def netlink_route_get(address):
+
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    packed = socket.inet_pton(family, address)
+    request = struct.pack('=BBBBBBBBI', family, len(packed) * 8, 0, 0, 0, 0, 0, 0, 0)
+    request += struct.pack('=HH', 4 + len(packed), RTA_DST) + packed
+
+    response = netlink_request(RTM_GETROUTE, request, NLM_F_REQUEST)
+
+    # Interfaces are named from the kernel's index directly rather than the shared link dump, which --serve refreshes
+    #   from its collection thread while the connectivity tests run on another
+    names = dict(socket.if_nameindex())
+
+    return [netlink_route(body, names) for (kind, body) in netlink_messages(response) if kind == RTM_NEWROUTE]
+
+#----------------------------------------------------------------------------------------------------------------------
+# netlink_string     - Decode a NUL terminated netlink string attribute
+#----------------------------------------------------------------------------------------------------------------------
+def netlink_string(data):
+    return data.split(b'\0', 1)[0].decode(errors='replace')
+
+#----------------------------------------------------------------------------------------------------------------------
+# process_ip_route   - Stream 'ip -detail -json route show' (or the netlink dump) into the Route Table (rtable)
+#----------------------------------------------------------------------------------------------------------------------
+def process_ip_route():
+    
+    rtable = []     # Route records
+    routes = []     # Route entries, kept only for JSON output
+
+    # Entries are parsed one at a time, so only the records needed for the requested output are held in memory
+    try:
+        for route in read_routes():
+            # Create empty default values for any missing required keys from ip route
+            for key in RouteRecord.__slots__:
+                route.setdefault(key, '')
+
+            if args.ndjson:
+                emit_record('route', route)
+            elif args.json:
+                routes.append(route)
+            else:
+                rtable.append(RouteRecord(route))
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        print("\nWARNING: Dependency 'ip' is missing or failing. Please troubleshoot the command 'ip route' and retry.")
+
+    if not args.json:
+        if rtable:
+            print_table(args, 'Route Table', project_table([('DESTINATION', 'dst'), ('GATEWAY', 'gateway'), ('INTERFACE', 'dev'),
+                        ('PROTOCOL', 'protocol'), ('METRIC', 'metric')], rtable))
+        else:
+            print('No routes found.')
+    
+    return routes
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_routes        - Yield route entries matching --table, --proto and --dev as they are parsed
+#----------------------------------------------------------------------------------------------------------------------
+def read_routes():
+
+    # ip applies the filters itself (the unfiltered command line is unchanged so existing fixtures still replay)
+    if args.ip_backend != 'netlink':
+        filters = [value for (option, value) in [('table', args.table), ('proto', args.proto), ('dev', args.dev)]
+                   for value in ([option, value] if value else [])]
+        with stream_command(['ip', '-detail', '-json', 'route'] + (['show'] + filters if filters else [])) as stream:
+            for route in iter_json_array(stream):
+                # ip leaves out the keys it was asked to match on
+                if args.dev:
+                    route.setdefault('dev', args.dev)
+                if args.proto:
+                    route.setdefault('protocol', args.proto)
+                yield route
+        return
+
+    for route in netlink_routes(args.route_table_id):
+        if args.proto and route['protocol'] != args.proto:
+            continue
+        if args.dev and route.get('dev') != args.dev:
+            continue
+        yield route
+
+#----------------------------------------------------------------------------------------------------------------------
+# stream_command     - Context manager giving the stdout of a command as a text stream while it runs
+#----------------------------------------------------------------------------------------------------------------------
+@contextlib.contextmanager
+def stream_command(command):
+
+    # Captured and replayed runs go through run_command so the output lands in (or comes from) the fixture
+    if args.record or args.replay:
+        result = run_command(command)
+        if result.returncode:
+            raise subprocess.CalledProcessError(result.returncode, command)
+        yield io.StringIO(result.stdout.decode())
+        return
+
+    with timed(command[0], ' '.join(command), 'command'):
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as process:
+            yield process.stdout
+            process.stdout.read()
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command)
+
+#----------------------------------------------------------------------------------------------------------------------
+# iter_json_array    - Yield the elements of a JSON array read incrementally from a text stream
+#----------------------------------------------------------------------------------------------------------------------
+def iter_json_array(stream, size=1 << 16):
+
+    # Elements are decoded one at a time, so key names are shared across elements here rather than by the decoder
+    keys = {}
+    decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {keys.setdefault(key, key): value for (key, value) in pairs})
+    buffer = ''
+    index = 0
+    opened = False
+
+    while True:
+        chunk = stream.read(size)
+        buffer = buffer[index:] + chunk
+        index = 0
+
+        # Decode every complete element in the buffer, an element cut off by the chunk boundary waits for the next read
+        while True:
+            while index < len(buffer) and buffer[index] in ' \t\r\n,':
+                index += 1
+            if index == len(buffer):
+                break
+            if not opened:
+                if buffer[index] != '[':
+                    raise ValueError('expected a JSON array')
+                opened = True
+                index += 1
+                continue
+            if buffer[index] == ']':
+                return
+            try:
+                (element, index) = decoder.raw_decode(buffer, index)
+            except ValueError:
+                if not chunk:
+                    raise
+                break
+            yield element
+
+        # Empty output is an empty array, output ending inside the array is an error
+        if not chunk:
+            if opened:
+                raise ValueError('unterminated JSON array')
+            return
+
+#----------------------------------------------------------------------------------------------------------------------
+# route_lookup       - Resolve many addresses against the route table at once (longest prefix, then lowest metric)
+#----------------------------------------------------------------------------------------------------------------------
+def route_lookup():
+
+    ltable = []     # Lookup table
+
+    addresses = []
+    if args.route_lookup:
+        addresses += [address.strip() for address in args.route_lookup.split(',') if address.strip()]
+    if args.route_lookup_file:
+        addresses += [name for (name, _) in read_peers(args.route_lookup_file)]
+
+    with timed('route_index'):
+        try:
+            index = RouteIndex(read_routes(), args.table if args.table and args.table != 'all' else 'main')
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            print("\nERROR: Dependency 'ip' is missing or failing. Please troubleshoot the command 'ip route' and retry.")
+            exit(120)
+
+    with timed('route_lookup', f'{len(addresses)} addresses'):
+        results = []
+        for address in addresses:
+            try:
+                route = index.lookup(address)
+            except (OSError, ValueError):
+                results.append({'address': address, 'route': None, 'error': 'invalid address'})
+                continue
+            results.append({'address': address, 'route': route} if route else {'address': address, 'route': None,
+                                                                               'error': 'no route'})
+
+    if args.ndjson:
+        for result in results:
+            emit_record('route-lookup', result)
+        return
+    if args.json:
+        print(json.dumps(results))
+        return
+
+    ltable.append(['ADDRESS', 'DESTINATION', 'TYPE', 'GATEWAY', 'INTERFACE', 'PROTOCOL', 'METRIC', 'TABLE'])
+    for result in results:
+        route = result['route']
+        if route is None:
+            ltable.append([result['address'], result['error'] + OUTLIER_MARK, '', '', '', '', '', ''])
+            continue
+        ltable.append([result['address'], route['dst'], route['type'], route['gateway'], route['dev'], route['protocol'],
+                       str(route['metric']), route['table']])
+
+    print_table(args, f'Route Lookup ({len(index)} routes indexed)', ltable, outliers=True)
+
+#----------------------------------------------------------------------------------------------------------------------
+# RouteIndex         - Longest prefix match index over route entries, built once and queried many times
+#----------------------------------------------------------------------------------------------------------------------
+class RouteIndex:
+
+    # Notes:
+    # - Prefixes are grouped by (table, family, length) into dictionaries keyed by the network bits, so a lookup probes
+    #   at most one dictionary per prefix length present in a table (longest first) rather than walking the table
+    # - Of several routes to the same prefix the one with the lowest metric is kept, as the kernel would choose it
+    # - Tables are looked up in the order of the default policy rules (local, main, default), a throw route moves on
+    #   to the next table; an index of any other single table (--table N) is looked up on its own
+    # - Only the fields reported by a lookup are kept, as a tuple, so large tables stay small once indexed
+
+    __slots__ = ('prefixes', 'lengths', 'tables', 'count')
+
+    fields = ('dst', 'type', 'gateway', 'dev', 'protocol', 'metric', 'table')
+
+    rule_order = ('local', 'main', 'default')
+
+    def __init__(self, routes, table='main'):
+        self.prefixes = {}
+        self.count = 0
+
+        # Routes without a table belong to the table that was listed (ip leaves it out unless listing all tables)
+        for route in routes:
+            (family, length, network) = self.parse(route)
+            key = (route.get('table', table), family, length)
+            entries = self.prefixes.setdefault(key, {})
+            current = entries.get(network)
+            if current is None or (route.get('metric') or 0) < (current[5] or 0):
+                # Multipath routes have their gateways in the next hops
+                gateway = route.get('gateway') or ' '.join(hop['gateway'] for hop in route.get('nexthops', []) if 'gateway' in hop)
+                entries[network] = (route['dst'], route.get('type', 'unicast'), gateway, route.get('dev', ''),
+                                    route.get('protocol', ''), route.get('metric', ''), key[0])
+            self.count += 1
+
+        self.lengths = {}
+        for (entry_table, family, length) in sorted(self.prefixes, key=operator.itemgetter(2), reverse=True):
+            self.lengths.setdefault((entry_table, family), []).append(length)
+
+        present = dict.fromkeys(entry_table for (entry_table, _, _) in self.prefixes)
+        self.tables = [name for name in self.rule_order if name in present] or list(present)
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, address):
+        (family, bits, value) = self.parse_address(address)
+        for table in self.tables:
+            route = self.match(table, family, bits, value)
+            if route is not None and route[1] != 'throw':
+                return dict(zip(self.fields, route))
+        return None
+
+    def match(self, table, family, bits, value):
+        for length in self.lengths.get((table, family), []):
+            route = self.prefixes[(table, family, length)].get(value >> (bits - length))
+            if route is not None:
+                return route
+        return None
+
+    @staticmethod
+    def parse(route):
+        # 'default' is the zero-length prefix of the family of its gateways (IPv6 routes also carry a preference),
+        #   bare addresses are host routes
+        dst = route.get('dst', '')
+        if dst == 'default':
+            hops = [route] + route.get('nexthops', [])
+            inet6 = 'pref' in route or any(':' in hop.get(key, '') for hop in hops for key in ('gateway', 'prefsrc'))
+            return (socket.AF_INET6 if inet6 else socket.AF_INET, 0, 0)
+        (address, _, length) = dst.partition('/')
+        (family, bits, value) = RouteIndex.parse_address(address)
+        length = int(length) if length else bits
+        return (family, length, value >> (bits - length))
+
+    @staticmethod
+    def parse_address(address):
+        family = socket.AF_INET6 if ':' in address else socket.AF_INET
+        return (family, 128 if family == socket.AF_INET6 else 32, int.from_bytes(socket.inet_pton(family, address), 'big'))
+
+#----------------------------------------------------------------------------------------------------------------------
+# RouteRecord        - Human readable view of one route, filled once by process_ip_route
+#----------------------------------------------------------------------------------------------------------------------
+class RouteRecord:
+
+    __slots__ = ('dst', 'gateway', 'dev', 'protocol', 'metric')
+
+    def __init__(self, route):
+        self.dst      = route['dst']
+        self.gateway  = route['gateway']
+        self.dev      = route['dev']
+        self.protocol = route['protocol']
+        self.metric   = route['metric']
+
+#----------------------------------------------------------------------------------------------------------------------
+# process_resolvectl - Collect resolver configuration into DNS Table (dtable), probing each server with --dns-test
+#----------------------------------------------------------------------------------------------------------------------
+def process_resolvectl():
+    
+    dtable = []     # DNS table
+
+    dns = json.loads('{}')
+
+    # Structured sources first: resolvectl JSON (recent systemd), resolvectl text, then the resolv.conf files
+    #   (servers given with --dns-server replace the configuration entirely)
+    if args.dns_server:
+        dns['Requested'] = {'current-dns-server': args.dns_server[0], 'dns-servers': ' '.join(args.dns_server),
+                            'dns-domain': '', 'source': 'command line'}
+    else:
+        for (source, read) in [('resolvectl --json', read_resolvectl_json), ('resolvectl', read_resolvectl),
+                               ('/run/systemd/resolve/resolv.conf', read_resolv_conf), ('/etc/resolv.conf', read_resolv_conf)]:
+            try:
+                dns = read(source)
+            except (OSError, ValueError, subprocess.SubprocessError):
+                continue
+            if dns:
+                for device in dns:
+                    dns[device]['source'] = source
+                break
+        else:
+            print("\nWARNING: Dependency 'resolvectl' is missing or failing and no resolv.conf could be read. Please troubleshoot the command 'resolvectl' and retry.")
+
+    # Create empty default values for any missing required keys
+    for device in dns:
+        for key in ['current-dns-server', 'dns-servers', 'dns-domain']:
+            if not key in dns[device]:
+                dns[device][key] = ''
+
+    # Every configured server is probed once, however many links list it
+    if args.dns_test:
+        servers = list(dict.fromkeys(server for device in dns for server in dns[device]['dns-servers'].split()))
+        with timed('dns_probe', f'{len(servers)} servers'):
+            probes = dns_probe(servers, args.dns_names, count=args.dns_count, timeout=args.dns_timeout)
+        for device in dns:
+            dns[device]['probes'] = {server: probes[server] for server in dns[device]['dns-servers'].split()}
+
+    if args.ndjson:
+        for device in dns:
+            emit_record('dns', {'interface': device, **dns[device]})
+
+    # Populate human readable DNS table
+    for device in dns:
+        if len(device) > 0:
+            # Only append entries where there is one or more columns of data available
+            if ( len(str(dns[device]['current-dns-server'])) > 0 or
+                 len(str(dns[device]['dns-servers']))        > 0 or
+                 len(str(dns[device]['dns-domain']))         > 0 ):
+
+                row = [ device, 
+                        dns[device]['current-dns-server'], 
+                        dns[device]['dns-servers'].replace(' ', '\n'),
+                        dns[device]['dns-domain'].replace(' ', '\n') ]
+
+                # Probe results line up with the server list, one line per server
+                if args.dns_test:
+                    row.append('\n'.join(format_dns_probe(dns[device]['probes'][server])
+                                         for server in dns[device]['dns-servers'].split()))
+
+                dtable.append(row)
+
+    if not args.json:
+        dtable.insert(0, ['INTERFACE', 'CURRENT SERVER', 'ALL SERVERS', 'DOMAINS'] + (['PROBES'] if args.dns_test else []))
+
+        if len(dtable) > 1:
+            print_table(args, 'DNS Server Table', dtable)
+        else:
+            print('No DNS entries found.')
+    
+    return dns
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_resolvectl_json - Resolver configuration per link from 'resolvectl --json=short status'
+#----------------------------------------------------------------------------------------------------------------------
+def read_resolvectl_json(source):
+
+    # Notes:
+    # - Only recent systemd releases support --json for status, older ones fail and the text output is parsed instead
+    # - Field names differ between releases, so the common spellings of each field are accepted
+
+    result = run_command(['resolvectl', '--json=short', 'status'])
+    if result.returncode:
+        raise subprocess.SubprocessError(result.stderr.decode(errors='replace'))
+
+    data = json.loads(result.stdout.decode())
+    links = data if isinstance(data, list) else data.get('links', [data]) if isinstance(data, dict) else []
+
+    def first(link, keys, default):
+        return next((link[key] for key in keys if link.get(key)), default)
+
+    dns = {}
+    for link in links:
+        if not isinstance(link, dict):
+            continue
+        device = first(link, ['ifname', 'interface', 'name'], 'Global')
+        servers = first(link, ['servers', 'dnsServers', 'dns'], [])
+        domains = first(link, ['searchDomains', 'domains'], [])
+        dns[device] = {
+            'current-dns-server':   resolver_address(first(link, ['currentServer', 'currentDNSServer', 'currentDnsServer'], '')),
+            'dns-servers':          ' '.join(resolver_address(server) for server in servers),
+            'dns-domain':           ' '.join(domain.get('name', '') if isinstance(domain, dict) else str(domain) for domain in domains)
+        }
+
+    return dns
+
+#----------------------------------------------------------------------------------------------------------------------
+# resolver_address   - Text form of a server given as a string or an {addressString} / {family, address, port} object
+#----------------------------------------------------------------------------------------------------------------------
+def resolver_address(server):
+
+    if not isinstance(server, dict):
+        return str(server)
+    if server.get('addressString'):
+        return server['addressString']
+
+    family = socket.AF_INET6 if server.get('family') == socket.AF_INET6 or len(server.get('address', [])) == 16 else socket.AF_INET
+    address = socket.inet_ntop(family, bytes(server.get('address', [])))
+    port = server.get('port') or 53
+    if port == 53:
+        return address
+    return f'[{address}]:{port}' if family == socket.AF_INET6 else f'{address}:{port}'
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_resolvectl    - Resolver configuration per link from the text output of resolvectl
+#----------------------------------------------------------------------------------------------------------------------
+def read_resolvectl(source):
+
+    dns = json.loads('{}')
+
+    dnsinfo = run_command(['resolvectl']).stdout.decode()
+
+    # resolvectl has different formatting in differnet versions
+    #   this filter will converge to a format where fields are not split across multiple lines
+    dnslines = ['']
+    for line in dnsinfo.split('\n'):
+
+        # ignore blank lines
+        if len(line) > 0:
+            
+            # treat lines with ': ' as a key value pair line, lines with a '(' as a line containing a device name and
+            #   a line containing Global as a special "device" name
+            if ': ' in line or '(' in line or line == 'Global':
+                dnslines.append(line.strip())
+            # treat all other lines as a continuation of the previous field
+            else:
+                dnslines[-1] += ' ' + line.strip()
+
+    # Parse resolvectl output into one entry per device
+    current_device = ''
+    
+    for line in dnslines:
+
+        if not ':' in line:
+            current_device = line
+            if "(" in line:
+                match = re.search(r'\(([\w\.\-]+)\)', line)
+                if match:
+                    current_device = match.group(1)
+            if len(current_device) > 0: 
+                dns[current_device] = json.loads('{}')
+
+        else:
+            pair = line.split(': ')
+
+            # Fields before the first device header (a warning, a banner of another version) belong to no device
+            if len(pair) == 2 and current_device:
+                key = pair[0].lower().strip().replace(' ', '-')
+                dns[current_device][key] = pair[1]
+
+    return dns
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_resolv_conf   - Resolver configuration from a resolv.conf file (a single 'Global' entry)
+#----------------------------------------------------------------------------------------------------------------------
+def read_resolv_conf(path):
+
+    servers = []
+    domains = []
+    for line in read_config_file(path).splitlines():
+        fields = line.split('#', 1)[0].split(';', 1)[0].split()
+        if len(fields) >= 2 and fields[0] == 'nameserver':
+            servers.append(fields[1])
+        elif len(fields) >= 2 and fields[0] in ['search', 'domain']:
+            domains = fields[1:]
+
+    if not servers:
+        return {}
+
+    return {'Global': {'current-dns-server': servers[0], 'dns-servers': ' '.join(servers), 'dns-domain': ' '.join(domains)}}
+
+#----------------------------------------------------------------------------------------------------------------------
+# read_config_file   - Read a host configuration file, captured into (--record) or read from (--replay) the fixture
+#----------------------------------------------------------------------------------------------------------------------
+def read_config_file(path):
+
+    if args.replay:
+        path = os.path.join(args.replay, 'files', path.lstrip('/'))
+
+    with open(path) as f:
+        text = f.read()
+
+    if args.record:
+        mirror = os.path.join(args.record, 'files', path.lstrip('/'))
+        os.makedirs(os.path.dirname(mirror), exist_ok=True)
+        with open(mirror, 'w') as f:
+            f.write(text)
+
+    return text
+
+#----------------------------------------------------------------------------------------------------------------------
+# dns_probe          - Query every server for every name concurrently over UDP from a single select loop
+#----------------------------------------------------------------------------------------------------------------------
+def dns_probe(servers, names, count=3, timeout=2.0, interval=0.1):
+
+    # Notes:
+    # - Servers are given as ADDRESS, ADDRESS:PORT or [ADDRESS]:PORT, optionally with a resolvectl '#server-name' suffix
+    # - Each round sends one A query per name to every server, rounds are interval apart
+    # - Replies are matched by query ID and source, lost queries count as timeouts (the 'loss' of the latency summary)
+
+    probes = {}
+    sockets = {}
+    endpoints = {}
+
+    for server in servers:
+        probes[server] = {'address': '', 'rtts': [None] * (count * len(names)), 'sent': 0, 'error': '', 'rcodes': {}}
+        try:
+            endpoints[server] = dns_server_address(server)
+        except ValueError as e:
+            probes[server]['error'] = str(e)
+
+    # Server names get the same budget as a query, a resolver that hangs cannot hold up the probe
+    resolved = resolve_targets(list(endpoints.values()), time.monotonic() + timeout)
+
+    for server in endpoints:
+        if isinstance(resolved[endpoints[server]], Exception):
+            probes[server]['error'] = str(resolved[endpoints[server]])
+            continue
+        (family, sockaddr) = resolved[endpoints[server]]
+        try:
+            if family not in sockets:
+                sockets[family] = socket.socket(family, socket.SOCK_DGRAM)
+        except OSError as e:
+            probes[server]['error'] = str(e)
+            continue
+        probes[server]['address'] = sockaddr[0]
+        probes[server]['family'] = family
+        probes[server]['sockaddr'] = sockaddr
+
+    try:
+        schedule = [(round * interval, server, round * len(names) + index, name) for round in range(count)
+                    for server in probes if probes[server]['address'] for (index, name) in enumerate(names)]
+        schedule.reverse()
+
+        identifier = {family: int.from_bytes(os.urandom(2), 'big') for family in sockets}
+        outstanding = {}
+        start = time.perf_counter()
+
+        while schedule or outstanding:
+            # Send every query that is due
+            now = time.perf_counter()
+            while schedule and start + schedule[-1][0] <= now:
+                (_, server, slot, name) = schedule.pop()
+                family = probes[server]['family']
+                identifier[family] = (identifier[family] + 1) & 0xffff
+                try:
+                    sockets[family].sendto(dns_query(identifier[family], name), probes[server]['sockaddr'])
+                except OSError:
+                    pass    # unreachable servers are simply counted as timeouts
+                probes[server]['sent'] += 1
+                outstanding[(family, identifier[family])] = (server, slot, time.perf_counter())
+
+            # Queries without a reply within the timeout are lost
+            now = time.perf_counter()
+            for key in [key for key in outstanding if now - outstanding[key][2] > timeout]:
+                del outstanding[key]
+
+            wake = [start + schedule[-1][0]] if schedule else []
+            wake += [sent + timeout for (_, _, sent) in outstanding.values()]
+            if not wake:
+                break
+            readable, _, _ = select.select(list(sockets.values()), [], [], max(0, min(wake) - now))
+
+            for family in sockets:
+                if sockets[family] not in readable:
+                    continue
+                received = time.perf_counter()
+                (packet, source) = sockets[family].recvfrom(65535)
+                if len(packet) < 12:
+                    continue
+                (reply, flags) = struct.unpack_from('!HH', packet)
+                if not flags & 0x8000 or (family, reply) not in outstanding:
+                    continue
+                (server, slot, sent) = outstanding[(family, reply)]
+                if source[0] != probes[server]['address']:
+                    continue
+                del outstanding[(family, reply)]
+                probes[server]['rtts'][slot] = (received - sent) * 1000
+                rcode = DNS_RCODES.get(flags & 0xf, f'rcode{flags & 0xf}')
+                probes[server]['rcodes'][rcode] = probes[server]['rcodes'].get(rcode, 0) + 1
+
+    finally:
+        for sock in sockets.values():
+            sock.close()
+
+    results = {}
+    for server in probes:
+        summary = latency_summary(probes[server])
+        summary['timeouts'] = summary['sent'] - summary['received']
+        summary['rcodes'] = probes[server]['rcodes']
+        results[server] = summary
+
+    return results
+
+#----------------------------------------------------------------------------------------------------------------------
+# dns_server_address - Split a resolver server string into (host, port)
+#----------------------------------------------------------------------------------------------------------------------
+def dns_server_address(server):
+
+    server = server.split('#', 1)[0]
+    if server.startswith('['):
+        (host, _, port) = server[1:].partition(']')
+        return (host, int(port.lstrip(':') or 53))
+    if server.count(':') == 1:
+        (host, port) = server.split(':')
+        return (host, int(port))
+    return (server, 53)
+
+#----------------------------------------------------------------------------------------------------------------------
+# dns_query          - Build a recursive A query for name
+#----------------------------------------------------------------------------------------------------------------------
+def dns_query(identifier, name):
+    labels = b''.join(bytes([len(label)]) + label for label in name.rstrip('.').encode('idna').split(b'.') if label)
+    return struct.pack('!HHHHHH', identifier, 0x0100, 1, 0, 0, 0) + labels + b'\0' + struct.pack('!HH', 1, 1)
+
+#----------------------------------------------------------------------------------------------------------------------
+# format_dns_probe   - Short human readable DNS probe summary for table details
+#----------------------------------------------------------------------------------------------------------------------
+def format_dns_probe(probe):
+
+    if probe.get('error'):
+        return probe['error']
+
+    text = f"p50/p90/p99 {probe['p50']}/{probe['p90']}/{probe['p99']} ms" if probe['received'] else 'no replies'
+    text += f", timeouts {probe['timeouts']}/{probe['sent']}"
+    for rcode in ['nxdomain', 'servfail']:
+        if probe['rcodes'].get(rcode):
+            text += f", {rcode.upper()} {probe['rcodes'][rcode]}"
+    return text
+
+#----------------------------------------------------------------------------------------------------------------------
+# run_connectivity_tests - Perform network connectivity tests concurrently and return their results by test name
+#----------------------------------------------------------------------------------------------------------------------
+def run_connectivity_tests():
+
+    # Default results reported when a test fails (or times out) before producing details
+    results = {
+        'ping-gw':                  {"test": "ping-gw", "result": 'FAIL', "rtt": '', "gateway": ''},
+        'ping-internet':            {"test": "ping-internet", "result": 'FAIL', "rtt": 0},
+        'ping-internet-with-dns':   {"test": "ping-internet-with-dns", "result": 'FAIL', "rtt": 0},
+        'webpage-load':             {"test": "webpage-load", "result": 'FAIL', "details": ''},
+        'downlink-throughput':      {"test": "downlink-throughput", "result": 'FAIL', "rate": ''}
+    }
+
+    # Independent tests run concurrently, throughput (to any target) is only scheduled once the webpage download passes
+    tests = {
+        'ping-gw':                  test_ping_gateway,
+        'ping-internet':            lambda result, deadline: test_ping_internet(result, deadline, '1.1.1.1'),
+        'ping-internet-with-dns':   lambda result, deadline: test_ping_internet(result, deadline, 'www.cloudflare.com'),
+        'webpage-load':             test_webpage
+    }
+
+    # Overall budget shared by all tests, each test is additionally bounded by its own timeout
+    deadline = time.monotonic() + args.deadline
+    completed = 0
+
+    if not args.json: print('\r[ TESTING       ] ', end='', flush=True)
+    pool = ThreadPoolExecutor(max_workers=len(tests))
+    try:
+        pending = {pool.submit(run_test, tests[name], results[name], deadline): name for name in tests}
+
+        while pending:
+            # Tests check the deadline themselves, one stuck in an uninterruptible call is reported as TIMEOUT after a
+            #   short grace period and left behind (its result dict is replaced so a late update cannot leak in)
+            done, _ = wait(pending, timeout=max(0, deadline - time.monotonic()) + 1, return_when=FIRST_COMPLETED)
+            if not done:
+                for name in pending.values():
+                    results[name] = dict(results[name], result='TIMEOUT')
+                    completed += 1
+                    if args.ndjson:
+                        emit_record('test', results[name])
+                if 'webpage-load' in pending.values():
+                    completed += 1
+                    if args.ndjson:
+                        emit_record('test', results['downlink-throughput'])
+                break
+
+            for future in done:
+                name = pending.pop(future)
+                completed += 1
+                if args.ndjson:
+                    emit_record('test', results[name])
+
+                if name == 'webpage-load':
+                    if results[name]['result'] == 'PASS':
+                        throughput = pool.submit(run_test, test_throughput, results['downlink-throughput'], deadline)
+                        pending[throughput] = 'downlink-throughput'
+                    else:
+                        completed += 1
+                        if args.ndjson:
+                            emit_record('test', results['downlink-throughput'])
+
+                # Progress reflects the number of completed tests, not their position in the sequence
+                if not args.json: print('\r[ TESTING ' + ('.' * completed).ljust(len(results)) + ' ] ', end='', flush=True)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if not args.json: print('\r', end='')
+
+    # Latest results are kept for --brief, which shell prompts and banners run instead of probing
+    if not args.no_cache:
+        write_atomic(os.path.join(args.cache_dir, 'tests.json'), json.dumps({'version': 1, 'updated': time.time(), 'tests': results}))
+
+    return results
+
+#----------------------------------------------------------------------------------------------------------------------
+# test_connectivity  - Run the connectivity tests and print the results table (or JSON)
+#----------------------------------------------------------------------------------------------------------------------
+def test_connectivity():
+
+    # Connectivity Tests Table
+    ttable = []
+
+    results = run_connectivity_tests()
+
+    nhop, ping1, ping2, wget, throughput = [results[name] for name in results]
+
+    # Latency distribution (native ICMP engine only) is shown below the average round trip time
+    def ping_details(ping):
+        return str(ping['rtt']) + ('\n' + format_latency(ping['latency']) if 'latency' in ping else '')
+
+    # Stream count and time to first byte are shown below the aggregate rate, with the first stream error if any
+    def throughput_details(throughput):
+        if 'streams' not in throughput:
+            return throughput['rate']
+        details = throughput['rate'] + '\n' + str(len(throughput['streams'])) + ' streams'
+        if throughput['ttfb'] is not None:
+            details += ', ttfb ' + str(throughput['ttfb']) + ' ms'
+        failed = [stream['error'] for stream in throughput['streams'] if stream['error']]
+        return details + ('\n' + failed[0] if failed else '')
+
+    ttable.append(['Test Description', 'Result', 'Details']) 
+    ttable.append(['Ping to Default Gateway', nhop['result'], nhop['gateway'] + " " + ping_details(nhop)])
+    ttable.append(['Ping to Internet without DNS Lookup', ping1['result'], ping_details(ping1)])    
+    ttable.append(['Ping to Internet with DNS Lookup', ping2['result'], ping_details(ping2)])    
+    ttable.append(['Webpage Download', wget['result'], wget['details']])
+    ttable.append(['Brief Downlink Throughput', throughput['result'], throughput_details(throughput)])
+    
+    # Create a list to store the test results
+    test_results = list(results.values())
+
+    # Results are streamed as each test completes (--ndjson) or exported with the rest of the report (-j)
+    if not args.json:
+        print_table(args, 'Connectivity Tests', ttable)
+
+    return test_results
+
+#----------------------------------------------------------------------------------------------------------------------
+# run_test           - Execute a single connectivity test, reporting TIMEOUT if it exceeds its time budget
+#----------------------------------------------------------------------------------------------------------------------
+def run_test(test, result, deadline):
+
+    # A test ends at its own timeout or at the global deadline, whichever comes first
+    test_deadline = min(deadline, time.monotonic() + args.test_timeout)
+
+    try:
+        with timed(result['test'], category='test'):
+            test(result, test_deadline)
+    except (subprocess.TimeoutExpired, TimeoutError):
+        result['result'] = 'TIMEOUT'
+
+#----------------------------------------------------------------------------------------------------------------------
+# run_timed          - subprocess.run bounded by a test deadline (raises subprocess.TimeoutExpired once it passes)
+#----------------------------------------------------------------------------------------------------------------------
+def run_timed(command, deadline):
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise subprocess.TimeoutExpired(command, 0)
+
+    return run_command(command, timeout=remaining)
+
+#----------------------------------------------------------------------------------------------------------------------
+# parse_ping_rtt     - Extract the average round trip time from ping summary output
+#----------------------------------------------------------------------------------------------------------------------
+def parse_ping_rtt(output):
+
+    match = re.search(r'rtt.*= ([0-9\.]+)/([0-9\.]+)/([0-9\.]+)/([0-9\.]+) ms', output.replace('\n', ' | '))
+    if not match is None:
+        if len(match.groups()) >= 2:
+            return match.group(2) + ' ms'
+
+    return 'unknown'
+
+#----------------------------------------------------------------------------------------------------------------------
+# test_ping_internet - Ping a public host (an IP address tests routing only, a hostname also requires DNS)
+#----------------------------------------------------------------------------------------------------------------------
+def test_ping_internet(result, deadline, target):
+    try:
+        ping_target(result, deadline, target, 5)
+    except (subprocess.TimeoutExpired, TimeoutError):
+        raise
+    except:
+        print("\nWARNING: Dependency 'ping' is missing or failing. Direct IP connectivity results will be missing.")
+
+#----------------------------------------------------------------------------------------------------------------------
+# test_webpage       - Download a public webpage with wget - attempt to sense proxy usage (if properly configured)
+#----------------------------------------------------------------------------------------------------------------------
+def test_webpage(result, deadline):
+    try:
+        temporary_filepath = os.path.join(tempfile.gettempdir(), next(tempfile._get_candidate_names()))
+        try:
+            wget_test = run_timed(['wget', '-O', temporary_filepath, 'https://www.cloudflare.com/'], deadline)
+        finally:
+            if os.path.exists(temporary_filepath): os.remove(temporary_filepath)
+
+        match = re.search(r'Connecting to ([\w\d\.\-]+)', wget_test.stderr.decode())
+        connecting_url = 'unknown'
+        if not match is None:
+            if len(match.groups()) >= 1:
+                connecting_url = match.group(1)
+                if connecting_url == 'www.cloudflare.com':
+                    result['details'] = 'Direct - no proxy detected'
+                else:
+                    result['details'] = 'Proxy via ' + connecting_url
+
+        if wget_test.returncode == 0: result['result'] = 'PASS'
+    except subprocess.TimeoutExpired:
+        raise
+    except:
+        print("\nWARNING: Dependency 'wget' is missing or failing. Web results will be missing.")
+
+#----------------------------------------------------------------------------------------------------------------------
+# test_ping_gateway  - Ping the default gateway and extract latency, gateway IP address and interface used to reach it
+#----------------------------------------------------------------------------------------------------------------------
+def test_ping_gateway(result, deadline):
+    try:
+        # Lookup next hop IP to reach 1.1.1.1
+        if args.ip_backend == 'netlink':
+            nhop_lookup = netlink_route_get('1.1.1.1')
+        else:
+            nhop_lookup = json.loads(run_timed(['ip', '--json', 'route', 'get', '1.1.1.1'], deadline).stdout.decode())
+
+        result['gateway'] = '(' + nhop_lookup[0]['gateway'] + ' via ' + nhop_lookup[0]['dev'] + ')'
 
-            # Replace bridge physical device name with PORT for Open vSwitch bridge interfaces
-            if entry[col_driver] == 'ovs':
-                if 'bridges' in openvswitch and interface in openvswitch['bridges']:
-                    macaddress = entry[col_macaddress]
-                    for lookup in itable:
-                        if lookup[col_macaddress] == macaddress and entry[col_interface] != lookup[col_interface]:
-                            entry[col_port] = f'[{lookup[col_interface]}]'
-                    
-            # Replace PORT with bridge name and BUS with TAG for Open vSwitch ports
-            if entry[col_bus] == 'tap':
-                if interface in bridge_lookup:
-                    bridge = bridge_lookup[interface]
-                    
-                    entry[col_port] = f'[{bridge}]'
-                    if 'bridges' in openvswitch and bridge in openvswitch['bridges']:
-                        if 'ports' in openvswitch['bridges'][bridge]:
-                            if interface in openvswitch['bridges'][bridge]['ports']:
-                                entry[col_driver] = 'ovs'
-                                if 'tag' in openvswitch['bridges'][bridge]['ports'][interface]:
-                                    entry[col_bus] = '[VID ' + openvswitch['bridges'][bridge]['ports'][interface]['tag'] + ']'
-                                else:
-                                    entry[col_bus] = '[ACCESS]'
+        ping_target(result, deadline, nhop_lookup[0]['gateway'], 4)
+    except (subprocess.TimeoutExpired, TimeoutError):
+        raise
+    except:
+        print("\nWARNING: Dependency 'ip' or 'ping' is missing or failing. Next Hop ping results will be missing.")
 
-    # If not exporting via JSON, prepare and print tables
-    if not args.json:
-        
-        # Sort interface table by State (IP first, then DOWN, others alphabetically after), Driver, and Interface
-        itable = sorted(itable, key=lambda x: (x[col_driver], x[col_port], x[col_interface]))
-        itable = sorted(itable, key=lambda x: (0 if x[col_state] == 'UP' else 1 if x[col_state] == 'DOWN' else 2, x[col_state]))
-        
-        # Sort VLAN table by Link, then VID
-        vtable = sorted(vtable, key=lambda x: (x[2], x[3]))
+#----------------------------------------------------------------------------------------------------------------------
+# test_throughput    - Quick download throughput test over parallel streams to the configured targets
+#----------------------------------------------------------------------------------------------------------------------
+def test_throughput(result, deadline):
 
-        # Sort PCIe table by BUS ID
-        ptable = sorted(ptable, key=lambda x: x[2])
+    start = time.monotonic()
+    streams = http_download_streams(args.throughput_urls, args.throughput_streams, args.throughput_duration, deadline)
+    seconds = max(stream['end'] for stream in streams) - start
 
-        # Add Column Headers to tables
-        header_summary   = ['ID', 'INTERFACE', 'MAC ADDRESS', 'STATE', 'IP ADDRESSES', 'DRIVER',             'BUS', 'SPEED', 'PORT'            ]
-        header_barebones = ['ID', 'INT',       'MAC ADDRESS', 'STATE', 'IP ADDRESSES', 'DRIVER', 'F/W',      'BUS', 'SPEED', 'PORT', 'ALTNAMES']
-        header_default   = ['ID', 'INTERFACE', 'MAC ADDRESS', 'STATE', 'IP ADDRESSES', 'DRIVER', 'FIRMWARE', 'BUS', 'SPEED', 'PORT', 'ALTNAMES']
-        header = header_summary if args.summary else (header_barebones if args.barebones else header_default)
+    # Aggregate rate covers the whole test, time to first byte is the fastest response
+    received = sum(stream['bytes'] for stream in streams)
+    responses = [stream['ttfb'] for stream in streams if stream['ttfb'] is not None]
 
-        itable.insert(0, header)
-        vtable.insert(0, ['ID', 'INTERFACE', 'LINK', 'VID', 'MAC ADDRESS', 'STATE', 'IP ADDRESSES'])
-        ptable.insert(0, ['ID', 'INTERFACE', 'BUS', 'DESCRIPTION'])
+    if not received and time.monotonic() >= deadline:
+        raise TimeoutError('no data received from ' + ', '.join(args.throughput_urls))
 
-        # Show tables requested
-        if args.interfaces:
-            if len(itable) > 1: 
-                print_table(args, 'Physical Interfaces', itable)
-            else:
-                print('No network interfaces found.')
-        if args.vlans:
-            if len(vtable) > 1:
-                print_table(args, 'VLAN Interfaces', vtable)
-            else:
-                print('No VLANs configured.')
-        if args.pcie:
-            if len(ptable) > 1:
-                print_table(args, 'PCIe Device Details', ptable)
-            else:
-                print('No PCIe devices corresponding to network interfaces found.')
+    result['bps'] = round(8 * received / seconds) if seconds > 0 else 0
+    result['rate'] = format_bits(result['bps']).replace('/', 'p')
+    result['ttfb'] = min(responses) if responses else None
+    result['streams'] = [{key: stream[key] for key in ['url', 'bytes', 'seconds', 'bps', 'ttfb', 'error']} for stream in streams]
 
-    return interfaces, openvswitch
+    if received and not any(stream['error'] for stream in streams): result['result'] = 'PASS'
 
 #----------------------------------------------------------------------------------------------------------------------
-# process_interface  - Process ip -detail addr show results, execute ethtool commands, and cleanse datta
+# http_download_streams - Download URLs (round-robin) over parallel HTTP streams into a discarded buffer
 #----------------------------------------------------------------------------------------------------------------------
-def process_interface(entry, human, itable, vtable, ptable):
-    # Create empty default values for any missing required keys from ip addr show command
-    for key in ['ifindex', 'ifname', 'link', 'address', 'operstate', 'ip']: entry.setdefault(key, '')
+def http_download_streams(urls, count, duration, deadline):
 
-    # Create multiline listing for IPv4 addresses for human output
-    ip_addresses = [f"{address['local']}/{address['prefixlen']}" for address in entry['addr_info'] if address['family'] == 'inet']
-    human['ip'] = '\n'.join(ip_addresses)
+    # Notes:
+    # - Each stream ends at the end of its download, after duration seconds or at the deadline, whichever comes first
+    # - Proxies are taken from the environment (http_proxy, https_proxy, no_proxy) like wget
+    # - Certificates are not verified and compression is refused so the bytes counted are the bytes transferred
 
-    # Create multiline listing for altnames for human output
-    human['altnames'] = '\n'.join(entry.get('altnames', []))
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=context))
 
-    # Get ethtool driver output for interface
-    flag_error = False
-    try:
-        result1 = subprocess.run(['ethtool', '-i', entry['ifname']], capture_output=True)
-        result1.check_returncode()
+    def download(url):
+        stream = {'url': url, 'bytes': 0, 'seconds': 0.0, 'bps': 0, 'ttfb': None, 'error': ''}
+        start = time.monotonic()
+        stop = min(start + duration, deadline)
+        buffer = bytearray(256 * 1024)
 
-        result2 = subprocess.run(['ethtool', entry['ifname']], capture_output=True)
-        result2.check_returncode()
+        with timed('http', url, 'command'):
+            try:
+                request = urllib.request.Request(url, headers={'Accept-Encoding': 'identity', 'Cache-Control': 'no-cache'})
+                with opener.open(request, timeout=max(deadline - start, 0.001)) as response:
+                    stream['ttfb'] = round(1000 * (time.monotonic() - start), 3)
+                    while time.monotonic() < stop:
+                        received = response.readinto(buffer)
+                        if not received:
+                            break
+                        stream['bytes'] += received
+            except (OSError, ValueError) as error:
+                # A stream cut off by the deadline keeps what it received
+                if not (stream['bytes'] and time.monotonic() >= deadline):
+                    stream['error'] = str(error) if isinstance(error, urllib.error.HTTPError) else str(getattr(error, 'reason', error))
 
-        eth_driver = result1.stdout.decode()
-        eth_general = result2.stdout.decode()
+        stream['end'] = time.monotonic()
+        stream['seconds'] = round(stream['end'] - start, 3)
+        stream['bps'] = round(8 * stream['bytes'] / (stream['end'] - start)) if stream['end'] > start else 0
+        return stream
 
-    except subprocess.CalledProcessError as e:
-        flag_error = True
-        error_text  = f"\nWARNING: 'ethtool' command returned non-zero exit status {e.returncode}.\n"
-        error_text += f'         {str(e)}'
-    except FileNotFoundError:
-        flag_error = True
-        error_text  = f"\nWARNING: Dependency 'ethtool' not found. Please install 'ethtool' or troubleshoot access and retry."
-    except Exception as e:
-        flag_error = True
-        error_text  = f"\nWARNING: Dependency 'ethtool' is failing.\n"
-        error_test += f'         {str(e)}'
-    
-    # If an ethtool related error was flagged provide warning only once (not for each interface)
-    if flag_error:
-        eth_driver  = ''
-        eth_general = ''
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        return list(pool.map(download, [urls[index % len(urls)] for index in range(count)]))
 
-        if not 'ethtool' in errors:
-            errors.update({'ethtool': 'error'})
-            print(error_text)
-            print('         Information will be missing from the output.')
+#----------------------------------------------------------------------------------------------------------------------
+# icmp_probe         - Send ICMP echo probes to many targets concurrently from a single select loop
+#----------------------------------------------------------------------------------------------------------------------
+def icmp_probe(targets, count=5, interval=0.25, timeout=0.5, deadline=None):
 
-    # Extract relevant fields from ethtool output interpreted as key: value
-    for row in (eth_driver + eth_general).split('\n'):
-        pair = row.split(': ')
-        if len(pair) == 2:
-            key = pair[0].strip().lower().replace(' ', '-')
-            value = pair[1].strip().replace('\t', ',')
-            if key not in ['supported-link-modes', 'advertised-link-modes', 'netlink-error', 'current-message-level']:
-                entry[key] = value
-    
-    # Create empty default values for any missing required keys from ethtool commands
-    for key in ['driver', 'firmware-version', 'bus-info', 'speed', 'port', 'altnames']: entry.setdefault(key, '')
+    # Notes:
+    # - Unprivileged ICMP datagram sockets are used when net.ipv4.ping_group_range allows, raw sockets otherwise
+    # - Datagram sockets let the kernel assign the echo identifier and filter replies, raw sockets filter by identifier
+    # - Raises OSError if no ICMP socket can be opened and TimeoutError if the deadline passes before probing ends
 
-    # Remove leading characters in bus info for human output if present in  entry
-    human['bus'] = entry.get('bus-info', '').lstrip('0000:')
+    probes = {}
+    sockets = {}
 
-    # Get lspci information for interface
-    entry.setdefault('device-name', '')
-    if human['bus'].lower() not in ['n/a', 'tap', '']:
-        flag_error = False
-        try: 
-            result = subprocess.run(['lspci', '-s', human['bus']], capture_output=True)
-            result.check_returncode()
+    # Resolve every target (hostnames require DNS) within the deadline and open one socket per address family
+    resolved = resolve_targets([(target, None) for target in targets], deadline)
+    if any(isinstance(address, TimeoutError) for address in resolved.values()):
+        raise TimeoutError('ICMP probe deadline exceeded while resolving targets')
 
-        except subprocess.CalledProcessError as e:
-            flag_error = True
-            error_text  = f"\nWARNING: 'lspci' command returned non-zero exit status {e.returncode} for interface {entry['ifname']}.\n"
-            error_text += f'         {str(e)}'
-        except FileNotFoundError:
-            flag_error = True
-            error_text  = f"\nWARNING: Dependency 'lspci' not found. Please install 'lspci' or troubleshoot access and retry."
-        except Exception as e:
-            flag_error = True
-            error_text  = f"\nWARNING: Dependency 'lspci' is failing.\n"
-            error_test += f'         {str(e)}'
+    for target in targets:
+        probes[target] = {'address': '', 'rtts': [None] * count, 'sent': 0, 'error': ''}
+        if isinstance(resolved[(target, None)], Exception):
+            probes[target]['error'] = str(resolved[(target, None)])
+            continue
+        (family, sockaddr) = resolved[(target, None)]
+        probes[target]['address'] = sockaddr[0]
+        probes[target]['family'] = family
+        if family not in sockets:
+            sockets[family] = icmp_socket(family)
 
-        # If an lspci related error was flagged provide warning only once (not for each interface)
-        if flag_error:
-            eth_driver  = ''
-            eth_general = ''
+    try:
+        # Each target gets count probes, interval apart - targets are interleaved within each round
+        schedule = [(round * interval, target, round) for round in range(count) for target in probes if probes[target]['address']]
+        schedule.reverse()
 
-            if not 'lspci' in errors:
-                errors.update({'lspci': 'error'})
-                print(error_text)
-                print('         Information will be missing from the output.')
-        
-        entry['device-name'] = result.stdout.decode().strip()
+        identifier = os.getpid() & 0xffff
+        sequence = {family: 0 for family in sockets}
+        outstanding = {}
+        start = time.perf_counter()
 
-        if ': ' in entry['device-name']:
-            entry['device-name'] = entry['device-name'].split(': ')[1].rstrip()
-            ptable.append([ entry['ifindex'], entry['ifname'], human['bus'], entry['device-name'] ])
-    
-    # Clean up speed entries for human output
-    speed_map = {
-        'unknown!': '',               '1000mb/s': '1 Gb/s',         '2500mb/s': '2.5 Gb/s',
-        '5000mb/s': '5 Gb/s',         '10000mb/s': '10 Gb/s',       '25000mb/s': '25 Gb/s',
-        '40000mb/s': '40 Gb/s',       '50000mb/s': '50 Gb/s',       '100000mb/s': '100 Gb/s',
-        '200000mb/s': '200 Gb/s',     '400000mb/s': '400 Gb/s',     '800000mb/s': '800 Gb/s'
-    }
-    human['speed'] = speed_map.get(entry['speed'].lower(), entry['speed'])
-    
-    # Clean up port entries for human output
-    port_map = {
-        'none': '',                   'twisted pair': 'BaseT',      'direct attach copper': 'DAC',
-        'other': ''
-    }
-    human['port'] = port_map.get(entry['port'].lower(), entry['port'])
-    
-    # Clean up missing information for openvswitch
-    if entry['driver'] in ['openvswitch', 'tun']:
-        entry['port'] = "Virtual"
-        human['port'] = "Virtual"
-        entry['speed'] = ''
-        human['speed'] = ''
+        while schedule or outstanding:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError('ICMP probe deadline exceeded')
 
-        if entry['operstate'] == 'UNKNOWN':
-            entry['operstate'] = ''
-        
-        if entry['driver'] == 'openvswitch':
-            entry['driver'] = 'ovs'
+            # Send every probe that is due
+            now = time.perf_counter()
+            while schedule and start + schedule[-1][0] <= now:
+                (_, target, round) = schedule.pop()
+                family = probes[target]['family']
+                (sock, raw) = sockets[family]
+                sequence[family] = (sequence[family] + 1) & 0xffff
+                request = icmp_echo_request(family, identifier, sequence[family])
+                try:
+                    sock.sendto(request, (probes[target]['address'], 0))
+                except OSError:
+                    pass    # unreachable destinations are simply counted as lost
+                probes[target]['sent'] += 1
+                outstanding[(family, sequence[family])] = (target, round, time.perf_counter())
 
-    # Chop off firmware version beyond the first space for brevity in human output, remove commas
-    human['firmware'] = entry['firmware-version'].split(' ')[0]
-    human['firmware'] = human['firmware'].replace(',', '')
-    
-    # Add interface to the corresponding table (VLAN or Physical Interface)
-    if entry['link']:
-        
-        # Obtain VLAN ID (VID) for VLANs
-        if 'linkinfo' in entry and 'info_data' in entry['linkinfo'] and 'id' in entry['linkinfo']['info_data']:
-            entry['vlanid'] = entry['linkinfo']['info_data']['id']
-        else:
-            entry['vlanid'] = ''
+            # Probes without a reply within the timeout are lost
+            now = time.perf_counter()
+            for key in [key for key in outstanding if now - outstanding[key][2] > timeout]:
+                del outstanding[key]
 
-        # Add VLAN interface to vlan table
-        vtable.append([ entry['ifindex'], entry['ifname'], entry['link'], entry['vlanid'], entry['address'],
-                        entry['operstate'], human['ip'] ])
-    
-    else:
-        if args.summary:
-            # Add physical interface to interface table - summary mode
-            itable.append([ entry['ifindex'], entry['ifname'], entry['address'], entry['operstate'], human['ip'],
-                            entry['driver'], human['bus'], human['speed'], human['port'] ])
+            # Wait for replies until the next probe is due (or the oldest outstanding probe expires)
+            wake = [start + schedule[-1][0]] if schedule else []
+            wake += [sent + timeout for (_, _, sent) in outstanding.values()]
+            if not wake:
+                break
+            readable, _, _ = select.select([sock for (sock, _) in sockets.values()], [], [], max(0, min(wake) - now))
 
-        else:
-            # Add physical interface to interface table - default mode
-            itable.append([ entry['ifindex'], entry['ifname'], entry['address'], entry['operstate'], human['ip'],
-                            entry['driver'], human['firmware'], human['bus'], human['speed'], human['port'], 
-                            human['altnames'] ])
+            for family in sockets:
+                (sock, raw) = sockets[family]
+                if sock not in readable:
+                    continue
+                received = time.perf_counter()
+                (packet, source) = sock.recvfrom(65535)
+                reply = icmp_echo_reply(family, packet, identifier, raw)
+                if reply is not None and (family, reply) in outstanding:
+                    (target, round, sent) = outstanding[(family, reply)]
+                    if source[0] == probes[target]['address']:
+                        del outstanding[(family, reply)]
+                        probes[target]['rtts'][round] = (received - sent) * 1000
+
+    finally:
+        for (sock, _) in sockets.values():
+            sock.close()
+
+    return {target: latency_summary(probes[target]) for target in probes}
 
 #----------------------------------------------------------------------------------------------------------------------
-# process_ip_route   - Execute 'ip -detail -json route show' and parse response into Route Table (rtable)
+# resolve_targets    - Resolve (host, port) pairs concurrently, abandoning lookups still running at the deadline
 #----------------------------------------------------------------------------------------------------------------------
-def process_ip_route():
-    
-    rtable = []     # Route table
+def resolve_targets(targets, deadline=None):
 
-    # Get output of ip route command 
+    # Notes:
+    # - Returns {(host, port): (family, sockaddr)}, or the exception raised by the lookup in place of the tuple
+    # - getaddrinfo cannot be interrupted: lookups pending at the deadline map to TimeoutError and their workers are
+    #   left to finish in the background instead of being waited for
+
+    resolved = {}
+    if not targets:
+        return resolved
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(len(targets), args.jobs)))
     try:
-        routes = json.loads(subprocess.run(['ip', '-detail', '-json', 'route'], capture_output=True).stdout.decode())
-    except:
-        print("\nWARNING: Dependency 'ip' is missing or failing. Please troubleshoot the command 'ip route' and retry.")
-        routes = json.loads('{}')
-
-    # Populate human readable route table
-    for route in routes:
-        # Create empty default values for any missing required keys from ethtool commands
-        for key in ['dst', 'gateway', 'dev', 'protocol', 'metric']:
-            if not key in route:
-                route[key] = ''
-
-        rtable.append([ route['dst'],
-                        route['gateway'],
-                        route['dev'],
-                        route['protocol'],
-                        route['metric'] ])
-    if not args.json:
-        rtable.insert(0, ['DESTINATION', 'GATEWAY', 'INTERFACE', 'PROTOCOL', 'METRIC'])
+        futures = {pool.submit(socket.getaddrinfo, host, port, type=socket.SOCK_DGRAM): (host, port)
+                   for (host, port) in dict.fromkeys(targets)}
+        done, _ = wait(futures, timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
-        if len(rtable) > 1:
-            print_table(args, 'Route Table', rtable)
-        else:
-            print('No routes found.')
-    
-    return routes
+    for (future, target) in futures.items():
+        if future not in done:
+            resolved[target] = TimeoutError(f'name resolution of {target[0]} timed out')
+            continue
+        try:
+            (family, _, _, _, sockaddr) = future.result()[0]
+            resolved[target] = (family, sockaddr)
+        except (OSError, ValueError) as e:
+            resolved[target] = e
+
+    return resolved
 
 #----------------------------------------------------------------------------------------------------------------------
-# process_resolvectl - Execute resolvectl and parse response into DNS Table (dtable)
+# icmp_socket        - Open an unprivileged ICMP datagram socket, falling back to a raw socket (returns sock, raw)
 #----------------------------------------------------------------------------------------------------------------------
-def process_resolvectl():
-    
-    dtable = []     # DNS table
+def icmp_socket(family):
 
-    dns = json.loads('{}')
+    protocol = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
 
     try:
-        dnsinfo = subprocess.run(['resolvectl'], capture_output=True).stdout.decode()
-    except:
-        print("\nWARNING: Dependency 'resolvectl' is missing or failing. Please troubleshoot the command 'resolvectl' and retry.")
-        dnsinfo = ''
+        return socket.socket(family, socket.SOCK_DGRAM, protocol), False
+    except OSError:
+        return socket.socket(family, socket.SOCK_RAW, protocol), True
 
-    # resolvectl has different formatting in differnet versions
-    #   this filter will converge to a format where fields are not split across multiple lines
-    dnsfilter = ''
-    for line in dnsinfo.split('\n'):
-
-        # ignore blank lines
-        if len(line) > 0:
-            
-            # treat lines with ': ' as a key value pair line
-            if ': ' in line:
-                dnsfilter += '\n' + line.lstrip().rstrip()
-            else:
-                # treat lines with a '(' as a line containing a device name
-                if '(' in line:
-                    dnsfilter += '\n' + line.lstrip().rstrip()
-                # treat line containing Global as a special "device" name
-                elif line == 'Global':
-                    dnsfilter += '\n' + line.lstrip().rstrip()
-                # treat all other lines as a continuation of the previous field - so omit the newline
-                else:
-                    dnsfilter += ' ' + line.lstrip().rstrip()
+#----------------------------------------------------------------------------------------------------------------------
+# icmp_echo_request  - Build an ICMP/ICMPv6 echo request (the kernel fills in the ICMPv6 checksum)
+#----------------------------------------------------------------------------------------------------------------------
+def icmp_echo_request(family, identifier, sequence):
 
-    # Parse ethtool output and add to interfaces object
-    current_device = ''
-    
-    for line in dnsfilter.split('\n'):
+    kind = 8 if family == socket.AF_INET else 128
+    payload = b'netcheck'.ljust(56, b'\0')
+    header = struct.pack('!BBHHH', kind, 0, 0, identifier, sequence)
 
-        if not ':' in line:
-            current_device = line
-            if "(" in line:
-                match = re.search('\(([\w0-0\.\-\_]+)\)', line)
-                if len(match.groups()) >= 1:
-                    current_device = match.group(1)
-            if len(current_device) > 0: 
-                dns[current_device] = json.loads('{}')
+    if family == socket.AF_INET:
+        header = struct.pack('!BBHHH', kind, 0, icmp_checksum(header + payload), identifier, sequence)
 
-        else:
-            pair = line.split(': ')
+    return header + payload
 
-            if len(pair) == 2:
-                key = pair[0].lower().lstrip().rstrip().replace(' ', '-')
+#----------------------------------------------------------------------------------------------------------------------
+# icmp_echo_reply    - Return the sequence number of an echo reply addressed to us, None for anything else
+#----------------------------------------------------------------------------------------------------------------------
+def icmp_echo_reply(family, packet, identifier, raw):
 
-                # Current script does not bother to parse less common multiline responses 
-                reject_keys = [ ]
-                if not key in reject_keys:
-                    dns[current_device][key] = pair[1]
-    
-    # Create empty default values for any missing required keys from ethtool commands
-    for device in dns:
-        for key in ['current-dns-server', 'dns-servers', 'dns-domain']:
-            if not key in dns[device]:
-                dns[device][key] = ''
+    # Raw IPv4 sockets deliver the IP header as well
+    if raw and family == socket.AF_INET:
+        packet = packet[(packet[0] & 0x0f) * 4:]
 
-    # Populate human readable DNS table
-    for device in dns:
-        if len(device) > 0:
-            # Only append entries where there is one or more columns of data available
-            if ( len(str(dns[device]['current-dns-server'])) > 0 or
-                 len(str(dns[device]['dns-servers']))        > 0 or
-                 len(str(dns[device]['dns-domain']))         > 0 ):
+    if len(packet) < 8:
+        return None
 
-                dtable.append([ device, 
-                                dns[device]['current-dns-server'], 
-                                dns[device]['dns-servers'].replace(' ', '\n'),
-                                dns[device]['dns-domain'].replace(' ', '\n') ])
+    (kind, code, checksum, reply_identifier, sequence) = struct.unpack_from('!BBHHH', packet)
+    if kind != (0 if family == socket.AF_INET else 129):
+        return None
 
-    if not args.json:
-        dtable.insert(0, ['INTERFACE', 'CURRENT SERVER', 'ALL SERVERS', 'DOMAINS'])
+    # Raw sockets see every echo reply on the host, datagram sockets are already filtered by the kernel
+    if raw and reply_identifier != identifier:
+        return None
 
-        if len(dtable) > 1:
-            print_table(args, 'DNS Server Table', dtable)
-        else:
-            print('No DNS entries found.')
-    
-    return dns
+    return sequence
 
 #----------------------------------------------------------------------------------------------------------------------
-# test_connectivity  - Perform network connectivity tests (employed iwth -t or --test flags)
+# icmp_checksum      - RFC 1071 internet checksum
 #----------------------------------------------------------------------------------------------------------------------
-def test_connectivity():
-
-    # Connectivity Tests Table
-    ttable = []
+def icmp_checksum(data):
 
-    # Perform connectivity tests
-    ping1_pass = 'FAIL'
-    ping1_value = 0
-    ping2_pass = 'FAIL'
-    ping2_value = 0
-    wget_pass = 'FAIL'
-    wget_value = ''
-    nhop_pass = 'FAIL'
-    nhop_value = ''
-    nhop_gateway = ''
-    throughput_pass = 'FAIL'
-    throughput_value = ''
-
-    # Test ping to public IP *without* DNS lookup required
-    if not args.json: print('\r[ TESTING .     ] ', end='')
-    try:
-        ping1_test = subprocess.run(['ping', '-q', '-c', '5', '-i', '0.25', '-W', '0.5', '1.1.1.1'], capture_output=True)
-
-        match = re.search('rtt.*= ([0-9\.]+)/([0-9\.]+)/([0-9\.]+)/([0-9\.]+) ms', ping1_test.stdout.decode().replace('\n', ' | '))
-        ping1_value = 'unknown'
-        if not match is None:
-            if len(match.groups()) >= 3:
-                ping1_value = match.group(2) + ' ms'
+    if len(data) % 2:
+        data += b'\0'
 
-        if ping1_test.returncode == 0: ping1_pass = 'PASS'
-    except:
-        print("\nWARNING: Dependency 'ping' is missing or failing. Direct IP connectivity results will be missing.")
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
 
-    # Test ping to public IP *with* DNS lookup required
-    if not args.json: print('\r[ TESTING ..    ] ', end='')
-    try:
-        ping2_test = subprocess.run(['ping', '-q', '-c', '5', '-i', '0.25', '-W', '0.5', 'www.cloudflare.com'], capture_output=True)
+    return ~total & 0xffff
 
-        match = re.search('rtt.*= ([0-9\.]+)/([0-9\.]+)/([0-9\.]+)/([0-9\.]+) ms', ping2_test.stdout.decode().replace('\n', ' | '))
-        ping2_value = 'unknown'
-        if not match is None:
-            if len(match.groups()) >= 2:
-                ping2_value = match.group(2) + ' ms'
+#----------------------------------------------------------------------------------------------------------------------
+# latency_summary    - Reduce per-probe round trip times (ms, None when lost) to percentiles, loss and jitter
+#----------------------------------------------------------------------------------------------------------------------
+def latency_summary(probe):
 
-        if ping2_test.returncode == 0: ping2_pass = 'PASS'
-    except:
-        print("\nWARNING: Dependency 'ping' is missing or failing. Direct IP connectivity results will be missing.")
+    rtts = [rtt for rtt in probe['rtts'][:probe['sent']] if rtt is not None]
+    ordered = sorted(rtts)
 
-    # Test wget operation to public website - attempt to sense proxy usage (if properly configured)
-    if not args.json: print('\r[ TESTING ...   ] ', end='')
-    try:
-        temporary_filepath = os.path.join(tempfile.gettempdir(), next(tempfile._get_candidate_names()))
-        wget_test = subprocess.run(['wget', '-O', temporary_filepath, 'https://www.cloudflare.com/'], capture_output=True)
-        os.remove(temporary_filepath)
+    # Nearest-rank percentile
+    def percentile(p):
+        return round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)], 3)
 
-        match = re.search('Connecting to ([\w\d\.\-]+)', wget_test.stderr.decode())
-        connecting_url = 'unknown'
-        if not match is None:
-            if len(match.groups()) >= 1:
-                connecting_url = match.group(1)
-                if connecting_url == 'www.cloudflare.com':
-                    wget_value = 'Direct - no proxy detected'
-                else:
-                    wget_value = 'Proxy via ' + connecting_url
+    summary = {
+        'address':  probe['address'],
+        'sent':     probe['sent'],
+        'received': len(rtts),
+        'loss':     round(100 * (1 - len(rtts) / probe['sent']), 1) if probe['sent'] else 100.0
+    }
 
-        if wget_test.returncode == 0: wget_pass = 'PASS'
-    except:
-        print("\nWARNING: Dependency 'wget' is missing or failing. Web results will be missing.")
+    if rtts:
+        summary.update({
+            'min':      round(ordered[0], 3),
+            'avg':      round(sum(rtts) / len(rtts), 3),
+            'p50':      percentile(50),
+            'p90':      percentile(90),
+            'p99':      percentile(99),
+            'max':      round(ordered[-1], 3),
+            'jitter':   round(sum(abs(b - a) for (a, b) in zip(rtts, rtts[1:])) / (len(rtts) - 1), 3) if len(rtts) > 1 else 0.0
+        })
 
-    # Ping the default gateway and extract latency, default gateway IP address and interface used to reach it
-    if not args.json: print('\r[ TESTING ....  ] ', end='')
-    try:
-        # Lookup next hop IP to reach 1.1.1.1
-        nhop_lookup = json.loads(subprocess.run(['ip', '--json', 'route', 'get', '1.1.1.1'], capture_output=True).stdout.decode())
+    if probe['error']:
+        summary['error'] = probe['error']
 
-        nhop_test = subprocess.run(['ping', '-q', '-c', '4', '-i', '0.25', '-W', '0.5', nhop_lookup[0]['gateway']], capture_output=True)
-        match = re.search('rtt.*= ([0-9\.]+)/([0-9\.]+)/([0-9\.]+)/([0-9\.]+) ms', nhop_test.stdout.decode().replace('\n', ' | '))
-        nhop_value = 'unknown'
-        if not match is None:
-            if len(match.groups()) >= 2:
-                nhop_value = match.group(2) + ' ms'
+    return summary
 
-        nhop_gateway = '(' + nhop_lookup[0]['gateway'] + ' via ' + nhop_lookup[0]['dev'] + ')'
-        if nhop_test.returncode == 0: nhop_pass = 'PASS'
-    except:
-        print("\nWARNING: Dependency 'ip' or 'ping' is missing or failing. Next Hop ping results will be missing.")
+#----------------------------------------------------------------------------------------------------------------------
+# ping_target        - Ping a single target with the native engine (or the ping command) and fill a test result
+#----------------------------------------------------------------------------------------------------------------------
+def ping_target(result, deadline, target, count):
 
-    # Quick download throughput test
-    if not args.json: print('\r[ TESTING ..... ] ', end='')
-    if wget_pass == 'PASS':
+    # Native engine unless disabled, falling back to the ping command when no ICMP socket can be opened
+    if args.ping_engine != 'command':
+        try:
+            latency = icmp_probe([target], count=count, interval=0.25, timeout=0.5, deadline=deadline)[target]
+        except TimeoutError:
+            raise
+        except OSError:
+            if args.ping_engine == 'native':
+                raise
+        else:
+            result['rtt'] = f"{latency['avg']:.3f} ms" if latency['received'] else 'unknown'
+            result['latency'] = latency
+            if latency['received']: result['result'] = 'PASS'
+            return
 
-        test_url = 'https://aka.azureedge.net/probe/test10mb.jpg'
+    ping_test = run_timed(['ping', '-q', '-c', str(count), '-i', '0.25', '-W', '0.5', target], deadline)
 
-        # Note that some URLS may be blocked on some networks
-        
-        # Azure CDN (Akamai)  - https://aka.azureedge.net/probe/test10mb.jpg
-        # CacheFly CDN        - https://cloudharmony1.cachefly.net/probe/test10mb.jpg
-        # Amazon CloudFront   - https://cloudharmony.com/probe/test10mb.jpg
-        # Limelight CDN       - https://labtest-gartner.lldns.net/web-probe/test10mb.jpg
-        # Cloudflare          - https://cloudflarecdn.cloudharmony.net/probe/test10mb.jpg
-        # Azure CDN (Verizon) - https://ch.azureedge.net/probe/test10mb.jpg
-        # Fastly CDN          - https://cloudharmony.global.ssl.fastly.net/probe/test10mb.jpg
-        # Google Cloud CDN    - https://cdn-google.cloudharmony.net/probe/test10mb.jpg
+    result['rtt'] = parse_ping_rtt(ping_test.stdout.decode())
+    if ping_test.returncode == 0: result['result'] = 'PASS'
 
-        temporary_filepath = os.path.join(tempfile.gettempdir(), next(tempfile._get_candidate_names()))
-        throughput_test = subprocess.run([ 'wget', '--report-speed=bits', '--compression=none', 
-                                           '--no-check-certificate', '-O', temporary_filepath, test_url ], capture_output=True)
-        os.remove(temporary_filepath)
-        match = re.search('\(([\w\d\.\/ ]+)\) - ', throughput_test.stderr.decode())
-        if not match is None:
-            if len(match.groups()) >= 1:
-                throughput_value = str(match.group(1)).replace('/','p')
-        
-        if throughput_test.returncode == 0: throughput_pass = 'PASS'
+#----------------------------------------------------------------------------------------------------------------------
+# format_latency     - Short human readable latency distribution for table details
+#----------------------------------------------------------------------------------------------------------------------
+def format_latency(latency):
 
-    if not args.json: print('\r', end='')
-    
-    ttable.append(['Test Description', 'Result', 'Details']) 
-    ttable.append(['Ping to Default Gateway', nhop_pass, nhop_gateway + " " + nhop_value])
-    ttable.append(['Ping to Internet without DNS Lookup', ping1_pass, ping1_value])    
-    ttable.append(['Ping to Internet with DNS Lookup', ping2_pass, ping2_value])    
-    ttable.append(['Webpage Download', wget_pass, wget_value])
-    ttable.append(['Brief Downlink Throughput', throughput_pass, throughput_value])
-    
-    # Create a list to store the test results
-    test_results = []
+    if not latency.get('received'):
+        return f"loss {latency['loss']}%"
 
-    # Add test results to the list
-    test_results.append({"test": "ping-gw", "result": nhop_pass, "rtt": nhop_value, "gateway": nhop_gateway})
-    test_results.append({"test": "ping-internet", "result": ping1_pass, "rtt": ping1_value})
-    test_results.append({"test": "ping-internet-with-dns", "result": ping2_pass, "rtt": ping2_value})
-    test_results.append({"test": "webpage-load", "result": wget_pass, "details": wget_value})
-    test_results.append({"test": "downlink-throughput", "result": throughput_pass, "rate": throughput_value})
+    return f"p50/p90/p99 {latency['p50']}/{latency['p90']}/{latency['p99']} ms\nloss {latency['loss']}%, jitter {latency['jitter']} ms"
 
-    # If test mode is selected, perform test but do not show normal output (ignoring -j, -u, -s flags)
-    if args.json:
-        print(json.dumps(test_results))
-    else:
-        print_table(args, 'Connectivity Tests', ttable)
+#----------------------------------------------------------------------------------------------------------------------
+# project_table      - Project records onto table rows (header first) using (header, attribute) column pairs
+#----------------------------------------------------------------------------------------------------------------------
+def project_table(columns, records):
+    return TableView([column[0] for column in columns], operator.attrgetter(*[column[1] for column in columns]), records)
 
 #----------------------------------------------------------------------------------------------------------------------
 # print_table       - Print the passed table - assumes the first row is the column headers
 #----------------------------------------------------------------------------------------------------------------------
-def print_table(args, title, table):
+def print_table(args, title, table, outliers=False):
 
     # Notes:
     # - Current implementation does not support newlines in the column headers or the table header
     # - Current implementation does not handle table header longer than the sum of columns below
     # - Current implementation does not support stretching out table (width or height) 
+    # - Output is assembled in a buffer and written in chunks rather than one print per cell
+    # - Cells ending in OUTLIER_MARK are colored only in tables marking outliers (outliers=True), other tables are
+    #   rendered exactly as they always were
 
     # Do not print tables with zero rows or columns
     if len(table) == 0:
@@ -734,134 +4395,123 @@ def print_table(args, title, table):
     elif len(table[0]) == 0:
         return
 
-    # Determine table dimensions
+    # Rendering time is reported per table (--timings)
+    start = time.perf_counter()
+
+    # Determine table dimensions, limiting the number of data rows shown if requested
     num_rows = len(table)
     num_cols = len(table[0])
-    col_widths = [0] * num_cols
-    row_heights = [1] * num_rows
+
+    hidden_rows = 0
+    if args.max_rows is not None and num_rows - 1 > args.max_rows:
+        hidden_rows = num_rows - 1 - args.max_rows
+        num_rows = args.max_rows + 1
+
+    # Split every cell into its lines once, then find the maximum size of each column (headers and data) and row
+    cells = [[str(table[row][col]).split('\n') for col in range(num_cols)] for row in range(num_rows)]
+    col_widths = [max(len(line) for row in cells for line in row[col]) for col in range(num_cols)]
+    row_heights = [max(len(cell) for cell in row) for row in cells]
 
     print_gridlines = True
 
-    # Find the maximum size of each column (headers and data)
-    for row in range(num_rows):
-        for col in range(num_cols):
-            for line in str(table[row][col]).split('\n'):
-                this_width = len(line)
-                if this_width > col_widths[col]:
-                    col_widths[col] = this_width
-            this_height = len(str(table[row][col]).split("\n"))
-            if this_height > row_heights[row]:
-                row_heights[row] = this_height
-    
     # Find the total width of the table
-    total_width = 0
-    for col in range(num_cols):
-        total_width += col_widths[col] + 3
-
+    total_width = sum(col_widths) + 3 * num_cols
 
-    # Create top bar for table title
-    if not args.barebones:
-        print('\033[2;37m', end='')
-        for col in range(num_cols):
-            if col == 0:
-                print('╭' + '─' * (col_widths[col] + 2), end='')
-            else:
-                print('─' * (col_widths[col] + 3), end='')
-        print('╮')
+    # Bars are identical for every row so build each kind once
+    def bar(first, middle, last, fill=''):
+        return ''.join((first if col == 0 else middle) + fill + '─' * (col_widths[col] + 2) for col in range(num_cols)) + last
 
-    # Create table title
-    if not args.barebones:
-        print('│ \033[0m\033[0;30;47m' + title.center(total_width - 3) + '\033[0m\033[2;37m │')
-    else:
-        print('### ' + title + ' ###')
+    # State values are colored in the fancy table
+    colors = { 'UP': '\033[92m', 'DOWN': '\033[31m', 'LOWERLAYERDOWN': '\033[31m' }
 
-    # Create top bar for column headers
-    if not args.barebones:
-        for col in range(num_cols):
-            if col == 0:
-                print('├' + '─' * (col_widths[col] + 2), end='')
-            else:
-                print('┬' + '─' * (col_widths[col] + 2), end='')
-        print('┤')
+    output = TableWriter()
 
-    # Print headers
     if not args.barebones:
-        for col in range(num_cols):
-            print('│\033[0m\033[1m' + str(table[0][col]).center(col_widths[col]+2) + '\033[0m\033[2;37m', end='')
-        print('│')
-    else:
-        for col in range(num_cols):
-            print(str(table[0][col]).rjust(col_widths[col]), end='|')
-        print()
+        # Create top bar for table title, table title and top bar for column headers
+        output.write('\033[2;37m' + bar('╭', '─', '╮') + '\n')
+        output.write('│ \033[0m\033[0;30;47m' + title.center(total_width - 3) + '\033[0m\033[2;37m │\n')
+        output.write(bar('├', '┬', '┤') + '\n')
 
+        # Print headers and bottom bar for column headers
+        output.write(''.join('│\033[0m\033[1m' + str(table[0][col]).center(col_widths[col] + 2) + '\033[0m\033[2;37m'
+                             for col in range(num_cols)) + '│\n')
+        output.write(bar('├', '┼', '┤') + '\n')
 
-    # Create bottom bar for column headers
-    if not args.barebones:
-        for col in range(num_cols):
-            if col == 0:
-                print('├' + '─' * (col_widths[col] + 2), end='')
-            else:
-                print('┼' + '─' * (col_widths[col] + 2), end='')
-        print('┤')
-
-    # Print each row in the table
-    if not args.barebones:
-        for row in range(1,num_rows):
+        # Print each row in the table
+        gridline = bar('├', '┼', '\033[0m\033[2;37m┤', '\033[2;37m') + '\n'
+        for row in range(1, num_rows):
             for line in range(row_heights[row]):
+                text = ''
                 for col in range(num_cols):
-
-                    split_text = str(table[row][col]).split("\n")
-                    if len(split_text) > line:
-                        text = split_text[line]
-                    else:
-                        text = ""
-                    
-                    print('\033[0m\033[2;37m│\033[0m\033[1m', end='')
-
-                    if text == "UP":
-                        print('\033[92m' + text.rjust(col_widths[col] + 1) + '\033[0m\033[1m', end='')
-                    elif text == "DOWN":
-                        print('\033[31m' + text.rjust(col_widths[col] + 1) + '\033[0m\033[1m', end='')
-                    elif text == "LOWERLAYERDOWN":
-                        print('\033[31m' + text.rjust(col_widths[col] + 1) + '\033[0m\033[1m', end='')
+                    cell = cells[row][col][line] if len(cells[row][col]) > line else ''
+                    if cell in colors or (outliers and cell.endswith(OUTLIER_MARK)):
+                        text += '\033[0m\033[2;37m│\033[0m\033[1m' + colors.get(cell, colors['DOWN']) + cell.rjust(col_widths[col] + 1) + '\033[0m\033[1m '
                     else:
-                        print('\033[0m' + text.rjust(col_widths[col] + 1) + '\033[1m', end='')
-                    print(' ', end='')
-                print('\033[0m\033[2;37m│')
-            
+                        text += '\033[0m\033[2;37m│\033[0m\033[1m\033[0m' + cell.rjust(col_widths[col] + 1) + '\033[1m '
+                output.write(text + '\033[0m\033[2;37m│\n')
+
             if print_gridlines and row < num_rows - 1:
-                # Create bottom bar for column headers
-                for col in range(num_cols):
-                    if col == 0:
-                        print('├\033[2;37m' + '─' * (col_widths[col] + 2), end='')
-                    else:
-                        print('┼\033[2;37m' + '─' * (col_widths[col] + 2), end='')
-                print('\033[0m\033[2;37m┤')
-                
+                output.write(gridline)
+
+        # Create bottom bar for table
+        output.write(bar('╰', '┴', '╯\033[0m') + '\n')
+
     else:
-        for row in range(1,num_rows):
+        output.write('### ' + title + ' ###\n')
+        output.write(''.join(str(table[0][col]).rjust(col_widths[col]) + '|' for col in range(num_cols)) + '\n')
+
+        for row in range(1, num_rows):
             for line in range(row_heights[row]):
-                for col in range(num_cols):
+                output.write(''.join((cells[row][col][line] if len(cells[row][col]) > line else '').rjust(col_widths[col]) + '|'
+                                     for col in range(num_cols)) + '\n')
 
-                    split_text = str(table[row][col]).split("\n")
-                    if len(split_text) > line:
-                        text = split_text[line]
-                    else:
-                        text = ""
-                    
-                    print(text.rjust(col_widths[col]), end='|')
-                print()
-            
-    # Create bottom bar for column headers
-    if not args.barebones:
-        for col in range(num_cols):
-            if col == 0:
-                print('╰' + '─' * (col_widths[col] + 2), end='')
-            else:
-                print('┴' + '─' * (col_widths[col] + 2), end='')
-        print('╯\033[0m')
-    else:
-        print()
+        output.write('\n')
+
+    if hidden_rows:
+        output.write(f'({hidden_rows} more rows not shown, raise --max-rows to display them)\n')
+
+    output.flush()
+    record_timing('print_table', title, 'stage', start)
+
+#----------------------------------------------------------------------------------------------------------------------
+# TableView          - Read-only table rows projected from records on access (row 0 is the header)
+#----------------------------------------------------------------------------------------------------------------------
+class TableView:
+
+    __slots__ = ('header', 'getter', 'records')
+
+    def __init__(self, header, getter, records):
+        self.header = header
+        self.getter = getter
+        self.records = records
+
+    def __len__(self):
+        return len(self.records) + 1
+
+    def __getitem__(self, row):
+        return self.header if row == 0 else self.getter(self.records[row - 1])
+
+#----------------------------------------------------------------------------------------------------------------------
+# TableWriter        - Buffer table output and write it to stdout in large chunks
+#----------------------------------------------------------------------------------------------------------------------
+class TableWriter:
+
+    chunk_size = 1 << 16
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        sys.stdout.write(''.join(self.parts))
+        self.parts = []
+        self.size = 0
 
 #----------------------------------------------------------------------------------------------------------------------
 # Execute main function
@@ -0,0 +1,139 @@
+#!/usr/bin/python3 -I
+
+""" netcheck_brief.py : One-line network health summary for shell prompts and login banners (netcheck --brief) """
+
+__author__     = 'Brent Elliott'
+__email__      = 'brent.j.elliott@intel.com'
+__license__    = 'GPL'
+__version__    = '0.3.0'
+__status__     = 'Development'
+__copyright__  = 'Copyright 2023, Intel Corporation'
+__github__     = 'https://www.github.com/brent-elliott/netcheck/'
+
+# Notes:
+# - Shells run this directly instead of netcheck --brief: netcheck.py is compiled on every run, which alone takes
+#   longer than the startup budget, and it imports everything before parsing arguments
+# - Only os and time are imported up front, json is imported when a cached test result is found
+
+import os
+import time
+
+# Cache directory of the system wide runs (root, --serve), readable by every user
+SYSTEM_CACHE_DIR    = '/var/cache/netcheck'
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# main               - Print the summary line, exiting with status 1 when it shows a problem
+#----------------------------------------------------------------------------------------------------------------------
+def main():
+
+    # Results of the system wide runs count as well as those of this user
+    (text, problems) = brief_summary(list(dict.fromkeys([SYSTEM_CACHE_DIR, user_cache_dir()])))
+    if text:
+        print(text)
+    exit(1 if problems else 0)
+
+#----------------------------------------------------------------------------------------------------------------------
+# user_cache_dir     - Default cache directory of the calling user (netcheck --cache-dir)
+#----------------------------------------------------------------------------------------------------------------------
+def user_cache_dir():
+
+    return SYSTEM_CACHE_DIR if os.geteuid() == 0 else os.path.expanduser('~/.cache/netcheck')
+
+#----------------------------------------------------------------------------------------------------------------------
+# brief_summary      - Build the --brief line, returning it with the number of problems found
+#----------------------------------------------------------------------------------------------------------------------
+def brief_summary(cache_dirs, max_age=3600):
+
+    # Notes:
+    # - Shell prompts and login banners run this, so only files are read: no commands or sockets
+    # - Gateway latency and DNS state come from connectivity tests (netcheck -t, --serve) run within max_age seconds
+    # - The exit status is 1 when a link is down or the gateway, resolver or cached tests show a problem
+    # - Without /sys/class/net (some containers) there is nothing to summarize and the line is empty
+
+    summary = []
+    problems = 0
+
+    # Physical links (those with a device behind them), or every interface but lo where there are none (containers)
+    try:
+        names = [name for name in os.listdir('/sys/class/net') if name != 'lo']
+    except OSError:
+        return ('', 0)
+    links = [name for name in names if os.path.exists(f'/sys/class/net/{name}/device')] or names
+    up = 0
+    for name in links:
+        try:
+            with open(f'/sys/class/net/{name}/operstate') as f:
+                up += f.read().strip() == 'up'
+        except OSError:
+            pass
+    summary.append(f'{up}/{len(links)} links UP')
+    problems += up < len(links)
+
+    # IPv4 default route with the lowest metric (RTF_GATEWAY set, addresses are little endian hex)
+    gateway = None
+    try:
+        with open('/proc/net/route') as f:
+            routes = [line.split() for line in f.readlines()[1:]]
+        defaults = [route for route in routes if route[1] == '00000000' and route[7] == '00000000' and int(route[3], 16) & 0x2]
+        if defaults:
+            route = min(defaults, key=lambda route: int(route[6]))
+            gateway = '.'.join(str(int(route[2][i:i + 2], 16)) for i in (6, 4, 2, 0))
+    except (OSError, ValueError, IndexError):
+        pass
+
+    nameserver = None
+    try:
+        with open('/etc/resolv.conf') as f:
+            nameserver = next((line.split()[1] for line in f if line.split()[:1] == ['nameserver'] and len(line.split()) > 1), None)
+    except OSError:
+        pass
+
+    # Most recent test results of the system cache (root runs) and the user's own
+    tests = {}
+    updated = 0
+    for directory in cache_dirs:
+        path = os.path.join(directory, 'tests.json')
+        try:
+            if time.time() - os.stat(path).st_mtime > max_age:
+                continue
+            import json
+            with open(path) as f:
+                cached = json.load(f)
+            if cached['version'] == 1 and updated < cached['updated'] and time.time() - cached['updated'] <= max_age:
+                (tests, updated) = (cached['tests'], cached['updated'])
+        except (OSError, ValueError, TypeError, KeyError):
+            continue
+
+    ping = tests.get('ping-gw')
+    if gateway is None:
+        summary.append('no gw')
+        problems += 1
+    elif ping and ping['result'] == 'PASS':
+        summary.append('gw ' + (f"{ping['latency']['avg']:.1f} ms" if 'latency' in ping else ping['rtt']))
+    elif ping:
+        summary.append('gw ' + ping['result'].lower())
+        problems += 1
+    else:
+        summary.append('gw ' + gateway)
+
+    # A name resolved by any of the tests using one means DNS works
+    lookups = [tests[name]['result'] for name in ['ping-internet-with-dns', 'webpage-load'] if name in tests]
+    if nameserver is None:
+        summary.append('no DNS')
+        problems += 1
+    elif 'PASS' in lookups:
+        summary.append('DNS ok')
+    elif lookups:
+        summary.append('DNS fail')
+        problems += 1
+    else:
+        summary.append('DNS ' + nameserver)
+
+    return ', '.join(summary), problems
+
+#----------------------------------------------------------------------------------------------------------------------
+# Execute main function
+if __name__ == '__main__':
+    main()
+#----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,51 @@
+require 'facter'
+require 'json'
+
+# Network facts from the snapshot written by 'netcheck --facts'
+#   The file is only read here, a stale or missing snapshot starts netcheck in the background so the
+#   next Puppet run sees fresh facts without this one waiting on a collection.
+Facter.add('netcheck') do
+  confine kernel: 'Linux'
+
+  setcode do
+    netcheck = '/usr/local/bin/netcheck'
+    cache_dir = '/var/cache/netcheck'
+    snapshot = File.join(cache_dir, 'facts.json')
+    refresh = File.join(cache_dir, '.facts-refresh')
+    max_age = 3600
+    retry_after = 600
+
+    facts = nil
+    begin
+      data = JSON.parse(File.read(snapshot))
+      facts = data if data.is_a?(Hash) && data['version'] == 1
+    rescue StandardError
+      facts = nil
+    end
+
+    age = facts ? Time.now.to_f - facts['updated'].to_f : nil
+    stale = age.nil? || age > max_age
+
+    # Only one background refresh is started every retry_after seconds, however often facter runs
+    if stale && Process.uid.zero? && File.executable?(netcheck)
+      begin
+        unless File.exist?(refresh) && Time.now - File.mtime(refresh) < retry_after
+          Dir.mkdir(cache_dir) unless File.directory?(cache_dir)
+          File.write(refresh, '')
+          pid = Process.spawn(netcheck, '--facts', '--cache-dir', cache_dir,
+                              in: File::NULL, out: File::NULL, err: File::NULL, pgroup: true)
+          Process.detach(pid)
+        end
+      rescue StandardError
+        nil
+      end
+    end
+
+    if facts
+      facts.delete('version')
+      facts['age'] = age.round
+      facts['stale'] = stale
+    end
+    facts
+  end
+end
@@ -9,6 +9,7 @@ class cluster_tools::bash::custom_ps1(
   String  $project_name,
   Boolean $user_onetime_overwrite = false,
   Boolean $cluster_hide_shared = true,
+  Boolean $network_summary = false,
   Array[String] $path = ['/usr/local/sbin','/usr/local/bin','/usr/sbin','/usr/bin','/sbin','/bin'],
 ) {
 
@@ -44,7 +45,8 @@ class cluster_tools::bash::custom_ps1(
     group  => 'root',
     mode   => '0644',
     content => epp('cluster_tools/bash/bashrc.epp', {
-      'cluster_ps1' => "\${CLUSTER_PS1}"
+      'cluster_ps1'     => "\${CLUSTER_PS1}",
+      'network_summary' => $network_summary,
     }),
   }
 
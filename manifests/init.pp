@@ -7,6 +7,9 @@
 class cluster_tools(
   Array[String]     $path = ['/usr/local/sbin','/usr/local/bin','/usr/sbin','/usr/bin','/sbin','/bin'],
   String            $netcheck_ensure = 'present',
+  Array[String]     $netcheck_throughput_urls = [],
+  Integer[1]        $netcheck_throughput_streams = 4,
+  Array[String]     $netcheck_dns_names = [],
   String            $puppet_exporter_ensure = 'present',
   String            $pp_cluster = 'unknown',
   String            $pp_project = 'unknown',
@@ -18,6 +18,10 @@ class cluster_tools::install {
     'uninstalled' => 'absent',
     default       => 'file',
   }
+  $netcheck_directory_state = $netcheck_desired_state ? {
+    'absent' => 'absent',
+    default  => 'directory',
+  }
   file { '/usr/local/bin/netcheck':
     ensure => $netcheck_desired_state,
     owner  => 'root',
@@ -25,6 +29,34 @@ class cluster_tools::install {
     mode   => '0755',
     source => "puppet:///modules/cluster_tools/tools/netcheck.py",
   }
+  # one-line summary run by shell prompts and banners, netcheck --brief imports it from beside netcheck
+  file { '/usr/local/bin/netcheck_brief.py':
+    ensure => $netcheck_desired_state,
+    owner  => 'root',
+    group  => 'root',
+    mode   => '0755',
+    source => 'puppet:///modules/cluster_tools/tools/netcheck_brief.py',
+  }
+  file { '/etc/netcheck.conf':
+    ensure  => $netcheck_desired_state,
+    owner   => 'root',
+    group   => 'root',
+    mode    => '0644',
+    content => epp('cluster_tools/netcheck/netcheck.conf.epp', {
+      'throughput_urls'    => $::cluster_tools::netcheck_throughput_urls,
+      'throughput_streams' => $::cluster_tools::netcheck_throughput_streams,
+      'dns_names'          => $::cluster_tools::netcheck_dns_names,
+    }),
+  }
+  # facts snapshot (read by the netcheck fact), hardware facts and cached test results (read by
+  # netcheck_brief.py from any user)
+  file { '/var/cache/netcheck':
+    ensure => $netcheck_directory_state,
+    force  => true,
+    owner  => 'root',
+    group  => 'root',
+    mode   => '0755',
+  }
   file { '/usr/local/bin/puppet-agent-exporter':
     owner  => 'root',
     group  => 'root',
@@ -7,8 +7,17 @@
 class cluster_tools::ohmyzsh::cluster_banner(
   String  $cluster_name,
   String  $project_name,
+  Boolean $network_summary = false,
 ) {
 
+  # The network summary (netcheck_brief.py, the fast path of netcheck --brief) is taken once per shell, on the first
+  # prompt, rather than on every prompt render
+  if $network_summary {
+    $cluster_banner = "  function prompt_cluster_banner() { (( \${+_cluster_network_summary} )) || typeset -g _cluster_network_summary=\"\$(/usr/local/bin/netcheck_brief.py 2>/dev/null)\"; p10k segment -f 32 -i '⧉' -t \"${project_name}-${cluster_name}\${_cluster_network_summary:+ | \$_cluster_network_summary}\" }"
+  } else {
+    $cluster_banner = "  function prompt_cluster_banner() { p10k segment -f 32 -i '⧉' -t '${project_name}-${cluster_name}' }"
+  }
+
   $p10k_homedirs = $facts['p10k_homedirs']
 
   $p10k_homedirs.each |$homedir| {
@@ -16,7 +25,7 @@ class cluster_tools::ohmyzsh::cluster_banner(
       ensure => present,
       path   => "${homedir}/.p10k.zsh",
       match  => '^  function prompt_cluster_banner',
-      line   => "  function prompt_cluster_banner() { p10k segment -f 32 -i '⧉' -t '${project_name}-${cluster_name}' }",
+      line   => $cluster_banner,
       after  => "# typeset -g POWERLEVEL9K_TIME_PREFIX='%fat '",
     }
 
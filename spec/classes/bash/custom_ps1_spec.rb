@@ -6,8 +6,16 @@ describe 'cluster_tools::bash::custom_ps1' do
   on_supported_os.each do |os, os_facts|
     context "on #{os}" do
       let(:facts) { os_facts }
+      let(:params) { { cluster_name: 'c1', project_name: 'p1' } }
 
       it { is_expected.to compile }
+      it { is_expected.to contain_file('/etc/skel/.bashrc').without_content(%r{netcheck_brief}) }
+
+      context 'with the network summary' do
+        let(:params) { super().merge(network_summary: true) }
+
+        it { is_expected.to contain_file('/etc/skel/.bashrc').with_content(%r{^    /usr/local/bin/netcheck_brief\.py 2>/dev/null$}) }
+      end
     end
   end
 end
@@ -8,6 +8,53 @@ describe 'cluster_tools' do
       let(:facts) { os_facts }
 
       it { is_expected.to compile }
+
+      it {
+        is_expected.to contain_file('/etc/netcheck.conf')
+          .with_ensure('file')
+          .with_content(%r{^# urls = https://aka\.azureedge\.net/probe/test10mb\.jpg$})
+          .with_content(%r{^streams = 4$})
+          .with_content(%r{^# names = www\.cloudflare\.com$})
+      }
+
+      context 'with throughput targets' do
+        let(:params) do
+          {
+            netcheck_throughput_urls: ['http://mirror1.example.net/10mb.bin', 'http://mirror2.example.net/10mb.bin'],
+            netcheck_throughput_streams: 8,
+          }
+        end
+
+        it { is_expected.to compile }
+        it {
+          is_expected.to contain_file('/etc/netcheck.conf')
+            .with_content(%r{^urls = http://mirror1\.example\.net/10mb\.bin\n       http://mirror2\.example\.net/10mb\.bin$})
+            .with_content(%r{^streams = 8$})
+        }
+      end
+
+      context 'with DNS test names' do
+        let(:params) { { netcheck_dns_names: ['www.example.net', 'registry.example.net'] } }
+
+        it { is_expected.to compile }
+        it {
+          is_expected.to contain_file('/etc/netcheck.conf')
+            .with_content(%r{^\[dns\]\n# .*\nnames = www\.example\.net registry\.example\.net$})
+            .without_content(%r{^# names = })
+        }
+      end
+
+      context 'with zero throughput streams' do
+        let(:params) { { netcheck_throughput_streams: 0 } }
+
+        it { is_expected.to compile.and_raise_error(%r{netcheck_throughput_streams}) }
+      end
+
+      context 'with netcheck absent' do
+        let(:params) { { netcheck_ensure: 'absent' } }
+
+        it { is_expected.to contain_file('/etc/netcheck.conf').with_ensure('absent') }
+      end
     end
   end
 end
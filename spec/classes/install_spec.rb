@@ -6,8 +6,31 @@ describe 'cluster_tools::install' do
   on_supported_os.each do |os, os_facts|
     context "on #{os}" do
       let(:facts) { os_facts }
+      let(:pre_condition) { 'include cluster_tools' }
 
       it { is_expected.to compile }
+
+      it {
+        is_expected.to contain_file('/usr/local/bin/netcheck_brief.py')
+          .with_ensure('file')
+          .with_mode('0755')
+          .with_source('puppet:///modules/cluster_tools/tools/netcheck_brief.py')
+      }
+
+      it {
+        is_expected.to contain_file('/var/cache/netcheck')
+          .with_ensure('directory')
+          .with_owner('root')
+          .with_group('root')
+          .with_mode('0755')
+      }
+
+      context 'with netcheck absent' do
+        let(:pre_condition) { "class { 'cluster_tools': netcheck_ensure => 'absent' }" }
+
+        it { is_expected.to contain_file('/usr/local/bin/netcheck_brief.py').with_ensure('absent') }
+        it { is_expected.to contain_file('/var/cache/netcheck').with_ensure('absent').with_force(true) }
+      end
     end
   end
 end
@@ -5,9 +5,24 @@ require 'spec_helper'
 describe 'cluster_tools::ohmyzsh::cluster_banner' do
   on_supported_os.each do |os, os_facts|
     context "on #{os}" do
-      let(:facts) { os_facts }
+      let(:facts) { os_facts.merge(p10k_homedirs: ['/home/user1']) }
+      let(:params) { { cluster_name: 'c1', project_name: 'p1' } }
 
       it { is_expected.to compile }
+      it {
+        is_expected.to contain_file_line('ensure cluster_banner function exists for /home/user1')
+          .with_line("  function prompt_cluster_banner() { p10k segment -f 32 -i '⧉' -t 'p1-c1' }")
+      }
+
+      context 'with the network summary' do
+        let(:params) { super().merge(network_summary: true) }
+
+        # Taken on the first prompt of a shell only
+        it {
+          is_expected.to contain_file_line('ensure cluster_banner function exists for /home/user1')
+            .with_line(%r{\(\( \$\{\+_cluster_network_summary\} \)\) \|\| typeset -g _cluster_network_summary="\$\(/usr/local/bin/netcheck_brief\.py 2>/dev/null\)"})
+        }
+      end
     end
   end
 end
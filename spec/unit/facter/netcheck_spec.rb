@@ -0,0 +1,142 @@
+# frozen_string_literal: true
+
+require 'spec_helper'
+require 'json'
+
+describe 'netcheck' do
+  subject(:fact) { Facter.fact(:netcheck) }
+
+  let(:netcheck) { '/usr/local/bin/netcheck' }
+  let(:cache_dir) { '/var/cache/netcheck' }
+  let(:snapshot) { '/var/cache/netcheck/facts.json' }
+  let(:refresh) { '/var/cache/netcheck/.facts-refresh' }
+  let(:uid) { 0 }
+  let(:facts_json) do
+    JSON.generate('version' => 1, 'updated' => Time.now.to_f - age,
+                  'interfaces' => { 'eth0' => { 'driver' => 'ice', 'speed' => 25_000 } }, 'gateway' => '192.0.2.1')
+  end
+
+  before(:each) do
+    Facter.clear
+    allow(Facter.fact(:kernel)).to receive(:value).and_return('Linux')
+
+    allow(File).to receive(:read).and_call_original
+    allow(File).to receive(:exist?).and_call_original
+    allow(File).to receive(:executable?).and_call_original
+    allow(File).to receive(:directory?).and_call_original
+    allow(File).to receive(:executable?).with(netcheck).and_return(true)
+    allow(File).to receive(:directory?).with(cache_dir).and_return(true)
+    allow(File).to receive(:write).with(refresh, '')
+    allow(Process).to receive(:uid).and_return(uid)
+    allow(Process).to receive(:spawn).and_return(4242)
+    allow(Process).to receive(:detach)
+  end
+
+  after(:each) { Facter.clear }
+
+  context 'with a fresh snapshot' do
+    let(:age) { 120 }
+
+    before(:each) { allow(File).to receive(:read).with(snapshot).and_return(facts_json) }
+
+    it 'returns the snapshot with its age' do
+      expect(fact.value).to include('gateway' => '192.0.2.1', 'stale' => false,
+                                    'interfaces' => { 'eth0' => { 'driver' => 'ice', 'speed' => 25_000 } })
+      expect(fact.value['age']).to be_within(2).of(120)
+      expect(fact.value).not_to have_key('version')
+    end
+
+    it 'does not refresh the snapshot' do
+      fact.value
+      expect(Process).not_to have_received(:spawn)
+    end
+  end
+
+  context 'with a stale snapshot' do
+    let(:age) { 7200 }
+
+    before(:each) do
+      allow(File).to receive(:read).with(snapshot).and_return(facts_json)
+      allow(File).to receive(:exist?).with(refresh).and_return(false)
+    end
+
+    it 'returns the snapshot marked stale' do
+      expect(fact.value).to include('gateway' => '192.0.2.1', 'stale' => true)
+    end
+
+    it 'refreshes the snapshot in the background' do
+      fact.value
+      expect(File).to have_received(:write).with(refresh, '')
+      expect(Process).to have_received(:spawn).with(netcheck, '--facts', '--cache-dir', cache_dir,
+                                                    in: File::NULL, out: File::NULL, err: File::NULL, pgroup: true)
+      expect(Process).to have_received(:detach).with(4242)
+    end
+
+    context 'when a refresh started less than 600 seconds ago' do
+      before(:each) do
+        allow(File).to receive(:exist?).with(refresh).and_return(true)
+        allow(File).to receive(:mtime).with(refresh).and_return(Time.now - 300)
+      end
+
+      it 'does not start another' do
+        expect(fact.value).to include('stale' => true)
+        expect(Process).not_to have_received(:spawn)
+        expect(File).not_to have_received(:write)
+      end
+    end
+
+    context 'when the last refresh started more than 600 seconds ago' do
+      before(:each) do
+        allow(File).to receive(:exist?).with(refresh).and_return(true)
+        allow(File).to receive(:mtime).with(refresh).and_return(Time.now - 900)
+      end
+
+      it 'starts a new one' do
+        fact.value
+        expect(Process).to have_received(:spawn).once
+      end
+    end
+
+    context 'when not run as root' do
+      let(:uid) { 1000 }
+
+      it 'returns the snapshot without refreshing it' do
+        expect(fact.value).to include('stale' => true)
+        expect(Process).not_to have_received(:spawn)
+      end
+    end
+  end
+
+  context 'without a snapshot' do
+    before(:each) do
+      allow(File).to receive(:read).with(snapshot).and_raise(Errno::ENOENT)
+      allow(File).to receive(:exist?).with(refresh).and_return(false)
+    end
+
+    it 'is not set and starts a refresh' do
+      expect(fact.value).to be_nil
+      expect(Process).to have_received(:spawn).once
+    end
+
+    context 'when not run as root' do
+      let(:uid) { 1000 }
+
+      it 'is not set and does not start a refresh' do
+        expect(fact.value).to be_nil
+        expect(Process).not_to have_received(:spawn)
+      end
+    end
+  end
+
+  context 'with a snapshot of another version' do
+    let(:age) { 120 }
+
+    before(:each) do
+      allow(File).to receive(:read).with(snapshot).and_return(JSON.generate('version' => 2, 'updated' => Time.now.to_f))
+      allow(File).to receive(:exist?).with(refresh).and_return(true)
+      allow(File).to receive(:mtime).with(refresh).and_return(Time.now)
+    end
+
+    it { expect(fact.value).to be_nil }
+  end
+end
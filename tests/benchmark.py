@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+""" Time netcheck parsing and rendering stages on synthetic fixtures and compare against a baseline
+
+    Not part of the installed tool: run from a checkout, e.g. before and after a change
+
+        python3 tests/benchmark.py /tmp/netcheck-baseline.json     (written on the first run, compared on later runs)
+
+    Exits with status 1 when a stage regresses beyond the threshold, --brief exceeds its startup budget or the interface
+    records are not both faster and smaller than the positional rows they replaced.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files', 'tools'))
+import netcheck
+
+# Wall time a complete --brief run may take beyond the startup of a bare interpreter (shells run it once, at startup)
+BRIEF_BUDGET        = 0.020
+
+# Interfaces in the record model comparison (half of them VLANs)
+MODEL_SCALE         = 10000
+
+#----------------------------------------------------------------------------------------------------------------------
+# main               - Benchmark every scale, print the results table (or JSON) and gate on regressions
+#----------------------------------------------------------------------------------------------------------------------
+def main():
+
+    # Notes:
+    # - Each scale is replayed from a generated fixture, so no host commands run and results are comparable across nodes
+    # - process_ip_addr includes the interface, VLAN and PCIe table rendering, print_table is also reported on its own
+    # - Regressions must exceed both the threshold and 1 ms, since the smallest fixtures finish in well under a millisecond
+
+    parser = argparse.ArgumentParser(description='Benchmark netcheck parsing and rendering on synthetic fixtures')
+    parser.add_argument('baseline',         nargs='?', metavar='BASELINE',
+                                            help='Baseline results to compare against (written if it does not exist)')
+    parser.add_argument('--threshold',      type=float, default=25, metavar='PERCENT',
+                                            help='Slowdown versus the baseline reported as a regression (default: 25)')
+    parser.add_argument('--scales',         default='10,100,1000,10000', metavar='LIST',
+                                            help='Interface counts to benchmark (default: 10,100,1000,10000)')
+    parser.add_argument('-j', '--json',     action='store_true', help='Export the results in json format')
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    stages = ['process_ip_addr', 'process_ip_route', 'process_resolvectl', 'print_table']
+
+    btable = []     # Benchmark table
+
+    results = {str(scale): run_scale(scale, stages) for scale in scales}
+
+    # --brief startup is checked against a fixed budget above the bare interpreter instead of the baseline
+    startup = brief_startup()
+
+    # Interface records are checked against the positional rows (and per-interface dicts) they replaced
+    model = record_model(MODEL_SCALE)
+
+    # Compare with the baseline if one exists, otherwise the results become the baseline
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)['results']
+        except FileNotFoundError:
+            netcheck.write_atomic(os.path.abspath(args.baseline), json.dumps({'version': 1, 'results': results}, indent=2))
+        except Exception as e:
+            print(f"\nERROR: Benchmark baseline '{args.baseline}' cannot be read. Please remove it to record a new baseline.")
+            print(f"       {e}")
+            exit(120)
+
+    regressions = []
+    for scale in results:
+        for stage in stages:
+            elapsed = results[scale][stage]
+            reference = baseline.get(scale, {}).get(stage) if baseline else None
+
+            if reference is None:
+                change, status = '', 'new' if baseline else ''
+            else:
+                change = f'{(elapsed - reference) / reference * 100:+.1f}%' if reference > 0 else ''
+                if elapsed > reference * (1 + args.threshold / 100) and elapsed - reference > 0.001:
+                    status = 'REGRESSION'
+                    regressions.append(f'{stage} at {scale} interfaces')
+                else:
+                    status = 'ok'
+
+            btable.append([ scale, stage, f'{elapsed * 1000:.2f} ms',
+                            '' if reference is None else f'{reference * 1000:.2f} ms', change, status ])
+
+    overhead = startup['brief'] - startup['interpreter']
+    if overhead > BRIEF_BUDGET:
+        regressions.append(f"brief startup ({overhead * 1000:.1f} ms above the interpreter, budget {BRIEF_BUDGET * 1000:g} ms)")
+    btable.append([ '', 'interpreter startup', f"{startup['interpreter'] * 1000:.2f} ms", '', '', '' ])
+    btable.append([ '', 'brief startup', f"{overhead * 1000:.2f} ms", f'{BRIEF_BUDGET * 1000:g} ms (budget)', '',
+                    'REGRESSION' if overhead > BRIEF_BUDGET else 'ok' ])
+
+    for (measure, unit, scale) in [('seconds', 'ms', 1000), ('peak', 'MiB', 1 / (1 << 20))]:
+        (records, rows) = (model['records'][measure], model['rows'][measure])
+        if records >= rows:
+            regressions.append(f'record model {measure} at {MODEL_SCALE} interfaces')
+        btable.append([ MODEL_SCALE, f"record model {'time' if measure == 'seconds' else 'peak memory'}",
+                        f'{records * scale:.2f} {unit}', f'{rows * scale:.2f} {unit} (rows)',
+                        f'{(records - rows) / rows * 100:+.1f}%', 'REGRESSION' if records >= rows else 'ok' ])
+
+    if args.json:
+        print(json.dumps({'results': results, 'baseline': baseline, 'startup': startup, 'model': model,
+                          'regressions': regressions}))
+    else:
+        btable.insert(0, ['SCALE', 'STAGE', 'TIME', 'BASELINE', 'CHANGE', 'STATUS'])
+        netcheck.print_table(netcheck.args, 'Benchmark', btable)
+
+        if args.baseline and baseline is None:
+            print(f'Baseline written to {args.baseline}')
+
+    # Regressions fail the run so the benchmark can gate changes
+    if regressions:
+        if not args.json:
+            print(f"\nERROR: Regression beyond {args.threshold:g}% or budget in {', '.join(regressions)}.")
+        exit(1)
+
+#----------------------------------------------------------------------------------------------------------------------
+# run_scale          - Best time of each stage over several reports replayed from a fixture of scale interfaces
+#----------------------------------------------------------------------------------------------------------------------
+def run_scale(scale, stages, repeats=3):
+
+    results = {}
+    console = sys.stdout
+
+    # Every table is rendered in the default format from replayed ethtool output (sysfs is not part of the fixture)
+    with tempfile.TemporaryDirectory(prefix='netcheck-benchmark-') as directory:
+        write_synthetic_fixture(directory, scale)
+
+        # All per-run state is reset by initialize, so every run parses the fixture from scratch
+        for repeat in range(repeats):
+            netcheck.initialize(['--config', os.devnull, '--replay', directory, '--sysfs-root', os.path.join(directory, 'sys'),
+                                 '--backend', 'ethtool', '-I', '-V', '-P', '-R', '-D'])
+            netcheck.timings = []
+            netcheck.timings_origin = time.perf_counter()
+
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                netcheck.report()
+            finally:
+                sys.stdout.close()
+                sys.stdout = console
+
+            for stage in stages:
+                elapsed = sum(event['duration'] for event in netcheck.timings if event['name'] == stage)
+                results[stage] = min(results.get(stage, elapsed), elapsed)
+
+    return results
+
+#----------------------------------------------------------------------------------------------------------------------
+# brief_startup      - Median wall time of complete netcheck_brief.py runs and of a bare interpreter, in seconds
+#----------------------------------------------------------------------------------------------------------------------
+def brief_startup(repeats=21):
+
+    # Notes:
+    # - Each run is a fresh interpreter running the script as installed (/usr/local/bin/netcheck_brief.py) and as
+    #   shells run it, netcheck --brief itself also pays for compiling netcheck.py
+    # - The bare interpreter varies a lot between hosts, so only the time --brief takes beyond it is budgeted
+
+    path = os.path.join(os.path.dirname(os.path.abspath(netcheck.__file__)), 'netcheck_brief.py')
+    commands = {
+        'interpreter': [sys.executable, '-I', '-c', 'pass'],
+        'brief':       [sys.executable, '-I', path]
+    }
+
+    startup = {}
+    for (name, command) in commands.items():
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = []
+        for repeat in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            elapsed.append(time.perf_counter() - start)
+        startup[name] = sorted(elapsed)[repeats // 2]
+
+    return startup
+
+#----------------------------------------------------------------------------------------------------------------------
+# record_model       - Best time and traced peak memory of the interface table models for scale interfaces
+#----------------------------------------------------------------------------------------------------------------------
+def record_model(scale, repeats=5):
+
+    # Notes:
+    # - Both models are built from the same human readable values, as process_interface leaves them, and every table
+    #   cell is then read once as print_table does, so only the model itself differs
+    # - Peak memory is traced in a separate run, tracing slows allocations down too much to time them at once
+
+    fields = []
+    physical = scale - scale // 2
+    for index in range(scale):
+        ifindex = index + 2
+        values = {
+            'ifindex': ifindex, 'address': f'02:00:{ifindex >> 16 & 255:02x}:{ifindex >> 8 & 255:02x}:{ifindex & 255:02x}:01',
+            'state': 'UP' if index % 7 else 'DOWN', 'ip': f'10.{index >> 8 & 255}.{index & 255}.1/24', 'speed': '25 Gb/s'
+        }
+        if index < physical:
+            values.update({'ifname': f'ens{index}f{index % 2}', 'driver': 'ice', 'firmware': '4.40', 'port': 'DAC',
+                           'bus': f'{index // 8 % 256:02x}:{index // 2 % 4:02x}.{index % 2}',
+                           'altnames': f'enp{index // 8 % 256}s{index // 2 % 4}f{index % 2}',
+                           'description': 'Ethernet Controller E810-XXV for SFP'})
+        else:
+            parent = f'ens{index % physical}f{index % physical % 2}'
+            values.update({'ifname': f'{parent}.{index}', 'link': parent, 'vlanid': index % 4094 + 1, 'firmware': 'N/A',
+                           'port': 'Virtual'})
+        fields.append(values)
+
+    def read_cells(tables):
+        return sum(len(str(cell)) for table in tables for row in range(len(table)) for cell in table[row])
+
+    results = {}
+    for (name, build) in [('rows', build_rows), ('records', build_records)]:
+        tracemalloc.start()
+        read_cells(build(fields))
+        results[name] = {'peak': tracemalloc.get_traced_memory()[1]}
+        tracemalloc.stop()
+
+        for repeat in range(repeats):
+            start = time.perf_counter()
+            read_cells(build(fields))
+            elapsed = time.perf_counter() - start
+            results[name]['seconds'] = min(results[name].get('seconds', elapsed), elapsed)
+
+    return results
+
+#----------------------------------------------------------------------------------------------------------------------
+# build_rows         - Interface, VLAN and PCIe tables as positional rows, the model replaced by InterfaceRecord
+#----------------------------------------------------------------------------------------------------------------------
+def build_rows(fields):
+
+    # Each interface had a human readable dict and private tables, merged and then sorted into copies
+    def collect(values):
+        human = json.loads('{}')
+        itable, vtable, ptable = [], [], []
+        for key in ['ip', 'altnames', 'bus', 'speed', 'port', 'firmware']:
+            human[key] = values.get(key, '')
+
+        if values.get('link'):
+            vtable.append([ values['ifindex'], values['ifname'], values['link'], values['vlanid'], values['address'],
+                            values['state'], human['ip'] ])
+        else:
+            if human['bus']:
+                ptable.append([ values['ifindex'], values['ifname'], human['bus'], values['description'] ])
+            itable.append([ values['ifindex'], values['ifname'], values['address'], values['state'], human['ip'],
+                            values['driver'], human['firmware'], human['bus'], human['speed'], human['port'], human['altnames'] ])
+        return itable, vtable, ptable
+
+    itable, vtable, ptable = [], [], []
+    for rows in [collect(values) for values in fields]:
+        itable += rows[0]
+        vtable += rows[1]
+        ptable += rows[2]
+
+    itable = sorted(itable, key=lambda x: (x[5], x[9], x[1]))
+    itable = sorted(itable, key=lambda x: (0 if x[3] == 'UP' else 1 if x[3] == 'DOWN' else 2, x[3]))
+    vtable = sorted(vtable, key=lambda x: (x[2], x[3]))
+    ptable = sorted(ptable, key=lambda x: x[2])
+
+    itable.insert(0, ['ID', 'INTERFACE', 'MAC ADDRESS', 'STATE', 'IP ADDRESSES', 'DRIVER', 'FIRMWARE', 'BUS', 'SPEED', 'PORT', 'ALTNAMES'])
+    vtable.insert(0, ['ID', 'INTERFACE', 'LINK', 'VID', 'MAC ADDRESS', 'STATE', 'IP ADDRESSES'])
+    ptable.insert(0, ['ID', 'INTERFACE', 'BUS', 'DESCRIPTION'])
+
+    return itable, vtable, ptable
+
+#----------------------------------------------------------------------------------------------------------------------
+# build_records      - Interface, VLAN and PCIe tables projected from InterfaceRecord lists, as process_ip_addr does
+#----------------------------------------------------------------------------------------------------------------------
+def build_records(fields):
+
+    records = [netcheck.InterfaceRecord(**values) for values in fields]
+    itable = [record for record in records if not record.link]
+    vtable = [record for record in records if record.link]
+    ptable = [record for record in itable if record.bus]
+
+    itable.sort(key=lambda x: (x.driver, x.port, x.ifname))
+    itable.sort(key=lambda x: (0 if x.state == 'UP' else 1 if x.state == 'DOWN' else 2, x.state))
+    vtable.sort(key=lambda x: (x.link, x.vlanid))
+    ptable.sort(key=lambda x: x.bus)
+
+    columns = [('ID', 'ifindex'), ('INTERFACE', 'ifname'), ('MAC ADDRESS', 'address'), ('STATE', 'state'), ('IP ADDRESSES', 'ip'),
+               ('DRIVER', 'driver'), ('FIRMWARE', 'firmware'), ('BUS', 'bus'), ('SPEED', 'speed'), ('PORT', 'port'),
+               ('ALTNAMES', 'altnames')]
+    return (netcheck.project_table(columns, itable),
+            netcheck.project_table([('ID', 'ifindex'), ('INTERFACE', 'ifname'), ('LINK', 'link'), ('VID', 'vlanid'),
+                                    ('MAC ADDRESS', 'address'), ('STATE', 'state'), ('IP ADDRESSES', 'ip')], vtable),
+            netcheck.project_table([('ID', 'ifindex'), ('INTERFACE', 'ifname'), ('BUS', 'bus'), ('DESCRIPTION', 'description')],
+                                   ptable))
+
+#----------------------------------------------------------------------------------------------------------------------
+# write_synthetic_fixture - Generate a replay fixture for a host with scale interfaces (half of them VLANs) and routes
+#----------------------------------------------------------------------------------------------------------------------
+def write_synthetic_fixture(directory, scale):
+
+    commands = {}
+    interfaces = []
+    routes = []
+    devices = []
+    resolver = ['Global', '       Protocols: +LLMNR +mDNS -DNSOverTLS DNSSEC=no/unsupported', 'resolv.conf mode: stub', '']
+
+    def capture(command, stdout):
+        result = subprocess.CompletedProcess(command, 0, stdout.encode(), b'')
+        commands[netcheck.fixture_key(command)] = netcheck.store_fixture_command(directory, command, result)
+
+    physical = scale - scale // 2
+    for index in range(scale):
+        ifindex = index + 2
+        address = f'02:00:{ifindex >> 16 & 255:02x}:{ifindex >> 8 & 255:02x}:{ifindex & 255:02x}:01'
+        entry = {
+            'ifindex': ifindex, 'flags': ['BROADCAST', 'MULTICAST', 'UP', 'LOWER_UP'], 'mtu': 9000, 'qdisc': 'mq',
+            'operstate': 'UP' if index % 7 else 'DOWN', 'group': 'default', 'txqlen': 1000, 'link_type': 'ether',
+            'address': address, 'broadcast': 'ff:ff:ff:ff:ff:ff',
+            'addr_info': [{'family': 'inet', 'local': f'10.{index >> 8 & 255}.{index & 255}.1', 'prefixlen': 24,
+                           'scope': 'global'}]
+        }
+
+        if index < physical:
+            ifname = f'ens{index}f{index % 2}'
+            bus = f'0000:{index // 8 % 256:02x}:{index // 2 % 4:02x}.{index % 2}'
+            entry.update({'ifname': ifname, 'altnames': [f'enp{index // 8 % 256}s{index // 2 % 4}f{index % 2}']})
+
+            capture(['ethtool', '-i', ifname], f'driver: ice\nversion: 6.2.0\nfirmware-version: 4.40 0x8001c967 1.3534.0\n'
+                                               f'expansion-rom-version: \nbus-info: {bus}\nsupports-statistics: yes\n')
+            devices.append(f'{bus} "Ethernet controller" "Intel Corporation" "Ethernet Controller E810-XXV for SFP" -r02 '
+                           f'"Intel Corporation" "Ethernet Network Adapter E810-XXV-2"')
+            resolver += [f'Link {ifindex} ({ifname})', '    Current Scopes: DNS',
+                         f'Current DNS Server: 10.{index >> 8 & 255}.{index & 255}.53',
+                         f'       DNS Servers: 10.{index >> 8 & 255}.{index & 255}.53 10.{index >> 8 & 255}.{index & 255}.54',
+                         '        DNS Domain: cluster.example.net', '']
+        else:
+            parent = f'ens{index % physical}f{index % physical % 2}'
+            ifname = f'{parent}.{index}'
+            entry.update({'ifname': ifname, 'link': parent,
+                          'linkinfo': {'info_kind': 'vlan', 'info_data': {'protocol': '802.1Q', 'id': index % 4094 + 1}}})
+
+            capture(['ethtool', '-i', ifname], 'driver: 802.1Q VLAN Support\nversion: 1.8\nfirmware-version: N/A\n'
+                                               'bus-info: \nsupports-statistics: no\n')
+
+        capture(['ethtool', ifname], f'Settings for {ifname}:\n\tSupported ports: [ FIBRE ]\n\tSpeed: 25000Mb/s\n'
+                                     f'\tDuplex: Full\n\tPort: Direct Attach Copper\n\tLink detected: yes\n')
+        interfaces.append(entry)
+
+        routes.append({'type': 'unicast', 'dst': f'172.{16 + (index >> 16 & 15)}.{index >> 8 & 255}.{index & 255}/32',
+                       'gateway': f'10.{index >> 8 & 255}.{index & 255}.254', 'dev': ifname, 'protocol': 'bgp',
+                       'scope': 'global', 'metric': 20, 'flags': []})
+
+    capture(['ip', '-detail', '-json', 'address', 'show'], json.dumps(interfaces))
+    capture(['ip', '-detail', '-json', 'route'], json.dumps(routes))
+    capture(['lspci', '-D', '-mm'], '\n'.join(devices) + '\n')
+    capture(['resolvectl'], '\n'.join(resolver))
+
+    with open(os.path.join(directory, 'commands.json'), 'w') as f:
+        json.dump({'version': 1, 'commands': commands}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
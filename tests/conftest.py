@@ -0,0 +1,36 @@
+""" Shared fixtures for the netcheck tests: the tool is imported from files/tools and configured per test """
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files', 'tools'))
+
+import netcheck as netcheck_module
+
+
+@pytest.fixture
+def netcheck(tmp_path, monkeypatch):
+    """ Return a function configuring netcheck with command-line arguments, isolated from the host configuration """
+
+    # --ndjson moves sys.stdout, it is put back after each test
+    monkeypatch.setattr(sys, 'stdout', sys.stdout)
+
+    def configure(*argv):
+        netcheck_module.initialize(['--config', os.devnull, '--cache-dir', str(tmp_path / 'cache'), *argv])
+        return netcheck_module
+
+    return configure
+
+
+@pytest.fixture
+def replay(tmp_path):
+    """ Replay fixture (--replay) of a synthetic host with 12 interfaces, half of them VLANs, as the benchmark writes it """
+
+    import benchmark
+
+    directory = tmp_path / 'replay'
+    directory.mkdir()
+    benchmark.write_synthetic_fixture(str(directory), 12)
+    return ['--replay', str(directory), '--sysfs-root', str(directory / 'sys'), '--backend', 'ethtool', '--no-cache']
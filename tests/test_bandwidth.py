@@ -0,0 +1,102 @@
+""" Bandwidth tests between --bw-client and --bw-server over the loopback interface """
+
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def server(netcheck):
+    nc = netcheck('--bw-server', '--bw-port', '0', '-j')
+    server = nc.open_bandwidth_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def results(capsys, count):
+    """ Client and server both print one JSON result, the server once its last stream has ended """
+
+    lines = []
+    for _ in range(50):
+        lines += capsys.readouterr().out.splitlines()
+        if len(lines) >= count:
+            break
+        time.sleep(0.05)
+    return {result['direction']: result for result in map(json.loads, lines)}
+
+
+def test_listens_on_loopback_by_default(server):
+    assert server.server_address[0] == '127.0.0.1'
+
+
+@pytest.mark.parametrize('reverse', [[], ['--bw-reverse']])
+def test_loopback(netcheck, server, capsys, reverse):
+    nc = netcheck('--bw-client', '127.0.0.1', '--bw-port', str(server.server_address[1]), '--bw-streams', '3',
+                  '--bw-duration', '0.3', '-j', *reverse)
+    nc.bandwidth_client()
+
+    # Each side reports its own direction
+    test = results(capsys, 2)
+    assert test.keys() == {'send', 'receive'}
+    for result in test.values():
+        assert result['peer'] == '127.0.0.1' and result['interface'] == 'lo'
+        assert len(result['streams']) == 3 and result['bytes'] > 0 and result['bps'] > 0
+
+    # Client and server agree on the bytes that went through
+    assert test['send']['bytes'] == test['receive']['bytes']
+
+
+def test_streams_capped(netcheck, server):
+    nc = netcheck()
+
+    with socket.create_connection(server.server_address, timeout=5) as sock:
+        sock.sendall(nc.BANDWIDTH_HELLO.pack(nc.BANDWIDTH_MAGIC, 1, 0, nc.BANDWIDTH_MAX_STREAMS + 1, 1, 1))
+
+        # The server hangs up instead of waiting for the other streams of the test
+        assert sock.recv(1) == b''
+
+
+def test_client_streams_capped(netcheck, capsys):
+    with pytest.raises(SystemExit):
+        netcheck('--bw-client', '127.0.0.1', '--bw-streams', '129')
+    assert 'must be between 1 and 128' in capsys.readouterr().err
+
+
+def test_partial_tests_expire(netcheck, server, monkeypatch):
+    """ A test whose client opened fewer streams than it announced is dropped on the next connection after the timeout """
+
+    nc = netcheck()
+    monkeypatch.setattr(nc, 'BANDWIDTH_IDLE_TIMEOUT', 0.5)
+
+    # One stream of each test, sending nothing, ends as soon as the server has returned its result
+    def stream(token):
+        with socket.create_connection(server.server_address, timeout=5) as sock:
+            sock.sendall(nc.BANDWIDTH_HELLO.pack(nc.BANDWIDTH_MAGIC, 1, 0, 2, 1, token))
+            sock.shutdown(socket.SHUT_WR)
+            assert len(nc.recv_exact(sock, nc.BANDWIDTH_RESULT.size)) == nc.BANDWIDTH_RESULT.size
+
+    # Handlers update the tests after returning the result, so wait for count of them to be pending
+    def tokens(count):
+        for _ in range(50):
+            with server.tests_lock:
+                pending = sorted(server.tests)
+            if len(pending) == count:
+                return pending
+            time.sleep(0.02)
+        return pending
+
+    stream(1)
+    assert tokens(1) == [1]
+
+    # Still within the timeout, the first test keeps waiting for its second stream
+    stream(2)
+    assert tokens(2) == [1, 2]
+
+    time.sleep(0.6)
+    stream(3)
+    assert tokens(1) == [3]
@@ -0,0 +1,52 @@
+""" Name resolution in the ICMP and DNS probes is bounded by their deadline, a hanging lookup is abandoned """
+
+import socket
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def hanging_resolver(monkeypatch):
+    """ getaddrinfo that blocks on names under .hang until the test ends, other names resolve normally """
+
+    release = threading.Event()
+    getaddrinfo = socket.getaddrinfo
+
+    def resolve(host, *posargs, **kwargs):
+        if host.endswith('.hang'):
+            release.wait(10)
+            raise socket.gaierror(socket.EAI_AGAIN, 'released')
+        return getaddrinfo(host, *posargs, **kwargs)
+
+    monkeypatch.setattr(socket, 'getaddrinfo', resolve)
+    yield
+    release.set()
+
+
+def test_icmp_probe_resolution_deadline(netcheck, hanging_resolver):
+    nc = netcheck()
+    start = time.monotonic()
+
+    with pytest.raises(TimeoutError):
+        nc.icmp_probe(['peer.hang'], count=1, deadline=start + 0.2)
+    assert time.monotonic() - start < 1
+
+
+def test_dns_probe_resolution_timeout(netcheck, hanging_resolver):
+    nc = netcheck()
+    start = time.monotonic()
+
+    probes = nc.dns_probe(['resolver.hang', '127.0.0.1:9'], ['example.com'], count=1, timeout=0.2)
+    assert time.monotonic() - start < 1
+    assert 'timed out' in probes['resolver.hang']['error']
+    assert probes['127.0.0.1:9']['sent'] == 1
+
+
+def test_resolve_targets(netcheck, hanging_resolver):
+    nc = netcheck()
+
+    resolved = nc.resolve_targets([('127.0.0.1', 53), ('peer.hang', None), ('127.0.0.1', 53)], time.monotonic() + 0.2)
+    assert resolved[('127.0.0.1', 53)] == (socket.AF_INET, ('127.0.0.1', 53))
+    assert isinstance(resolved[('peer.hang', None)], TimeoutError)
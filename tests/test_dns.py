@@ -0,0 +1,183 @@
+""" Resolver configuration sources and --dns-test against a stub DNS responder on an ephemeral loopback port """
+
+import json
+import socket
+import struct
+import subprocess
+import threading
+
+import pytest
+
+RESOLVECTL = '''Global
+       Protocols: -LLMNR -mDNS -DNSOverTLS DNSSEC=no/unsupported
+resolv.conf mode: stub
+
+Link 2 (eth0)
+    Current Scopes: DNS
+         Protocols: +DefaultRoute +LLMNR -mDNS -DNSOverTLS DNSSEC=no/unsupported
+Current DNS Server: 10.0.0.53
+       DNS Servers: 10.0.0.53 10.0.0.54
+                    fd00::53
+        DNS Domain: cluster.example.net example.net
+
+Link 3 (eth1.100)
+    Current Scopes: none
+'''
+
+RESOLVECTL_JSON = [
+    {'ifname': 'eth0', 'ifindex': 2,
+     'currentServer': {'address': [10, 0, 0, 53], 'family': 2, 'port': 53, 'addressString': '10.0.0.53'},
+     'servers': [{'address': [10, 0, 0, 53], 'family': 2, 'port': 53},
+                 {'address': [253, 0] + [0] * 13 + [83], 'family': 10, 'port': 5353}],
+     'searchDomains': [{'name': 'cluster.example.net', 'routeOnly': False}]},
+    {'ifname': 'eth1.100', 'ifindex': 3, 'servers': [], 'searchDomains': []},
+]
+
+RESOLV_CONF = '''# Generated by NetworkManager
+search cluster.example.net example.net
+nameserver 10.0.0.53
+nameserver 10.0.0.54  # secondary
+; nameserver 10.0.0.55
+options edns0 trust-ad
+'''
+
+
+def completed(command, stdout, returncode=0):
+    return subprocess.CompletedProcess(command, returncode, stdout.encode(), b'')
+
+
+def test_resolvectl_json(netcheck, monkeypatch):
+    nc = netcheck()
+    monkeypatch.setattr(nc, 'run_command', lambda command: completed(command, json.dumps(RESOLVECTL_JSON)))
+
+    dns = nc.read_resolvectl_json('resolvectl --json')
+    assert dns['eth0'] == {'current-dns-server': '10.0.0.53', 'dns-servers': '10.0.0.53 [fd00::53]:5353',
+                           'dns-domain': 'cluster.example.net'}
+    assert dns['eth1.100'] == {'current-dns-server': '', 'dns-servers': '', 'dns-domain': ''}
+
+
+def test_resolvectl_json_unsupported(netcheck, monkeypatch):
+    nc = netcheck()
+    monkeypatch.setattr(nc, 'run_command', lambda command: completed(command, '', 1))
+
+    with pytest.raises(subprocess.SubprocessError):
+        nc.read_resolvectl_json('resolvectl --json')
+
+
+def test_resolvectl_text(netcheck, monkeypatch):
+    nc = netcheck()
+    monkeypatch.setattr(nc, 'run_command', lambda command: completed(command, RESOLVECTL))
+
+    dns = nc.read_resolvectl('resolvectl')
+    assert dns['Global']['resolv.conf-mode'] == 'stub'
+    assert dns['eth0']['current-dns-server'] == '10.0.0.53'
+    assert dns['eth0']['dns-servers'] == '10.0.0.53 10.0.0.54 fd00::53'
+    assert dns['eth0']['dns-domain'] == 'cluster.example.net example.net'
+    assert 'dns-servers' not in dns['eth1.100']
+
+
+def test_resolvectl_text_fields_before_device(netcheck, monkeypatch):
+    nc = netcheck('-j')
+    monkeypatch.setattr(nc, 'run_command', lambda command: completed(command, 'Fallback DNS Servers: 1.1.1.1\n' + RESOLVECTL))
+
+    dns = nc.read_resolvectl('resolvectl')
+    assert '' not in dns and 'fallback-dns-servers' not in dns['Global']
+    assert dns['eth0']['dns-servers'] == '10.0.0.53 10.0.0.54 fd00::53'
+
+    # The DNS section is built from the devices that follow (resolvectl --json output is not JSON here)
+    dns = nc.process_resolvectl()
+    assert dns['eth0']['current-dns-server'] == '10.0.0.53' and dns['eth0']['source'] == 'resolvectl'
+
+
+def test_resolv_conf(netcheck, tmp_path):
+    nc = netcheck()
+    path = tmp_path / 'resolv.conf'
+    path.write_text(RESOLV_CONF)
+
+    assert nc.read_resolv_conf(str(path)) == {'Global': {'current-dns-server': '10.0.0.53', 'dns-servers': '10.0.0.53 10.0.0.54',
+                                                         'dns-domain': 'cluster.example.net example.net'}}
+
+    path.write_text('options rotate\n')
+    assert nc.read_resolv_conf(str(path)) == {}
+
+
+def test_source_fallback(netcheck, monkeypatch):
+    """ Without resolvectl the resolv.conf written by systemd-resolved comes first, then /etc/resolv.conf """
+
+    nc = netcheck('-j')
+
+    def run_command(command):
+        raise FileNotFoundError(2, 'No such file or directory', command[0])
+
+    def read_config_file(path):
+        if path != '/etc/resolv.conf':
+            raise FileNotFoundError(2, 'No such file or directory', path)
+        return RESOLV_CONF
+    monkeypatch.setattr(nc, 'run_command', run_command)
+    monkeypatch.setattr(nc, 'read_config_file', read_config_file)
+
+    dns = nc.process_resolvectl()
+    assert dns['Global']['source'] == '/etc/resolv.conf'
+    assert dns['Global']['dns-servers'] == '10.0.0.53 10.0.0.54'
+
+
+@pytest.fixture(params=[socket.AF_INET, socket.AF_INET6], ids=['ipv4', 'ipv6'])
+def responder(request):
+    """ Answer queries by the first label of the name: nx* NXDOMAIN, sf* SERVFAIL, drop* never, anything else NOERROR """
+
+    family = request.param
+    try:
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1' if family == socket.AF_INET else '::1', 0))
+    except OSError as e:
+        pytest.skip(f'no loopback address: {e}')
+    queries = []
+    stop = threading.Event()
+
+    def serve():
+        sock.settimeout(0.05)
+        while not stop.is_set():
+            try:
+                (query, source) = sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            (index, labels) = (12, [])
+            while query[index]:
+                labels.append(query[index + 1:index + 1 + query[index]].decode())
+                index += 1 + query[index]
+            queries.append('.'.join(labels))
+            if labels[0].startswith('drop'):
+                continue
+            rcode = 3 if labels[0].startswith('nx') else 2 if labels[0].startswith('sf') else 0
+            sock.sendto(query[:2] + struct.pack('!HHHHH', 0x8180 | rcode, 1, 0, 0, 0) + query[12:], source)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    port = sock.getsockname()[1]
+    yield (f'127.0.0.1:{port}' if family == socket.AF_INET else f'[::1]:{port}', queries)
+    stop.set()
+    thread.join()
+    sock.close()
+
+
+def test_dns_test(netcheck, responder):
+    (server, queries) = responder
+    nc = netcheck('--dns-server', server, '--dns-names', 'www.example.net,nx.example.net,sf.example.net,drop.example.net',
+                  '--dns-count', '2', '--dns-timeout', '0.3', '-j')
+
+    dns = nc.process_resolvectl()
+    probe = dns['Requested']['probes'][server]
+
+    assert sorted(queries) == sorted(['www.example.net', 'nx.example.net', 'sf.example.net', 'drop.example.net'] * 2)
+    assert (probe['sent'], probe['received'], probe['timeouts']) == (8, 6, 2)
+    assert probe['rcodes'] == {'noerror': 2, 'nxdomain': 2, 'servfail': 2}
+    assert probe['loss'] == 25.0 and probe['p50'] < 300
+
+    assert nc.format_dns_probe(probe).endswith('timeouts 2/8, NXDOMAIN 2, SERVFAIL 2')
+
+
+def test_dns_test_unresolvable_server(netcheck):
+    nc = netcheck('--dns-server', 'dns.invalid', '--dns-count', '1', '--dns-timeout', '0.5', '-j')
+
+    probe = nc.process_resolvectl()['Requested']['probes']['dns.invalid']
+    assert probe['error'] and probe['sent'] == 0
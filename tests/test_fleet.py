@@ -0,0 +1,74 @@
+""" --fleet collection through a stub transport standing in for ssh, one behaviour per host name """
+
+import json
+import sys
+import textwrap
+
+import pytest
+
+# Prints the records of a netcheck --ndjson run for its host: 'down*' fails as ssh does when a host cannot be reached,
+# 'slow*' stops sending after its interfaces and 'old*' runs older firmware than the rest of the fleet
+TRANSPORT = textwrap.dedent('''
+    import json, sys, time
+
+    host = sys.argv[1]
+    if host.startswith('down'):
+        sys.stderr.write(f'ssh: connect to host {host} port 22: No route to host\\n')
+        sys.exit(255)
+
+    def record(record_type, data):
+        print(json.dumps({'type': record_type, 'run': host, 'data': data}), flush=True)
+
+    record('run', {'event': 'start'})
+    record('interface', {'ifname': 'eth0', 'driver': 'ice', 'firmware-version': '4.10' if host.startswith('old') else '4.20'})
+    if host.startswith('slow'):
+        time.sleep(30)
+    record('test', {'test': 'ping-gw', 'result': 'PASS'})
+    record('run', {'event': 'end'})
+''')
+
+
+@pytest.fixture
+def fleet(netcheck, tmp_path):
+    transport = tmp_path / 'transport.py'
+    transport.write_text(TRANSPORT)
+
+    def run(*argv):
+        nc = netcheck('--fleet', 'node1,node2,old1,slow1,down1', '--fleet-transport', f'{sys.executable} {transport} {{host}}',
+                      '--fleet-command', 'netcheck --ndjson -I -t', '--fleet-timeout', '1', *argv)
+        nc.fleet()
+        return nc
+
+    return run
+
+
+def test_host_status(fleet, capsys):
+    fleet('-j')
+    document = json.loads(capsys.readouterr().out)
+    hosts = document['hosts']
+
+    assert {host: result['status'] for (host, result) in hosts.items()} == \
+           {'node1': 'OK', 'node2': 'OK', 'old1': 'OK', 'slow1': 'TIMEOUT', 'down1': 'UNREACHABLE'}
+    assert hosts['down1']['error'] == 'ssh: connect to host down1 port 22: No route to host'
+    assert not hosts['down1']['records']
+
+    # Records sent before the timeout are kept
+    assert [record['type'] for record in hosts['slow1']['records']] == ['run', 'interface']
+    assert hosts['slow1']['seconds'] < 5
+
+    (difference,) = document['firmware-differences']
+    assert difference['host'] == 'old1' and difference['majority'] == '4.20' and difference['share'] == '3/4'
+    assert not document['failed-tests']
+
+
+def test_ndjson_records(fleet, capsys):
+    nc = fleet('--ndjson')
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    # Every record carries the ID of the fleet run and the host it came from
+    assert {record['run'] for record in records} == {nc.run_id}
+    assert [record['data']['host'] for record in records if record['type'] == 'host'] == \
+           ['node1', 'node2', 'old1', 'slow1', 'down1']
+    assert sorted(record['data']['host'] for record in records if record['type'] == 'interface') == \
+           ['node1', 'node2', 'old1', 'slow1']
+    assert [record['data']['host'] for record in records if record['type'] == 'firmware-difference'] == ['old1']
@@ -0,0 +1,66 @@
+""" Native ICMP engine probing the loopback address, and the latency summary it reports """
+
+import warnings
+
+import pytest
+
+
+@pytest.fixture
+def nc(netcheck):
+    nc = netcheck()
+    try:
+        nc.icmp_socket(nc.socket.AF_INET)[0].close()
+    except OSError:
+        pytest.skip('no ICMP socket: requires root or a net.ipv4.ping_group_range including this user')
+    return nc
+
+
+def test_loopback(nc):
+    summary = nc.icmp_probe(['127.0.0.1'], count=5, interval=0.02, timeout=0.5)['127.0.0.1']
+
+    assert summary['address'] == '127.0.0.1'
+    assert (summary['sent'], summary['received'], summary['loss']) == (5, 5, 0.0)
+    assert 0 <= summary['min'] <= summary['p50'] <= summary['p90'] <= summary['p99'] <= summary['max'] < 500
+    assert summary['min'] <= summary['avg'] <= summary['max']
+    assert 'error' not in summary
+
+
+def test_loopback_interleaved(nc):
+    results = nc.icmp_probe(['127.0.0.1', '127.0.0.2', 'nonexistent.invalid'], count=3, interval=0.02, timeout=0.5)
+
+    assert [results[target]['received'] for target in ['127.0.0.1', '127.0.0.2']] == [3, 3]
+    assert results['nonexistent.invalid']['sent'] == 0
+    assert results['nonexistent.invalid']['loss'] == 100.0
+    assert results['nonexistent.invalid']['error']
+
+
+def test_latency_summary_loss(nc):
+    summary = nc.latency_summary({'address': '192.0.2.1', 'rtts': [1.0, None, 3.0, 2.0, None, 10.0, None], 'sent': 6,
+                                  'error': ''})
+
+    # The probe not yet sent does not count as lost
+    assert (summary['sent'], summary['received'], summary['loss']) == (6, 4, 33.3)
+    assert (summary['p50'], summary['p90'], summary['p99']) == (2.0, 10.0, 10.0)
+    assert (summary['min'], summary['avg'], summary['max']) == (1.0, 4.0, 10.0)
+    assert summary['jitter'] == 3.667
+
+
+def test_parse_ping_rtt(netcheck):
+    nc = netcheck()
+
+    output = ('PING 10.0.0.1 (10.0.0.1) 56(84) bytes of data.\n\n--- 10.0.0.1 ping statistics ---\n'
+              '3 packets transmitted, 3 received, 0% packet loss, time 2003ms\nrtt min/avg/max/mdev = 0.211/0.305/0.447/0.102 ms\n')
+    assert nc.parse_ping_rtt(output) == '0.305 ms'
+    assert nc.parse_ping_rtt('ping: connect: Network is unreachable\n') == 'unknown'
+
+
+def test_source_compiles_without_warnings(netcheck):
+    """ Invalid escape sequences (regular expressions outside raw strings) warn, and fail on later Pythons """
+
+    nc = netcheck()
+    with open(nc.__file__) as f:
+        source = f.read()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        compile(source, nc.__file__, 'exec')
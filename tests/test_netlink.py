@@ -0,0 +1,111 @@
+""" netlink backend (--ip-backend netlink) decoding a recorded dump, against iproute2 output taken at the same time
+
+    fixtures/netlink.json was recorded with --netlink-record in a namespace holding a veth pair (one end enslaved to
+    a bridge), a tap and an altname, next to 'ip -detail -json address show' and 'ip -detail -json route' from the
+    same namespace.
+"""
+
+import json
+import os
+import socket
+import struct
+
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def nc(netcheck):
+    return netcheck('--ip-backend', 'netlink', '--netlink-fixture', os.path.join(FIXTURES, 'netlink.json'))
+
+
+def test_interfaces_match_iproute2(nc):
+    reference = load('netlink-ip-address.json')
+    interfaces = nc.netlink_interfaces()
+
+    assert [entry['ifname'] for entry in interfaces] == [entry['ifname'] for entry in reference]
+    for (entry, expected) in zip(interfaces, reference):
+        # Only the VLAN and tun/tap kind data is decoded, bridge and slave details are left to iproute2
+        linkinfo = expected.get('linkinfo')
+        if linkinfo:
+            linkinfo.pop('info_slave_data', None)
+            if linkinfo['info_kind'] not in ['vlan', 'tun']:
+                linkinfo.pop('info_data', None)
+        assert entry == expected, entry['ifname']
+
+
+def test_routes_match_iproute2(nc):
+    assert list(nc.netlink_routes()) == load('netlink-ip-route.json')
+
+
+def test_decoded_dump(nc):
+    interfaces = {entry['ifname']: entry for entry in nc.netlink_interfaces()}
+
+    # RTM_NEWLINK
+    assert interfaces['veth0']['link'] == 'veth1'
+    assert interfaces['veth0']['altnames'] == ['uplink0']
+    assert interfaces['veth1']['master'] == 'br0'
+    assert interfaces['veth1']['linkinfo'] == {'info_kind': 'veth', 'info_slave_kind': 'bridge'}
+    assert interfaces['tap0']['linkinfo']['info_data']['type'] == 'tap'
+    assert interfaces['tap0']['flags'] == ['BROADCAST', 'MULTICAST']
+    assert interfaces['lo']['num_tx_queues'] == 1
+
+    # RTM_NEWADDR
+    assert [(a['family'], a['local'], a['prefixlen']) for a in interfaces['br0']['addr_info'] if a['family'] == 'inet'] == \
+           [('inet', '203.0.113.5', 25)]
+    assert {a['family'] for a in interfaces['veth0']['addr_info']} == {'inet', 'inet6'}
+
+    # RTM_NEWROUTE
+    routes = {route['dst']: route for route in nc.netlink_routes()}
+    assert routes['default']['gateway'] == '198.51.100.1' and routes['default']['metric'] == 100
+    assert routes['10.0.0.0/8']['dev'] == 'br0'
+    assert routes['192.0.2.0/24']['type'] == 'blackhole'
+    assert routes['198.51.100.0/24']['prefsrc'] == '198.51.100.10'
+
+
+def test_detail_attributes(nc, monkeypatch):
+    """ Attributes a namespace cannot produce (parent bus of a physical port) on a hand-built RTM_NEWLINK """
+
+    def attribute(kind, payload):
+        data = struct.pack('=HH', 4 + len(payload), kind) + payload
+        return data + b'\0' * (-len(data) % 4)
+
+    body = struct.pack('=BxHiII', socket.AF_UNSPEC, 1, 2, 0x1043, 0)
+    body += attribute(nc.IFLA_IFNAME, b'eth0\0') + attribute(nc.IFLA_MTU, struct.pack('=I', 9000))
+    body += attribute(nc.IFLA_NUM_TX_QUEUES, struct.pack('=I', 64)) + attribute(nc.IFLA_GSO_MAX_SIZE, struct.pack('=I', 65536))
+    body += attribute(nc.IFLA_PARENT_DEV_BUS_NAME, b'pci\0') + attribute(nc.IFLA_PARENT_DEV_NAME, b'0000:3b:00.0\0')
+    message = struct.pack('=IHHII', 16 + len(body), nc.RTM_NEWLINK, 0, 1, 0) + body
+
+    monkeypatch.setattr(nc, 'netlink_snapshot', {'link': message, 'addr': b'', 'route': b''})
+    (entry,) = nc.netlink_interfaces()
+
+    assert entry['ifname'] == 'eth0' and entry['mtu'] == 9000
+    assert entry['num_tx_queues'] == 64 and entry['gso_max_size'] == 65536
+    assert (entry['parentbus'], entry['parentdev']) == ('pci', '0000:3b:00.0')
+    assert 'num_rx_queues' not in entry
+
+
+def test_ipv6_routes_listed_with_all_tables(nc, monkeypatch):
+    """ A hand-built IPv6 default route: decoded with its preference, and like ip only listed with --table all """
+
+    def attribute(kind, payload):
+        data = struct.pack('=HH', 4 + len(payload), kind) + payload
+        return data + b'\0' * (-len(data) % 4)
+
+    body = struct.pack('=BBBBBBBBI', socket.AF_INET6, 0, 0, 0, nc.RT_TABLE_MAIN, 4, 0, 1, 0)
+    body += attribute(nc.RTA_TABLE, struct.pack('=I', nc.RT_TABLE_MAIN)) + attribute(nc.RTA_PRIORITY, struct.pack('=I', 1024))
+    body += attribute(nc.RTA_GATEWAY, socket.inet_pton(socket.AF_INET6, 'fd00::1')) + attribute(nc.RTA_PREF, b'\0')
+    message = struct.pack('=IHHII', 16 + len(body), nc.RTM_NEWROUTE, 0, 1, 0) + body
+
+    monkeypatch.setattr(nc, 'netlink_snapshot', dict(nc.get_netlink_snapshot(), route=message))
+
+    assert not list(nc.netlink_routes())
+    (route,) = nc.netlink_routes(None)
+    assert route == {'type': 'unicast', 'dst': 'default', 'gateway': 'fd00::1', 'protocol': 'static', 'scope': 'global',
+                     'metric': 1024, 'flags': [], 'pref': 'medium'}
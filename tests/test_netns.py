@@ -0,0 +1,134 @@
+""" Collection of every network namespace (--all-netns) by forked workers entering each namespace with setns
+
+    setns is stubbed with a fake libc that only records the namespace a worker entered, and the collection
+    functions answer for that namespace. Workers are still forked for real (a worker exits once its result is
+    written), the fork is only wrapped to count them.
+"""
+
+import ctypes
+import errno
+import json
+import os
+
+import pytest
+
+# Interfaces and routes of each fake namespace, 'gone' is removed before its worker enters it
+NAMESPACES = {
+    'default': {'interfaces': [('ens1f0', 2, None), ('ens1f0.100', 3, 'ens1f0')],
+                'routes': [{'dst': 'default', 'gateway': '10.0.0.1', 'dev': 'ens1f0', 'protocol': 'dhcp', 'metric': 100}]},
+    'blue':    {'interfaces': [('veth0', 2, None)],
+                'routes': [{'dst': '10.1.0.0/24', 'dev': 'veth0', 'protocol': 'kernel'}]},
+    'red':     {'interfaces': [('veth1', 2, None), ('veth1.7', 4, 'veth1'), ('veth1.8', 5, 'veth1')],
+                'routes': []},
+    'gone':    {'interfaces': [], 'routes': []},
+}
+
+entered = None      # Namespace entered by this (worker) process
+
+
+class FakeLibc:
+    """ setns enters the namespace named by the file behind fd, unshare fails so workers fall back to ethtool """
+
+    def setns(self, fd, nstype):
+        global entered
+        name = os.path.basename(os.readlink(f'/proc/self/fd/{fd}'))
+        if name == 'gone':
+            ctypes.set_errno(errno.EINVAL)
+            return -1
+        entered = name
+        return 0
+
+    def unshare(self, flags):
+        ctypes.set_errno(errno.EPERM)
+        return -1
+
+
+def interfaces():
+    # As netlink_interfaces decodes them: only VLANs have a link and VLAN kind data
+    return [{'ifindex': ifindex, 'ifname': ifname, 'operstate': 'UP', 'address': f'02:00:00:00:00:0{ifindex}', 'addr_info': [],
+             **({'link': link, 'linkinfo': {'info_kind': 'vlan', 'info_data': {'id': int(ifname.split('.')[1])}}} if link else {})}
+            for (ifname, ifindex, link) in NAMESPACES[entered]['interfaces']]
+
+
+@pytest.fixture
+def workers(netcheck, tmp_path, monkeypatch):
+    """ Stub namespaces, setns and collection, returning the fork statistics (forks, peak concurrent workers) """
+
+    directory = tmp_path / 'netns'
+    directory.mkdir()
+    for name in NAMESPACES:
+        (directory / name).touch()
+
+    nc = netcheck()
+    monkeypatch.setattr(nc, 'list_namespaces', lambda: [(name, str(directory / name)) for name in NAMESPACES])
+    monkeypatch.setattr(nc.ctypes, 'CDLL', lambda *args, **kwargs: FakeLibc())
+    monkeypatch.setattr(nc, 'netlink_interfaces', interfaces)
+    monkeypatch.setattr(nc, 'read_routes', lambda: iter([dict(route) for route in NAMESPACES[entered]['routes']]))
+
+    # ethtool and lspci are missing everywhere, which every worker warns about
+    def missing(command, timeout=None):
+        raise FileNotFoundError(command[0])
+    monkeypatch.setattr(nc, 'run_command', missing)
+
+    # Workers are counted as they are forked and reaped
+    statistics = {'forks': 0, 'running': 0, 'peak': 0}
+    (fork, waitpid) = (os.fork, os.waitpid)
+
+    def counted_fork():
+        pid = fork()
+        if pid:
+            statistics['forks'] += 1
+            statistics['running'] += 1
+            statistics['peak'] = max(statistics['peak'], statistics['running'])
+        return pid
+
+    def counted_waitpid(pid, options):
+        statistics['running'] -= 1
+        return waitpid(pid, options)
+    monkeypatch.setattr(nc.os, 'fork', counted_fork)
+    monkeypatch.setattr(nc.os, 'waitpid', counted_waitpid)
+
+    return statistics
+
+
+@pytest.mark.parametrize('jobs', ['1', '2', '8'])
+def test_merge_json(netcheck, workers, capsys, jobs):
+    """ Each namespace is collected by its own worker, at most --netns-jobs at a time, and merged in listing order """
+
+    nc = netcheck('--all-netns', '--netns-jobs', jobs, '-j')
+    nc.all_netns()
+    output = capsys.readouterr().out
+    namespaces = json.loads(output[output.index('{'):])['namespaces']
+
+    assert workers == {'forks': len(NAMESPACES), 'running': 0, 'peak': min(int(jobs), len(NAMESPACES))}
+    assert list(namespaces) == list(NAMESPACES)
+    for (name, expected) in NAMESPACES.items():
+        assert [entry['ifname'] for entry in namespaces[name]['interfaces']] == [ifname for (ifname, _, _) in expected['interfaces']]
+        assert [route['dst'] for route in namespaces[name]['routes']] == [route['dst'] for route in expected['routes']]
+
+    # The namespace that could not be entered reports why, the others collected without error
+    assert namespaces['gone']['error'] == f"[Errno {errno.EINVAL}] setns {namespaces['gone']['path']}: {os.strerror(errno.EINVAL)}"
+    assert [name for name in namespaces if namespaces[name]['error']] == ['gone']
+
+    # The missing ethtool warning of every worker is shown once
+    assert output.count("Dependency 'ethtool' not found") == 1
+
+
+def test_merge_tables(netcheck, workers, capsys):
+    """ Tables hold the records of every namespace, tagged with the namespace they were collected in """
+
+    nc = netcheck('--all-netns', '--barebones')
+    nc.all_netns()
+    output = capsys.readouterr().out
+
+    def rows(title):
+        lines = output[output.index(f'### {title}'):].splitlines()[2:]
+        return [[cell.strip() for cell in line.split('|')[:-1]] for line in lines[:lines.index('') if '' in lines else None]]
+
+    assert [row[0] for row in rows('Network Namespaces')] == list(NAMESPACES)
+    assert [row[2:5] for row in rows('Network Namespaces')] == [['1', '1', '1'], ['1', '0', '1'], ['1', '2', '0'], ['0', '0', '0']]
+    assert [(row[0], row[2]) for row in rows('Physical Interfaces')] == [('default', 'ens1f0'), ('blue', 'veth0'), ('red', 'veth1')]
+    assert [(row[0], row[2], row[4]) for row in rows('VLAN Interfaces')] == \
+        [('default', 'ens1f0.100', '100'), ('red', 'veth1.7', '7'), ('red', 'veth1.8', '8')]
+    assert [(row[0], row[1]) for row in rows('Route Table')] == [('default', 'default'), ('blue', '10.1.0.0/24')]
+    assert output.count("Dependency 'ethtool' not found") == 1
@@ -0,0 +1,163 @@
+""" A run prints a single JSON document (-j) or one record per line (--ndjson), whatever the selected tables and tests """
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+@pytest.fixture
+def passing_tests(monkeypatch):
+    """ Replace the connectivity tests with ones passing immediately """
+
+    def stub(result, deadline, *posargs):
+        result['result'] = 'PASS'
+
+    def configure(nc):
+        for name in ['test_ping_gateway', 'test_ping_internet', 'test_webpage', 'test_throughput']:
+            monkeypatch.setattr(nc, name, stub)
+        return nc
+
+    return configure
+
+
+def report(netcheck, passing_tests, *argv):
+    nc = passing_tests(netcheck('--ip-backend', 'netlink', '--netlink-fixture', os.path.join(FIXTURES, 'netlink.json'),
+                                '-R', '-t', *argv))
+    nc.report()
+
+
+def test_json_single_document(netcheck, passing_tests, capsys):
+    report(netcheck, passing_tests, '-j')
+    output = capsys.readouterr().out
+
+    document = json.loads(output)
+    assert [route['dst'] for route in document['routes']][:2] == ['default', '10.0.0.0/8']
+    assert [test['test'] for test in document['tests']] == ['ping-gw', 'ping-internet', 'ping-internet-with-dns',
+                                                            'webpage-load', 'downlink-throughput']
+    assert all(test['result'] == 'PASS' for test in document['tests'])
+
+
+def test_ndjson_records(netcheck, passing_tests, capsys):
+    report(netcheck, passing_tests, '--ndjson')
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert records[0]['type'] == 'run' and records[0]['data']['event'] == 'start'
+    assert records[-1]['type'] == 'run' and records[-1]['data']['event'] == 'end'
+    assert sum(record['type'] == 'route' for record in records) == 5
+    assert sorted(record['data']['test'] for record in records if record['type'] == 'test') == \
+           sorted(['ping-gw', 'ping-internet', 'ping-internet-with-dns', 'webpage-load', 'downlink-throughput'])
+    assert len({record['run'] for record in records}) == 1
+
+
+@pytest.mark.parametrize('option', ['-j', '--ndjson'])
+def test_brief(tmp_path, monkeypatch, capsys, option):
+    import netcheck as nc
+    monkeypatch.setattr(sys, 'stdout', sys.stdout)
+    monkeypatch.setattr(sys, 'argv', ['netcheck', '--config', os.devnull, '--cache-dir', str(tmp_path), '--brief', option])
+
+    with pytest.raises(SystemExit):
+        nc.main()
+    (line,) = capsys.readouterr().out.splitlines()
+
+    data = json.loads(line)['data'] if option == '--ndjson' else json.loads(line)
+    assert 'links UP' in data['summary'] and isinstance(data['problems'], int)
+
+
+def test_brief_script(tmp_path):
+    """ Shells run netcheck_brief.py directly, it prints the line of netcheck --brief without loading netcheck """
+
+    tools = os.path.join(os.path.dirname(FIXTURES), '..', 'files', 'tools')
+    env = dict(os.environ, HOME=str(tmp_path))
+    script = subprocess.run([sys.executable, '-I', '-c', 'import runpy, sys; sys.argv = ["netcheck_brief.py"]; '
+                             f'runpy.run_path({os.path.join(tools, "netcheck_brief.py")!r}, run_name="__main__")'],
+                            capture_output=True, text=True, env=env)
+    brief = subprocess.run([sys.executable, '-I', os.path.join(tools, 'netcheck.py'), '--config', os.devnull, '--brief'],
+                           capture_output=True, text=True, env=env)
+
+    assert script.stdout == brief.stdout and 'links UP' in script.stdout
+    assert script.returncode == brief.returncode
+
+
+def test_brief_modules(tmp_path):
+    tools = os.path.join(os.path.dirname(FIXTURES), '..', 'files', 'tools')
+    loaded = subprocess.run([sys.executable, '-I', '-c', 'import atexit, runpy, sys; '
+                             'atexit.register(lambda: print(" ".join(sys.modules), file=sys.stderr)); '
+                             f'runpy.run_path({os.path.join(tools, "netcheck_brief.py")!r}, run_name="__main__")'],
+                            capture_output=True, text=True, env=dict(os.environ, HOME=str(tmp_path))).stderr.split()
+
+    # Nothing beyond the interpreter startup modules (and json, with cached test results)
+    assert not {'argparse', 'socket', 'subprocess', 'ssl', 'http', 'urllib', 'netcheck'} & set(loaded)
+
+
+def test_brief_without_sysfs(monkeypatch, capsys):
+    import netcheck_brief
+    listdir = os.listdir
+
+    def without_sysfs(path):
+        if path == '/sys/class/net':
+            raise FileNotFoundError(2, 'No such file or directory', path)
+        return listdir(path)
+    monkeypatch.setattr(netcheck_brief.os, 'listdir', without_sysfs)
+
+    # A prompt shows nothing rather than a traceback
+    with pytest.raises(SystemExit) as exit:
+        netcheck_brief.main()
+    assert capsys.readouterr().out == '' and exit.value.code == 0
+
+
+def test_serve_rejects_ndjson(netcheck, capsys):
+    with pytest.raises(SystemExit):
+        netcheck('--serve', '0', '--ndjson')
+    assert 'not allowed with argument --serve' in capsys.readouterr().err
+
+
+def test_mesh_matrix_ndjson(netcheck, tmp_path, capsys):
+    rows = {'node1': {'node1': {'address': '10.0.0.1', 'sent': 5, 'received': 5, 'loss': 0.0, 'p50': 0.1},
+                      'node2': {'address': '10.0.0.2', 'sent': 5, 'received': 5, 'loss': 0.0, 'p50': 0.2}},
+            'node2': {'node1': {'address': '10.0.0.1', 'sent': 5, 'received': 5, 'loss': 0.0, 'p50': 9.5},
+                      'node2': {'address': '10.0.0.2', 'sent': 5, 'received': 0, 'loss': 100.0}}}
+    paths = []
+    for (node, peers) in rows.items():
+        paths.append(tmp_path / f'{node}.json')
+        paths[-1].write_text(json.dumps({'node': node, 'peers': peers}))
+
+    nc = netcheck('--mesh-matrix', *map(str, paths), '--ndjson')
+    nc.mesh_matrix()
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    # One --mesh record per node and peer, no table
+    assert {record['type'] for record in records} == {'mesh'}
+    assert [(record['data']['node'], record['data']['peer'], record['data']['outlier']) for record in records] == \
+           [('node1', 'node1', False), ('node1', 'node2', False), ('node2', 'node1', True), ('node2', 'node2', True)]
+
+
+GOLDEN_TABLE = [['ID', 'INTERFACE', 'STATE', 'ADDRESSES', 'SPEED', 'NOTE'],
+                [2, 'ens1f0', 'UP', '10.0.0.1/24\nfd00::1/64', '25000Mb/s', ''],
+                [3, 'ens1f1', 'DOWN', '', 'Unknown!', 'firmware 4.40 !'],
+                [4, 'ens1f1.100', 'LOWERLAYERDOWN', '10.1.0.1/24', '', 'loss 20% !'],
+                [1000, 'lo', 'UNKNOWN', '127.0.0.1/8\n::1/128\n', None, 'multi\nline !']]
+
+
+@pytest.mark.parametrize('option', [[], ['--barebones']], ids=['fancy', 'barebones'])
+def test_print_table_golden(netcheck, capsys, option):
+    """ Tables render byte for byte as the original per-cell renderer did (fixtures written by it) """
+
+    nc = netcheck(*option)
+    with open(os.path.join(FIXTURES, 'print_table-barebones.txt' if option else 'print_table.txt')) as f:
+        golden = f.read()
+
+    nc.print_table(nc.args, 'Golden Table', GOLDEN_TABLE)
+    assert capsys.readouterr().out == golden
+
+
+def test_print_table_outliers(netcheck, capsys):
+    nc = netcheck()
+
+    nc.print_table(nc.args, 'Golden Table', GOLDEN_TABLE, outliers=True)
+    output = capsys.readouterr().out
+    assert '\033[31m' + 'loss 20% !'.rjust(16) in output and '\033[31m' + 'Unknown!'.rjust(10) not in output
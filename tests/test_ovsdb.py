@@ -0,0 +1,129 @@
+""" OVSDB JSON-RPC reader against a fake server on a unix socket """
+
+import copy
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+# Two bridges: br-int with an access port (tag 10) and a trunk, br-ex with a single internal port
+TABLES = {
+    'Bridge': [
+        {'_uuid': ['uuid', 'b1'], 'name': 'br-int', 'ports': ['set', [['uuid', 'p1'], ['uuid', 'p2']]]},
+        {'_uuid': ['uuid', 'b2'], 'name': 'br-ex', 'ports': ['uuid', 'p3']}
+    ],
+    'Port': [
+        {'_uuid': ['uuid', 'p1'], 'name': 'vm1', 'tag': 10, 'trunks': ['set', []], 'interfaces': ['uuid', 'i1']},
+        {'_uuid': ['uuid', 'p2'], 'name': 'bond0', 'tag': ['set', []], 'trunks': ['set', [20, 30]],
+         'interfaces': ['set', [['uuid', 'i2'], ['uuid', 'i3']]]},
+        {'_uuid': ['uuid', 'p3'], 'name': 'br-ex', 'tag': ['set', []], 'trunks': ['set', []], 'interfaces': ['uuid', 'i4']}
+    ],
+    'Interface': [
+        {'_uuid': ['uuid', 'i1'], 'name': 'vm1', 'type': '', 'ofport': 1},
+        {'_uuid': ['uuid', 'i2'], 'name': 'eth1', 'type': '', 'ofport': 2},
+        {'_uuid': ['uuid', 'i3'], 'name': 'eth2', 'type': '', 'ofport': 3},
+        {'_uuid': ['uuid', 'i4'], 'name': 'br-ex', 'type': 'internal', 'ofport': 65534}
+    ]
+}
+
+
+class FakeOVSDB:
+    """ Answers one transact per connection, sending the reply in chunks of chunk bytes """
+
+    def __init__(self, path, chunk=None, reply=None, tables=TABLES):
+        self.requests = []
+        self.tables = tables
+        self.chunk = chunk
+        self.reply = reply
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                (connection, _) = self.server.accept()
+            except OSError:
+                return
+            with connection:
+                request = json.loads(connection.recv(1 << 16))
+                self.requests.append(request)
+                reply = self.reply(request) if self.reply else self.transact(request)
+                for offset in range(0, len(reply), self.chunk or len(reply)):
+                    connection.sendall(reply[offset:offset + (self.chunk or len(reply))])
+                    time.sleep(0.005)
+
+    def transact(self, request):
+        results = []
+        for operation in request['params'][1:]:
+            rows = [{column: row[column] for column in operation['columns']} for row in self.tables[operation['table']]]
+            results.append({'rows': rows})
+        return json.dumps({'id': request['id'], 'result': results, 'error': None}, ensure_ascii=False).encode()
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def ovsdb(tmp_path):
+    servers = []
+
+    def start(**kwargs):
+        servers.append(FakeOVSDB(str(tmp_path / 'db.sock'), **kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_read_openvswitch(netcheck, ovsdb, tmp_path):
+    server = ovsdb()
+    nc = netcheck('--ovsdb-socket', str(tmp_path / 'db.sock'))
+
+    (openvswitch, bridge_lookup) = nc.read_openvswitch()
+
+    # A single transact selects all three tables
+    assert len(server.requests) == 1
+    assert server.requests[0]['method'] == 'transact'
+    assert [operation['table'] for operation in server.requests[0]['params'][1:]] == ['Bridge', 'Port', 'Interface']
+
+    assert openvswitch['bridges'] == {
+        'br-int': {'ports': {'vm1': {'interfaces': ['vm1'], 'tag': '10'},
+                             'bond0': {'interfaces': ['eth1', 'eth2'], 'trunks': ['20', '30']}}},
+        'br-ex':  {'ports': {'br-ex': {'interfaces': ['br-ex'], 'type': 'internal'}}}
+    }
+    assert bridge_lookup == {'vm1': 'br-int', 'bond0': 'br-int', 'br-ex': 'br-ex'}
+
+
+def test_reply_split_across_reads(netcheck, ovsdb, tmp_path):
+    # Non-ASCII names put some of the splits inside a multi-byte character
+    tables = copy.deepcopy(TABLES)
+    tables['Interface'][0]['name'] = 'vm1-ü'
+    ovsdb(chunk=7, tables=tables)
+    nc = netcheck()
+
+    tables = nc.read_ovsdb_socket(str(tmp_path / 'db.sock'), {'Interface': ['name', 'ofport']})
+
+    assert tables == {'Interface': [{'name': 'vm1-ü', 'ofport': 1}, {'name': 'eth1', 'ofport': 2},
+                                    {'name': 'eth2', 'ofport': 3}, {'name': 'br-ex', 'ofport': 65534}]}
+
+
+def test_connection_closed_before_reply(netcheck, ovsdb, tmp_path):
+    ovsdb(chunk=5, reply=lambda request: b'{"id": 0, "res')
+    nc = netcheck()
+
+    with pytest.raises(ConnectionError):
+        nc.read_ovsdb_socket(str(tmp_path / 'db.sock'), {'Bridge': ['name']})
+
+
+def test_transact_error(netcheck, ovsdb, tmp_path):
+    ovsdb(reply=lambda request: json.dumps({'id': 0, 'result': [{'error': 'unknown column', 'details': 'foo'}]}).encode())
+    nc = netcheck()
+
+    with pytest.raises(RuntimeError, match='unknown column'):
+        nc.read_ovsdb_socket(str(tmp_path / 'db.sock'), {'Bridge': ['foo']})
@@ -0,0 +1,191 @@
+""" Collection replayed from a synthetic host fixture: worker pool ordering, watch refreshes, timings and rates """
+
+import json
+import os
+import socket
+import struct
+import time
+
+import pytest
+
+
+@pytest.mark.parametrize('option', [[], ['-j']], ids=['tables', 'json'])
+def test_jobs_same_output(netcheck, replay, monkeypatch, capsys, option):
+    """ Interfaces finishing out of order (slow ethtool on the first ones) are reported in ip addr show order """
+
+    outputs = {}
+    nc = netcheck()
+    (replay_command, process_interface) = (nc.replay_command, nc.process_interface)
+    for jobs in ['1', '8']:
+        nc = netcheck(*replay, '--jobs', jobs, '-I', '-V', '-P', '-R', *option)
+        finished = []
+
+        def slow_replay(command):
+            if command[0] == 'ethtool' and command[-1] in ['ens0f0', 'ens1f1']:
+                time.sleep(0.05)
+            return replay_command(command)
+
+        def record_order(entry):
+            record = process_interface(entry)
+            finished.append(entry['ifname'])
+            return record
+        monkeypatch.setattr(nc, 'replay_command', slow_replay)
+        monkeypatch.setattr(nc, 'process_interface', record_order)
+
+        nc.report()
+        outputs[jobs] = capsys.readouterr().out
+
+        # Serial collection finishes in order, the pool does not
+        assert (finished[:2] == ['ens0f0', 'ens1f1']) == (jobs == '1')
+
+    assert outputs['1'] == outputs['8']
+
+
+def test_watch_refreshes_changed_interfaces(netcheck, replay, monkeypatch, capsys):
+    """ A refresh probes only the interfaces with change notifications, the others come from the last collection """
+
+    nc = netcheck(*replay, '-I', '-V', '-j', '--watch', '5')
+    replay_command = nc.replay_command
+    refreshes = [[]]    # Interfaces probed with ethtool in each refresh
+
+    def count_probes(command):
+        if command[0] == 'ethtool':
+            refreshes[-1].append(command[-1])
+        return replay_command(command)
+
+    # ens1f1 (ifindex 3) changes after the first collection, the next wait ends the watch
+    def changes(events, changed):
+        if len(refreshes) == 2:
+            raise KeyboardInterrupt
+        refreshes.append([])
+        changed.add(3)
+        return '1 interface change(s)'
+    monkeypatch.setattr(nc, 'replay_command', count_probes)
+    monkeypatch.setattr(nc, 'wait_for_changes', changes)
+
+    nc.watch()
+    (first, second) = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{')]
+
+    assert sorted(set(refreshes[0])) == sorted(entry['ifname'] for entry in first['interfaces'])
+    assert refreshes[1] == ['ens1f1', 'ens1f1']
+    assert second['interfaces'] == first['interfaces']
+
+
+def netlink_message(kind, body):
+    return struct.pack('=IHHII', 16 + len(body), kind, 0, 0, 0) + body
+
+
+def test_wait_for_changes(netcheck):
+    nc = netcheck('--watch', '0.2')
+    nc.watch_cache = {3: 'ens1f1', 4: 'ens2f0'}
+    (events, sender) = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    # A burst: link 3 changes, link 4 is deleted, an address is added to link 5
+    sender.send(netlink_message(nc.RTM_NEWLINK, struct.pack('=BxHiII', 0, 1, 3, 0, 0)) +
+                netlink_message(nc.RTM_DELLINK, struct.pack('=BxHiII', 0, 1, 4, 0, 0)))
+    sender.send(netlink_message(nc.RTM_NEWADDR, struct.pack('=BBBBI', socket.AF_INET, 24, 0, 0, 5)))
+    changed = set()
+    assert nc.wait_for_changes(events, changed) == '3 interface change(s)'
+    assert changed == {3, 4, 5} and nc.watch_cache == {3: 'ens1f1'}
+
+    # Route changes alone refresh every table but probe nothing, no notification at all waits out the interval
+    sender.send(netlink_message(nc.RTM_NEWROUTE, bytes(12)))
+    changed = set()
+    assert nc.wait_for_changes(events, changed) == 'route change' and changed == set()
+    assert nc.wait_for_changes(events, changed) == 'interval'
+
+    events.close()
+    sender.close()
+
+
+def test_timings(netcheck, replay, capsys, tmp_path):
+    """ --timings counts each stage and command once per call, --timings-trace writes the same events as Chrome trace events """
+
+    trace = tmp_path / 'trace.json'
+    nc = netcheck(*replay, '-I', '-V', '-j', '--timings-trace', str(trace))
+    nc.report()
+    document = json.loads(capsys.readouterr().out)
+
+    calls = {(entry['category'], entry['name']): entry['calls'] for entry in document['timings']['summary']}
+    assert calls == {('stage', 'process_ip_addr'): 1, ('stage', 'process_interface'): len(document['interfaces']),
+                     ('command', 'ip'): 1, ('command', 'lspci'): 1, ('command', 'ethtool'): 2 * len(document['interfaces'])}
+
+    # Stages come before commands, every event lies within the run
+    assert [entry['category'] for entry in document['timings']['summary']][:2] == ['stage', 'stage']
+    events = document['timings']['events']
+    assert sum(calls.values()) == len(events)
+    assert all(0 <= event['start'] and event['start'] + event['duration'] <= document['timings']['total'] for event in events)
+
+    with open(trace) as f:
+        written = json.load(f)
+    assert [event['ph'] for event in written['traceEvents']] == ['X'] * len(events)
+    assert [(event['cat'], event['name']) for event in written['traceEvents']] == [(event['category'], event['name']) for event in events]
+    assert [event['args'].get('detail', '') for event in written['traceEvents']] == [event['detail'] for event in events]
+
+    # In table mode the rendering of the interface table is timed as well, the wall time comes last
+    nc = netcheck(*replay, '-I', '-V', '--timings', '--barebones')
+    nc.report()
+    output = capsys.readouterr().out
+    rows = [line.split('|') for line in output[output.index('### Timings ###'):].splitlines()[2:] if line]
+    assert sorted((row[1].strip(), row[0].strip()) for row in rows[:-1]) == sorted(set(calls) | {('stage', 'print_table')})
+    assert rows[-1][0].strip() == 'total (wall)'
+
+
+COUNTERS = ['rx_bytes', 'rx_packets', 'rx_errors', 'rx_dropped', 'tx_bytes', 'tx_packets', 'tx_errors', 'tx_dropped']
+
+
+def write_counters(sysfs_root, ifname, values):
+    directory = os.path.join(sysfs_root, 'class', 'net', ifname, 'statistics')
+    os.makedirs(directory, exist_ok=True)
+    for (name, value) in zip(COUNTERS, values):
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(f'{value}\n')
+
+
+def test_compute_rates(netcheck):
+    """ Per second rates from two samples, skipping reset counters and reporting only ethtool counters that moved """
+
+    nc = netcheck()
+    first = (10.0, {'ens1f1': dict(zip(COUNTERS, [1000, 10, 0, 0, 500, 5, 0, 0])),
+                    'ens2f0': dict(zip(COUNTERS, [9000, 90, 0, 0, 0, 0, 0, 0]))},
+             {'ens1f1': {'rx_queue_0_packets': 4, 'rx_queue_1_packets': 6, 'tx_queue_0_packets': 5}})
+    second = (12.0, {'ens1f1': dict(zip(COUNTERS, [3000, 30, 2, 4, 900, 9, 0, 1])),
+                     'ens2f0': dict(zip(COUNTERS, [100, 1, 0, 0, 0, 0, 0, 0])),
+                     'ens3f1': dict(zip(COUNTERS, [100, 1, 0, 0, 0, 0, 0, 0]))},
+              {'ens1f1': {'rx_queue_0_packets': 14, 'rx_queue_1_packets': 6, 'tx_queue_0_packets': 9}})
+
+    # ens2f0 was reset between the samples and ens3f1 appeared after the first
+    assert nc.compute_rates(first, second) == {'ens1f1': {
+        'interval': 2.0, 'rx-bps': 8000.0, 'tx-bps': 1600.0, 'rx-pps': 10.0, 'tx-pps': 2.0,
+        'rx-drops-ps': 2.0, 'tx-drops-ps': 0.5, 'rx-errors-ps': 1.0, 'tx-errors-ps': 0.0,
+        'ethtool': {'rx_queue_0_packets': 5.0, 'tx_queue_0_packets': 2.0}}}
+
+
+def test_rates(netcheck, replay, monkeypatch, capsys):
+    """ --rates samples the sysfs counters of the fixture before and after the interval and reports the difference """
+
+    sysfs_root = replay[replay.index('--sysfs-root') + 1]
+    write_counters(sysfs_root, 'ens1f1', [1000, 10, 0, 0, 500, 5, 0, 0])
+    write_counters(sysfs_root, 'ens2f0', [9000, 90, 0, 0, 0, 0, 0, 0])
+    nc = netcheck(*replay, '-I', '-V', '-j', '--rates', '0.2')
+
+    # Traffic arrives during the interval, ens2f0 counters are reset
+    sleep = time.sleep
+
+    def traffic(seconds):
+        write_counters(sysfs_root, 'ens1f1', [26000, 210, 0, 2, 1500, 15, 0, 0])
+        write_counters(sysfs_root, 'ens2f0', [100, 1, 0, 0, 0, 0, 0, 0])
+        sleep(seconds)
+    monkeypatch.setattr(nc.time, 'sleep', traffic)
+
+    nc.report()
+    interfaces = {entry['ifname']: entry for entry in json.loads(capsys.readouterr().out)['interfaces']}
+
+    rates = interfaces['ens1f1']['rates']
+    assert rates['interval'] >= 0.2
+    assert rates['rx-bps'] == pytest.approx(25000 * 8 / rates['interval'], rel=0.01)
+    assert rates['tx-bps'] == pytest.approx(1000 * 8 / rates['interval'], rel=0.01)
+    assert rates['rx-pps'] == pytest.approx(200 / rates['interval'], rel=0.01)
+    assert rates['rx-drops-ps'] == pytest.approx(2 / rates['interval'], rel=0.01)
+    assert rates['tx-errors-ps'] == 0
+    assert [ifname for ifname in interfaces if 'rates' in interfaces[ifname]] == ['ens1f1']
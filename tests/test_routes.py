@@ -0,0 +1,67 @@
+""" --route-lookup index: longest prefix per table, tables in the order of the default policy rules """
+
+import socket
+
+import pytest
+
+# 'ip -detail -json route show table all' of a host with IPv4 and IPv6 defaults, a policy table and a throw route
+ROUTES = [
+    {'type': 'unicast', 'dst': 'default', 'gateway': '192.0.2.1', 'dev': 'eth0', 'table': 'main', 'protocol': 'dhcp',
+     'metric': 100},
+    {'type': 'unicast', 'dst': '192.0.2.0/24', 'dev': 'eth0', 'table': 'main', 'protocol': 'kernel', 'prefsrc': '192.0.2.2'},
+    {'type': 'unicast', 'dst': '10.0.0.0/8', 'gateway': '192.0.2.254', 'dev': 'eth0', 'table': 'main', 'protocol': 'static'},
+    {'type': 'throw', 'dst': '10.9.0.0/16', 'table': 'main', 'protocol': 'static'},
+    {'type': 'unicast', 'dst': '10.9.0.0/16', 'dev': 'wg0', 'table': '100', 'protocol': 'static'},
+    {'type': 'unreachable', 'dst': '10.9.0.0/16', 'dev': 'lo', 'table': 'default', 'protocol': 'static'},
+    {'type': 'local', 'dst': '192.0.2.2', 'dev': 'eth0', 'table': 'local', 'protocol': 'kernel', 'prefsrc': '192.0.2.2'},
+    {'type': 'broadcast', 'dst': '192.0.2.255', 'dev': 'eth0', 'table': 'local', 'protocol': 'kernel'},
+    {'type': 'unicast', 'dst': 'fd00::/64', 'dev': 'eth0', 'table': 'main', 'protocol': 'kernel', 'metric': 256, 'pref': 'medium'},
+    {'type': 'unicast', 'dst': 'default', 'dev': 'wg0', 'table': 'main', 'protocol': 'static', 'metric': 1024, 'pref': 'medium'},
+    {'type': 'local', 'dst': 'fd00::2', 'dev': 'eth0', 'table': 'local', 'protocol': 'kernel', 'metric': 0, 'pref': 'medium'},
+]
+
+
+@pytest.fixture
+def index(netcheck):
+    return netcheck().RouteIndex(ROUTES)
+
+
+@pytest.mark.parametrize('address, dst, table', [
+    ('192.0.2.2', '192.0.2.2', 'local'),            # the local table is looked up first, whatever the main prefix
+    ('192.0.2.255', '192.0.2.255', 'local'),
+    ('192.0.2.7', '192.0.2.0/24', 'main'),
+    ('10.1.2.3', '10.0.0.0/8', 'main'),
+    ('8.8.8.8', 'default', 'main'),
+    ('10.9.1.1', '10.9.0.0/16', 'default'),         # thrown out of main, policy table 100 has no rule
+    ('fd00::2', 'fd00::2', 'local'),
+    ('fd00::7', 'fd00::/64', 'main'),
+    ('2001:db8::1', 'default', 'main'),
+])
+def test_rule_order(index, address, dst, table):
+    route = index.lookup(address)
+    assert (route['dst'], route['table']) == (dst, table)
+
+
+def test_default_family_from_route(index):
+    # The IPv6 default leaves through wg0, the IPv4 default through eth0
+    assert index.lookup('2001:db8::1')['dev'] == 'wg0'
+    assert index.lookup('203.0.113.1')['gateway'] == '192.0.2.1'
+
+    index = type(index)([route for route in ROUTES if route['dst'] != 'default' or 'pref' in route])
+    assert index.lookup('203.0.113.1') is None
+
+
+def test_default_family_from_gateway(netcheck):
+    index = netcheck().RouteIndex([{'type': 'unicast', 'dst': 'default', 'gateway': 'fe80::1', 'dev': 'eth0'}])
+
+    assert index.parse({'dst': 'default', 'nexthops': [{'gateway': 'fe80::1'}]})[0] == socket.AF_INET6
+    assert index.lookup('198.51.100.1') is None
+    assert index.lookup('2001:db8::1')['gateway'] == 'fe80::1'
+
+
+def test_single_table(netcheck):
+    # ip lists the routes of one table without naming it
+    routes = [{'type': 'unicast', 'dst': '10.9.0.0/16', 'dev': 'wg0', 'protocol': 'static'}]
+    route = netcheck().RouteIndex(routes, '100').lookup('10.9.1.1')
+
+    assert (route['dev'], route['table']) == ('wg0', '100')
@@ -0,0 +1,91 @@
+""" State shared by the --serve collections: PCI device index, port type source and the gateway lookup of the tests """
+
+import struct
+
+import pytest
+
+from test_sysfs import ETHTOOL, ethtool    # noqa: F401 (fixture)
+
+
+def test_pci_index_rebuilt_for_new_bus_ids(netcheck, monkeypatch):
+    nc = netcheck()
+    listings = [{'0000:3b:00.0': 'Intel X710'}, {'0000:3b:00.0': 'Intel X710', '0000:3b:02.0': 'Intel X710 VF'}]
+    calls = []
+
+    def read_lspci():
+        calls.append(len(calls))
+        return listings[min(len(calls), len(listings)) - 1]
+    monkeypatch.setattr(nc, 'read_lspci', read_lspci)
+
+    assert nc.get_pci_devices('0000:3b:00.0')['0000:3b:00.0'] == 'Intel X710'
+    assert nc.get_pci_devices('0000:3b:00.0') and len(calls) == 1
+
+    # A VF created after the index was built is found by a single rebuild
+    assert nc.get_pci_devices('0000:3b:02.0')['0000:3b:02.0'] == 'Intel X710 VF'
+    assert len(calls) == 2
+
+    # An address lspci does not list is only looked for once
+    assert '0000:d8:00.0' not in nc.get_pci_devices('0000:d8:00.0')
+    assert '0000:d8:00.0' not in nc.get_pci_devices('0000:d8:00.0')
+    assert len(calls) == 3
+
+
+def genl_reply(kind, attributes):
+    body = struct.pack('=BBH', 1, 1, 0)
+    for (attribute, payload) in attributes:
+        body += struct.pack('=HH', 4 + len(payload), attribute) + payload + b'\0' * (-len(payload) % 4)
+    return struct.pack('=IHHII', 16 + len(body), kind, 0, 1, 0) + body
+
+
+@pytest.mark.parametrize('port, name', [(0x04, 'FIBRE'), (0x05, 'Direct Attach Copper'), (0x00, 'Twisted Pair')])
+def test_port_over_ethtool_netlink(netcheck, monkeypatch, port, name):
+    nc = netcheck()
+    requests = []
+
+    def netlink_request(msg_type, payload, flags, protocol):
+        requests.append(msg_type)
+        if msg_type == nc.GENL_ID_CTRL:
+            return genl_reply(nc.GENL_ID_CTRL, [(nc.CTRL_ATTR_FAMILY_ID, struct.pack('=H', 21))])
+        return genl_reply(21, [(nc.ETHTOOL_A_LINKINFO_PORT, bytes([port]))])
+    monkeypatch.setattr(nc, 'netlink_request', netlink_request)
+
+    assert nc.read_ethtool_linkinfo('eth0') == {'port': name}
+    assert nc.read_ethtool_linkinfo('eth1') == {'port': name}
+
+    # The family is resolved once
+    assert requests == [nc.GENL_ID_CTRL, 21, 21]
+
+
+def test_port_without_ethtool_netlink(netcheck, monkeypatch):
+    nc = netcheck()
+
+    def netlink_request(msg_type, payload, flags, protocol):
+        raise FileNotFoundError(2, 'No such file or directory')
+    monkeypatch.setattr(nc, 'netlink_request', netlink_request)
+
+    assert nc.read_ethtool_linkinfo('eth0') == {}
+
+
+def test_live_sysfs_does_not_fork_for_the_port(netcheck, ethtool, monkeypatch):
+    nc = netcheck('--no-cache', '--backend', 'auto')
+    monkeypatch.setattr(nc, 'run_command', ethtool[1])
+    monkeypatch.setattr(nc, 'read_sysfs', lambda entry: {'driver': 'ixgbe', 'bus-info': '0000:3b:00.0', 'speed': '10000Mb/s',
+                                                          'duplex': 'Full', 'link-detected': 'yes'})
+    monkeypatch.setattr(nc, 'read_ethtool_linkinfo', lambda ifname: {'port': 'Direct Attach Copper'})
+
+    details = nc.collect_link_details({'ifname': 'eth0', 'address': '3c:fd:fe:00:00:01'})
+
+    # Only the firmware version still needs ethtool
+    assert ethtool[0] == ['-i']
+    assert details['port'] == 'Direct Attach Copper'
+
+
+def test_gateway_lookup_skips_link_dump(netcheck, monkeypatch):
+    nc = netcheck('--ip-backend', 'netlink')
+
+    def get_netlink_snapshot():
+        raise AssertionError('the link dump is refreshed by the --serve collection thread')
+    monkeypatch.setattr(nc, 'get_netlink_snapshot', get_netlink_snapshot)
+
+    (route,) = nc.netlink_route_get('127.0.0.1')
+    assert route['dev'] == 'lo' and route['type'] == 'local'
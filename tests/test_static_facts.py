@@ -0,0 +1,48 @@
+""" Static hardware facts cache (hwfacts.json) as reported in the facts-cache detail """
+
+import json
+import time
+
+import pytest
+
+from test_sysfs import ETHTOOL, ethtool    # noqa: F401 (fixture)
+
+FACTS = {'address': '3c:fd:fe:00:00:01', 'driver': 'ixgbe', 'firmware-version': '0x800003e7, 1.3089.0',
+         'bus-info': '0000:3b:00.0', 'device-name': 'Intel Corporation Ethernet Controller X710'}
+
+
+@pytest.fixture
+def cached(tmp_path):
+    (tmp_path / 'cache').mkdir()
+    facts = {'version': 1, 'interfaces': {'eth0': dict(FACTS, updated=time.time())}}
+    (tmp_path / 'cache' / 'hwfacts.json').write_text(json.dumps(facts))
+
+
+def collect(netcheck, ethtool, monkeypatch, *argv):
+    nc = netcheck('--backend', 'ethtool', *argv)
+    monkeypatch.setattr(nc, 'run_command', ethtool[1])
+    ethtool[0].clear()
+    return nc.collect_link_details({'ifname': 'eth0', 'address': FACTS['address']})
+
+
+def test_hit(netcheck, ethtool, monkeypatch, cached):
+    details = collect(netcheck, ethtool, monkeypatch)
+
+    assert details['facts-cache'] == 'hit'
+    assert details['device-name'] == FACTS['device-name']
+    assert ethtool[0] == ['']
+
+
+def test_miss(netcheck, ethtool, monkeypatch):
+    details = collect(netcheck, ethtool, monkeypatch)
+
+    assert details['facts-cache'] == 'miss'
+    assert sorted(ethtool[0]) == ['', '-i']
+
+
+def test_bypass(netcheck, ethtool, monkeypatch, cached):
+    details = collect(netcheck, ethtool, monkeypatch, '--no-cache')
+
+    # The cache is neither read nor written, which is not a miss
+    assert details['facts-cache'] == 'bypass'
+    assert sorted(ethtool[0]) == ['', '-i']
@@ -0,0 +1,82 @@
+""" sysfs collector backend (--backend sysfs) against the ethtool backend on a fake sysfs tree """
+
+import subprocess
+
+import pytest
+
+ETHTOOL = {
+    '-i': 'driver: ixgbe\nversion: 5.1.0-k\nfirmware-version: 0x800003e7, 1.3089.0\nbus-info: 0000:3b:00.0\n',
+    '':   'Settings for eth0:\n\tSpeed: 10000Mb/s\n\tDuplex: Full\n\tPort: Direct Attach Copper\n\tLink detected: yes\n'
+}
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    """ sysfs tree with a physical ixgbe port, eth0 """
+
+    netdir = tmp_path / 'sys' / 'class' / 'net' / 'eth0'
+    (netdir / 'device').mkdir(parents=True)
+    (netdir / 'speed').write_text('10000\n')
+    (netdir / 'duplex').write_text('full\n')
+    (netdir / 'carrier').write_text('1\n')
+    (netdir / 'device' / 'uevent').write_text('DRIVER=ixgbe\nPCI_CLASS=20000\nPCI_SLOT_NAME=0000:3b:00.0\n')
+    return tmp_path / 'sys'
+
+
+@pytest.fixture
+def ethtool(monkeypatch):
+    """ Canned ethtool output in place of the command, recording the options run """
+
+    calls = []
+
+    def run_command(command, timeout=None):
+        assert command[0] == 'ethtool'
+        option = command[1] if len(command) == 3 else ''
+        calls.append(option)
+        return subprocess.CompletedProcess(command, 0, ETHTOOL[option].encode(), b'')
+
+    return calls, run_command
+
+
+def collect(netcheck, ethtool, monkeypatch, *argv):
+    nc = netcheck('--no-cache', *argv)
+    monkeypatch.setattr(nc, 'run_command', ethtool[1])
+    ethtool[0].clear()
+    return nc.collect_link_details({'ifname': 'eth0', 'address': '3c:fd:fe:00:00:01'})
+
+
+def test_sysfs_matches_ethtool(netcheck, sysfs, ethtool, monkeypatch):
+    reference = collect(netcheck, ethtool, monkeypatch, '--backend', 'ethtool')
+    details = collect(netcheck, ethtool, monkeypatch, '--backend', 'sysfs', '--sysfs-root', str(sysfs))
+
+    assert ethtool[0] == []
+    for key in ['driver', 'bus-info', 'speed', 'duplex', 'link-detected']:
+        assert details[key] == reference[key], key
+
+
+def test_auto_only_forks_for_missing_fields(netcheck, sysfs, ethtool, monkeypatch):
+    reference = collect(netcheck, ethtool, monkeypatch, '--backend', 'ethtool')
+    details = collect(netcheck, ethtool, monkeypatch, '--backend', 'auto', '--sysfs-root', str(sysfs))
+
+    # Firmware and port are not in sysfs, each needs one of the two ethtool queries
+    assert sorted(ethtool[0]) == ['', '-i']
+    for key in ['driver', 'firmware-version', 'bus-info', 'speed', 'duplex', 'port', 'link-detected']:
+        assert details[key] == reference[key], key
+
+
+def test_link_down_reports_unknown_speed(netcheck, sysfs, ethtool, monkeypatch):
+    (sysfs / 'class' / 'net' / 'eth0' / 'speed').write_text('-1\n')
+    (sysfs / 'class' / 'net' / 'eth0' / 'carrier').write_text('0\n')
+    details = collect(netcheck, ethtool, monkeypatch, '--backend', 'sysfs', '--sysfs-root', str(sysfs))
+
+    assert details['speed'] == 'Unknown!'
+    assert details['link-detected'] == 'no'
+
+
+def test_virtual_interface(netcheck, tmp_path, ethtool, monkeypatch):
+    (tmp_path / 'sys' / 'class' / 'net' / 'eth0.10').mkdir(parents=True)
+    nc = netcheck('--no-cache', '--backend', 'sysfs', '--sysfs-root', str(tmp_path / 'sys'))
+    details = nc.read_sysfs({'ifname': 'eth0.10', 'linkinfo': {'info_kind': 'vlan'}})
+
+    assert details['driver'] == '802.1Q VLAN Support'
+    assert details['firmware-version'] == '' and details['port'] == ''
@@ -0,0 +1,108 @@
+""" Downlink throughput test against an http.server stand-in on the loopback address """
+
+import http.server
+import threading
+import time
+
+import pytest
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """ /big streams 64 MiB, /small returns 1 KiB, anything else is a 404 """
+
+    def do_GET(self):
+        sizes = {'/big': 64 << 20, '/small': 1 << 10}
+        if self.path not in sizes:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(sizes[self.path]))
+        self.end_headers()
+        chunk = bytes(64 << 10)
+        try:
+            for offset in range(0, sizes[self.path], len(chunk)):
+                self.wfile.write(chunk[:sizes[self.path] - offset])
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # the client stops reading at the end of its duration
+
+    def log_message(self, format, *arguments):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    for name in ['http_proxy', 'https_proxy', 'HTTP_PROXY', 'HTTPS_PROXY']:
+        monkeypatch.delenv(name, raising=False)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def run(netcheck, *argv):
+    nc = netcheck(*argv)
+    result = {'test': 'downlink-throughput', 'result': 'FAIL', 'rate': ''}
+    nc.test_throughput(result, time.monotonic() + 5)
+    return result
+
+
+def test_streams(netcheck, server):
+    result = run(netcheck, '--throughput-url', server + '/big', '--throughput-streams', '3', '--throughput-duration', '0.3')
+
+    assert result['result'] == 'PASS'
+    assert len(result['streams']) == 3
+    assert all(stream['bytes'] > 0 and not stream['error'] for stream in result['streams'])
+    assert result['bps'] > 0 and result['rate'].endswith('bps')
+    assert result['ttfb'] == min(stream['ttfb'] for stream in result['streams'])
+
+    # Each stream stops after the duration, well before its 64 MiB download would end on a slow host
+    assert all(stream['seconds'] < 2 for stream in result['streams'])
+
+
+def test_streams_spread_over_targets(netcheck, server):
+    result = run(netcheck, '--throughput-url', server + '/small', '--throughput-url', server + '/big',
+                 '--throughput-streams', '4', '--throughput-duration', '0.2')
+
+    assert [stream['url'].rsplit('/', 1)[1] for stream in result['streams']] == ['small', 'big', 'small', 'big']
+    assert [stream['bytes'] for stream in result['streams']][::2] == [1024, 1024]
+
+
+def test_failing_stream(netcheck, server):
+    result = run(netcheck, '--throughput-url', server + '/big', '--throughput-url', server + '/missing',
+                 '--throughput-streams', '2', '--throughput-duration', '0.2')
+
+    # Data was received, but a stream failing makes the test fail
+    assert result['result'] == 'FAIL'
+    assert result['streams'][0]['bytes'] > 0
+    assert 'Not Found' in result['streams'][1]['error']
+
+
+def test_configuration_file(netcheck, server, tmp_path):
+    config = tmp_path / 'netcheck.conf'
+    config.write_text(f'[throughput]\nurls = {server}/small\n       {server}/big\nstreams = 2\nduration = 0.2\n')
+
+    result = run(netcheck, '--config', str(config))
+
+    assert [stream['url'] for stream in result['streams']] == [server + '/small', server + '/big']
+
+
+@pytest.mark.parametrize('webpage', ['PASS', 'FAIL'])
+def test_gated_on_webpage(netcheck, server, monkeypatch, webpage):
+    """ Throughput runs only after the webpage download passes, whatever the configured targets """
+
+    nc = netcheck('--throughput-url', server + '/big', '--throughput-duration', '0.2', '-j')
+
+    def stub(result, deadline, *posargs):
+        result['result'] = webpage if result['test'] == 'webpage-load' else 'PASS'
+    for name in ['test_ping_gateway', 'test_ping_internet', 'test_webpage']:
+        monkeypatch.setattr(nc, name, stub)
+
+    throughput = nc.run_connectivity_tests()['downlink-throughput']
+    if webpage == 'PASS':
+        assert throughput['result'] == 'PASS' and throughput['streams']
+    else:
+        assert throughput == {'test': 'downlink-throughput', 'result': 'FAIL', 'rate': ''}